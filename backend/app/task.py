@@ -1,9 +1,14 @@
-from celery import shared_task
+from celery import shared_task, group, chord
+from celery.utils.log import get_task_logger
 import time
-from models import WFHRequests, db
 from datetime import date
 from dateutil.relativedelta import relativedelta
-from util.wfh_request_logs import *
+from util.wfh_requests import cancel_stale_requests, stale_request_bounds
+from util.unit_of_work import unit_of_work
+from util.cache import get_cache
+from util.outbox import process_outbox, OUTBOX_BATCH_SIZE
+
+logger = get_task_logger(__name__)
 
 @shared_task(ignore_result=False)
 def hello_world():
@@ -13,23 +18,151 @@ def hello_world():
 
     print("Hello Celery")
 
+@shared_task(ignore_result=False)
+def relay_outbox():
+    # Queued after every request change commits and run every minute by beat, see util/outbox.py.
+    # Keeps going while full batches come back so a backlog drains in one run
+    processed = 0
+    while True:
+        batch = process_outbox(OUTBOX_BATCH_SIZE)
+        processed += batch
+        if batch < OUTBOX_BATCH_SIZE:
+            return {"processed": processed}
+
+# Pending requests applied for more than two months ago are cancelled every night, in batches
+# of AUTO_REJECT_BATCH_SIZE each committed on its own so no transaction holds many row locks
+AUTO_REJECT_BATCH_SIZE = 1000
+AUTO_REJECT_REASON = "Auto-rejected by system"
+# Held for the whole run so a second beat instance skips it, expires in case the worker dies mid run
+AUTO_REJECT_LOCK_TTL = 60 * 60
+
 @shared_task(ignore_result=False)
 def auto_reject():
     curr_date = date.today()
     two_months_ago = curr_date - relativedelta(months=2)
+    started = time.perf_counter()
+
+    logger.info(f"Updating Database for {curr_date}")
+    logger.info(f"Getting Pending Requests before {two_months_ago}")
+
+    with get_cache().lock("auto_reject", AUTO_REJECT_LOCK_TTL) as acquired:
+        if not acquired:
+            logger.warning("auto_reject is already running, skipping")
+            return {"cancelled": 0, "duration_ms": 0, "skipped": True}
+
+        cancelled = cancel_in_batches(two_months_ago)
+
+    duration_ms = round((time.perf_counter() - started) * 1000)
+    logger.info(f"Cancelled {cancelled} requests in {duration_ms}ms")
+    return {"cancelled": cancelled, "duration_ms": duration_ms}
+
+def cancel_in_batches(applied_before, after=None, upto=None, cancelled=0, on_batch=None):
+    # Commits one batch at a time until a batch comes back short, on_batch(total) runs after each commit
+    while True:
+        with unit_of_work():
+            batch = cancel_stale_requests(applied_before, AUTO_REJECT_REASON, AUTO_REJECT_BATCH_SIZE, after, upto)
+        cancelled += batch
+        if on_batch:
+            on_batch(cancelled)
+        if batch < AUTO_REJECT_BATCH_SIZE:
+            return cancelled
+
+##### CHUNKED TASKS #####
+# Nightly maintenance over the whole request history is split into keyset ranges over (apply_date, request_id),
+# processed in parallel by a Celery chord: a group of chunk tasks, then a callback adding up their results.
+#
+# The plan and each chunk's progress are checkpointed in the cache (Redis outside of tests) under the run id.
+# Planning the same run again, e.g. after a crash, reuses the stored ranges and skips the finished chunks.
+# Chunk tasks are acked late, so a chunk whose worker died is delivered again and carries on from its
+# checkpoint. Chunks only touch rows that still match, so running one twice does no harm.
+#
+# Planning holds the same "auto_reject" lock as the single task, so two beat instances never plan and
+# dispatch a run at the same time. A chunk whose copy is still running elsewhere is reported as skipped
+# with the count it checkpointed so far, and picked up again by the next run.
+
+CHUNK_SIZE = 50000
+CHECKPOINT_TTL = 2 * 24 * 60 * 60
+
+def plan_key(task_name, run_id):
+    return f"task:{task_name}:{run_id}:plan"
+
+def checkpoint_key(task_name, run_id, index):
+    return f"task:{task_name}:{run_id}:chunk:{index}"
 
-    print("Updating Database for ", curr_date)
-    print("Getting Pending Requests before ", two_months_ago)
+def make_ranges(bounds):
+    # [after, upto] pairs covering everything: (None, b1], (b1, b2], ..., (bn, None)
+    bounds = [[str(apply_date), request_id] for apply_date, request_id in bounds]
+    return [list(pair) for pair in zip([None] + bounds, bounds + [None])]
 
-    pending_requests = WFHRequests.query.filter(
-        WFHRequests.request_status == "Pending",
-        WFHRequests.apply_date < two_months_ago
-    ).all()
+def load_plan(task_name, run_id, build_ranges):
+    # The stored plan of the run, or a new one from build_ranges()
+    cache = get_cache()
+    plan = cache.get(plan_key(task_name, run_id))
+    if plan is None:
+        plan = {"ranges": build_ranges(), "started_at": time.time()}
+        cache.set(plan_key(task_name, run_id), plan, CHECKPOINT_TTL)
+    return plan
 
-    for request in pending_requests:
-        request.request_status = "Cancelled"
-        request.request_reason = "Auto-rejected by system"
+def get_checkpoint(task_name, run_id, index):
+    return get_cache().get(checkpoint_key(task_name, run_id, index)) or {"done": False, "count": 0}
+
+def save_checkpoint(task_name, run_id, index, count, done=False):
+    get_cache().set(checkpoint_key(task_name, run_id, index), {"done": done, "count": count}, CHECKPOINT_TTL)
+
+def _to_key(bound):
+    return None if bound is None else (date.fromisoformat(bound[0]), bound[1])
+
+@shared_task(ignore_result=False)
+def plan_auto_reject():
+    # Beat entry point for auto_reject, the run id is the cutoff date so reruns on the same day resume
+    two_months_ago = date.today() - relativedelta(months=2)
+    run_id = two_months_ago.isoformat()
+
+    with get_cache().lock("auto_reject", AUTO_REJECT_LOCK_TTL) as acquired:
+        if not acquired:
+            logger.warning(f"auto_reject is already running, not planning run {run_id}")
+            return None
+
+        plan = load_plan("auto_reject", run_id, lambda: make_ranges(stale_request_bounds(two_months_ago, CHUNK_SIZE)))
+        logger.info(f"auto_reject run {run_id}: {len(plan['ranges'])} chunks")
+
+        chunks = group(
+            auto_reject_chunk.s(run_id, index, after, upto) for index, (after, upto) in enumerate(plan["ranges"])
+        )
+        return chord(chunks)(finish_auto_reject.s(run_id)).id
+
+@shared_task(ignore_result=False, acks_late=True, reject_on_worker_lost=True)
+def auto_reject_chunk(run_id, index, after, upto):
+    # Cancels the stale requests of one range, returns how many it cancelled over all its attempts
+    # and whether it was skipped
+    checkpoint = get_checkpoint("auto_reject", run_id, index)
+    if checkpoint["done"]:
+        return {"index": index, "cancelled": checkpoint["count"], "skipped": False}
+
+    with get_cache().lock(f"auto_reject:{run_id}:{index}", AUTO_REJECT_LOCK_TTL) as acquired:
+        if not acquired:
+            # A redelivered copy while the first one is still running, only its progress so far is known
+            logger.warning(f"auto_reject run {run_id}: chunk {index} is already running, skipping")
+            return {"index": index, "cancelled": checkpoint["count"], "skipped": True}
+
+        cancelled = cancel_in_batches(
+            date.fromisoformat(run_id), _to_key(after), _to_key(upto), checkpoint["count"],
+            on_batch=lambda count: save_checkpoint("auto_reject", run_id, index, count)
+        )
+        save_checkpoint("auto_reject", run_id, index, cancelled, done=True)
+    return {"index": index, "cancelled": cancelled, "skipped": False}
+
+@shared_task(ignore_result=False)
+def finish_auto_reject(results, run_id):
+    plan = get_cache().get(plan_key("auto_reject", run_id)) or {}
+    duration_ms = round((time.time() - plan.get("started_at", time.time())) * 1000)
 
-        log_wfh_request(request.json())
+    # Skipped chunks may have moved on since, their latest checkpoint is the best count there is
+    cancelled = sum(
+        get_checkpoint("auto_reject", run_id, result["index"])["count"] if result["skipped"] else result["cancelled"]
+        for result in results
+    )
+    skipped = [result["index"] for result in results if result["skipped"]]
 
-    db.session.commit()
+    logger.info(f"auto_reject run {run_id}: cancelled {cancelled} requests in {len(results)} chunks, {len(skipped)} skipped")
+    return {"cancelled": cancelled, "chunks": len(results), "skipped_chunks": skipped, "duration_ms": duration_ms}
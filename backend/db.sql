@@ -11,6 +11,12 @@ DROP TABLE IF EXISTS WFHRequestLogs CASCADE;
 DROP TABLE IF EXISTS WithdrawDecisions CASCADE;
 DROP TABLE IF EXISTS RequestDecisions CASCADE;
 DROP TABLE IF EXISTS WFHRequests CASCADE;
+DROP TABLE IF EXISTS team_day_occupancy CASCADE;
+DROP TABLE IF EXISTS employee_sync_hash CASCADE;
+DROP TABLE IF EXISTS outbox CASCADE;
+
+-- Employees who left the HR export but are kept for their WFH history (util/load_csv.py --sync)
+ALTER TABLE employee ADD COLUMN IF NOT EXISTS is_active BOOLEAN NOT NULL DEFAULT TRUE;
 
 -- Create types
 CREATE TYPE request_status AS ENUM ('Pending', 'Approved', 'Rejected', 'Cancelled', 'Withdrawn', 'Pending_Withdraw');
@@ -32,6 +38,11 @@ CREATE TABLE WFHRequests (
     FOREIGN KEY (Manager_id) REFERENCES employee(staff_ID)
 );
 
+CREATE INDEX ix_wfhrequests_staff_status_date ON WFHRequests (staff_id, request_status, specific_date);
+CREATE INDEX ix_wfhrequests_status_apply_date ON WFHRequests (request_status, apply_date);
+CREATE INDEX ix_wfhrequests_open ON WFHRequests (staff_id, specific_date, apply_date)
+    WHERE request_status IN ('Pending', 'Pending_Withdraw');
+
 -- RequestDecisions Table
 CREATE TABLE RequestDecisions (
     decision_id SERIAL PRIMARY KEY,
@@ -68,4 +79,38 @@ CREATE TABLE WFHRequestLogs (
     reason_log TEXT,
     PRIMARY KEY (log_datetime, request_id, specific_date),
     FOREIGN KEY (request_id, specific_date) REFERENCES WFHRequests(request_id, specific_date)
-);
\ No newline at end of file
+);
+
+CREATE INDEX ix_wfhrequestlogs_request ON WFHRequestLogs (request_id, specific_date, log_datetime);
+
+-- TeamDayOccupancy Table (maintained by the backend whenever a request enters or leaves Approved/Pending_Withdraw)
+CREATE TABLE team_day_occupancy (
+    manager_id INT,
+    date DATE,
+    am_count INT NOT NULL DEFAULT 0,
+    pm_count INT NOT NULL DEFAULT 0,
+    team_size INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (manager_id, date),
+    FOREIGN KEY (manager_id) REFERENCES employee(staff_ID)
+);
+
+-- EmployeeSyncHash Table (hash of each employee's last synced HR export row, maintained by util/load_csv.py --sync)
+CREATE TABLE employee_sync_hash (
+    staff_id INT PRIMARY KEY,
+    content_hash VARCHAR(64) NOT NULL
+);
+
+-- Outbox Table (side effects of request changes, written with the change and carried out by the app.task.relay_outbox Celery task)
+CREATE TABLE outbox (
+    outbox_id SERIAL PRIMARY KEY,
+    event_type VARCHAR NOT NULL,
+    staff_id INT,
+    payload TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    processed_at TIMESTAMP,
+    attempts INT NOT NULL DEFAULT 0,
+    failed_at TIMESTAMP
+);
+
+CREATE INDEX ix_outbox_unprocessed ON outbox (outbox_id) WHERE processed_at IS NULL AND failed_at IS NULL;
+CREATE INDEX ix_outbox_staff ON outbox (staff_id, outbox_id);
@@ -5,9 +5,25 @@ import uuid
 
 db = SQLAlchemy()
 
+# Column tuple serializers: select only the columns of json() and zip each row with their names, skipping
+# the ORM objects and the per-row json() call. Dates are left as date objects for the app's JSON provider
+# (util/json_provider.py) to write as "YYYY-MM-DD", the same strings json() gives
+class JsonColumns:
+    json_fields = ()
+
+    @classmethod
+    def json_columns(cls):
+        return [getattr(cls, field) for field in cls.json_fields]
+
+    @classmethod
+    def json_rows(cls, rows):
+        fields = cls.json_fields
+        return [dict(zip(fields, row)) for row in rows]
+
 #Employee Table
-class Employee(db.Model):
+class Employee(JsonColumns, db.Model):
     __tablename__ = 'employee'
+    json_fields = ("staff_id", "staff_fname", "staff_lname", "dept", "position", "country", "email", "reporting_manager", "role")
 
     staff_id = Column(Integer, primary_key=True)
     staff_fname = Column(String, nullable=False)
@@ -18,6 +34,9 @@ class Employee(db.Model):
     email = Column(String, nullable=False)
     reporting_manager = Column(Integer, ForeignKey('employee.staff_id'))
     role = Column(Integer, nullable=False)
+    # False once the employee left the HR export but is kept for their WFH history (util/load_csv.py).
+    # Inactive employees do not count towards a team's size or team_day_occupancy
+    is_active = Column(Boolean, nullable=False, default=True, server_default=true())
 
     def json(self):
         return {
@@ -33,8 +52,9 @@ class Employee(db.Model):
         }
     
 # WFHRequests Table 
-class WFHRequests(db.Model):
+class WFHRequests(JsonColumns, db.Model):
     __tablename__ = 'wfhrequests'
+    json_fields = ("request_id", "staff_id", "manager_id", "specific_date", "is_am", "is_pm", "request_status", "apply_date", "request_reason")
 
     request_id = Column(String, nullable=False)
     staff_id = Column(Integer, ForeignKey('employee.staff_id'), nullable=False)
@@ -50,6 +70,14 @@ class WFHRequests(db.Model):
     
     __table_args__ = (
         PrimaryKeyConstraint('request_id', 'specific_date'),
+        # Staff/team schedules and inboxes: staff_id IN (...) AND request_status = ... over a date range
+        Index('ix_wfhrequests_staff_status_date', 'staff_id', 'request_status', 'specific_date'),
+        # auto_reject: request_status = 'Pending' AND apply_date < ...
+        Index('ix_wfhrequests_status_apply_date', 'request_status', 'apply_date'),
+        # Open requests are a small slice of the table, so manager inboxes and auto_reject get a small index
+        Index('ix_wfhrequests_open', 'staff_id', 'specific_date', 'apply_date',
+              postgresql_where=request_status.in_(['Pending', 'Pending_Withdraw']),
+              sqlite_where=request_status.in_(['Pending', 'Pending_Withdraw'])),
     )
 
     def json(self):
@@ -144,6 +172,8 @@ class WFHRequestLogs(db.Model):
 
     __table_args__ = (
         PrimaryKeyConstraint('log_datetime', 'request_id', 'specific_date'),
+        # Logs of a request, used to version schedule responses
+        Index('ix_wfhrequestlogs_request', 'request_id', 'specific_date', 'log_datetime'),
     )
 
     def json(self):
@@ -156,3 +186,70 @@ class WFHRequestLogs(db.Model):
             "reason_log": self.reason_log
         }
     
+
+# TeamDayOccupancy Table (Approved WFH sessions per manager's team per day, used for the 0.5 rule)
+class TeamDayOccupancy(db.Model):
+    __tablename__ = 'team_day_occupancy'
+
+    manager_id = Column(Integer, ForeignKey('employee.staff_id'), primary_key=True) # Current reporting_manager of the staff counted
+    date = Column(Date, primary_key=True)
+    am_count = Column(Integer, nullable=False, default=0) # Approved or Pending_Withdraw requests with AM selected
+    pm_count = Column(Integer, nullable=False, default=0) # Approved or Pending_Withdraw requests with PM selected
+    team_size = Column(Integer, nullable=False, default=0) # Direct reports of the manager when last updated
+
+    def json(self):
+        return {
+            "manager_id": self.manager_id,
+            "date": str(self.date),
+            "am_count": self.am_count,
+            "pm_count": self.pm_count,
+            "team_size": self.team_size
+        }
+
+# EmployeeSyncHash Table (Hash of each employee's last synced HR export row, used to skip unchanged rows)
+class EmployeeSyncHash(db.Model):
+    __tablename__ = 'employee_sync_hash'
+
+    staff_id = Column(Integer, primary_key=True) # No foreign key, the hash outlives a deleted employee until the next sync
+    content_hash = Column(String(64), nullable=False)
+
+    def json(self):
+        return {
+            "staff_id": self.staff_id,
+            "content_hash": self.content_hash
+        }
+
+# Outbox Table (Side effects of a request change, e.g. its WFHRequestLogs entry, written in the same transaction
+# as the change and carried out afterwards by the app.task.relay_outbox Celery task, see util/outbox.py)
+class Outbox(db.Model):
+    __tablename__ = 'outbox'
+
+    outbox_id = Column(Integer, primary_key=True)
+    event_type = Column(String, nullable=False)
+    staff_id = Column(Integer, nullable=True) # Whose requests the event is about, versions their schedules
+    payload = Column(Text, nullable=False) # JSON
+    created_at = Column(DateTime, nullable=False)
+    processed_at = Column(DateTime, nullable=True) # Null until the side effects are done
+    attempts = Column(Integer, nullable=False, default=0)
+    failed_at = Column(DateTime, nullable=True) # Set when the event gave up after MAX_ATTEMPTS, until retried
+
+    __table_args__ = (
+        # The relay only ever reads the events not processed or failed yet
+        Index('ix_outbox_unprocessed', 'outbox_id',
+              postgresql_where=and_(processed_at.is_(None), failed_at.is_(None)),
+              sqlite_where=and_(processed_at.is_(None), failed_at.is_(None))),
+        # Latest event of a staff member, part of their schedule version
+        Index('ix_outbox_staff', 'staff_id', 'outbox_id'),
+    )
+
+    def json(self):
+        return {
+            "outbox_id": self.outbox_id,
+            "event_type": self.event_type,
+            "staff_id": self.staff_id,
+            "payload": self.payload,
+            "created_at": str(self.created_at),
+            "processed_at": str(self.processed_at) if self.processed_at else None,
+            "attempts": self.attempts,
+            "failed_at": str(self.failed_at) if self.failed_at else None
+        }
@@ -1,14 +1,67 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from models import *
 from util.employee import *
 
 employee = Blueprint('employee', __name__)
 
+# Largest page a client can ask for
+MAX_PAGE_SIZE = 1000
+# Most staff_ids a client can look up in one batch
+MAX_BATCH_SIZE = 5000
+
 ##### EMPLOYEE TABLE #####
+# GET /api/all?limit=100&after=140008&fields=staff_id,staff_fname&dept=Sales&country=Singapore
+# All parameters are optional. With a limit, the staff_id to pass as `after` for the next page is
+# returned in the X-Next-Cursor header, which is left out on the last page
 @employee.route("/api/all")
 def get_org_data():
-    data = Employee.query.all()
-    return jsonify([employee.json() for employee in data])
+    limit = request.args.get('limit', type=int)
+    if 'limit' in request.args and (limit is None or not 0 < limit <= MAX_PAGE_SIZE):
+        return jsonify({"error": f"limit must be an integer between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    after = request.args.get('after', type=int)
+    if 'after' in request.args and after is None:
+        return jsonify({"error": "after must be a staff_id"}), 400
+
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in EMPLOYEE_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    employees, next_cursor = get_employees_page(
+        fields=fields,
+        dept=request.args.get('dept'),
+        country=request.args.get('country'),
+        limit=limit,
+        after=after
+    )
+
+    response = jsonify(employees)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+# POST /api/employees/batch {"staff_ids": [140001, 140008, 999999]}
+# {"data": [<140001>, <140008>], "missing": [999999]}, data follows the order of staff_ids
+@employee.route("/api/employees/batch", methods=["POST"])
+def get_staff_data_batch():
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get("staff_ids"), list):
+        return jsonify({"error": "Please provide staff_ids as a list"}), 400
+
+    staff_ids = data["staff_ids"]
+    if len(staff_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} staff_ids can be looked up at once"}), 400
+    if any(not isinstance(staff_id, int) or isinstance(staff_id, bool) for staff_id in staff_ids):
+        return jsonify({"error": "staff_ids must be integers"}), 400
+
+    employees = get_employees_by_ids(staff_ids)
+    return jsonify({
+        "data": [employees[staff_id] for staff_id in staff_ids if staff_id in employees],
+        "missing": list(dict.fromkeys(staff_id for staff_id in staff_ids if staff_id not in employees))
+    })
 
 @employee.route("/api/<int:staff_id>")
 def get_staff_data(staff_id):
@@ -39,4 +92,4 @@ def get_team_data(staff_id):
     
     team = get_full_team(rm_id)
 
-    return jsonify([employee.json() for employee in team])
+    return jsonify(team)
@@ -1,17 +1,20 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from models import *
 from util.wfh_requests import *
 from util.request_decisions import *
 from util.wfh_dates import *
 from util.wfh_request_logs import *
 from util.withdraw_decision import *
-from datetime import timedelta
-from datetime import date
-from sqlalchemy import and_
+from util.org_index import get_org_index
+from util.employee import get_direct_reports
+from util.occupancy import get_team_day_occupancy, check_recurring_headcount, exceeds_limit
+from util.unit_of_work import transactional
+from util.outbox import requests_changed
 
 approve = Blueprint('approve', __name__)
 
 @approve.route("/api/approve", methods=['POST'])
+@transactional
 def manager_approve_adhoc():
     data = request.get_json()
     if not data:
@@ -28,81 +31,56 @@ def manager_approve_adhoc():
         if not req:
             return jsonify({"error": "Request not found"}), 404
         
+        org = get_org_index()
+
         staff_id = req["staff_id"]
-        employee = Employee.query.filter_by(staff_id=staff_id).first()
+        employee = org.get(staff_id)
         if not employee: 
             return jsonify({"error": f"Employee with staff_id {staff_id} not found"}), 404
         
         reporting_manager_id = data["manager_id"] #checks if managerid from payload is a valid employee
-        manager = Employee.query.filter_by(staff_id=reporting_manager_id).first()
+        manager = org.get(reporting_manager_id)
         if not manager:
             return jsonify({"error": f"Reporting manager for employee {staff_id} not found"}), 404
         
-        print((employee.reporting_manager))
-        print((data["manager_id"]))
-        if str(employee.reporting_manager) != str(reporting_manager_id): #checks if managerid from payload is the manager of employee
-            return jsonify({"error": f"Employee {staff_id} reports under {employee.reporting_manager} instead of {reporting_manager_id}"}), 400
+        if str(employee["reporting_manager"]) != str(reporting_manager_id): #checks if managerid from payload is the manager of employee
+            return jsonify({"error": f"Employee {staff_id} reports under {employee['reporting_manager']} instead of {reporting_manager_id}"}), 400
         
         request_status = req["request_status"]
         if request_status != "Pending":
             return jsonify({"error": f"Manager cannot approve or reject request with {request_status} status"}), 400
 
         ###### head count check ######
-        employees_under_same_manager = Employee.query.filter_by(reporting_manager=reporting_manager_id).all()
+        employees_under_same_manager = get_direct_reports(reporting_manager_id)
         total_employees = len(employees_under_same_manager)
         
         start_date = req["specific_date"]
         is_am = req["is_am"]
         is_pm = req["is_pm"]
 
-        if is_am:
-            approved_am_requests = WFHRequests.query.filter(
-                and_(
-                    WFHRequests.staff_id.in_([emp.staff_id for emp in employees_under_same_manager]),
-                    WFHRequests.specific_date == start_date,
-                    WFHRequests.request_status.in_(['Approved', 'Pending_Withdraw']),
-                    WFHRequests.is_am == True  # Check for AM session
-                )
-            ).count()
-
-            if total_employees > 0:
-                ratio_am = (approved_am_requests + 1) / total_employees
-            else:
-                ratio_am = 0
-
-            if ratio_am > 0.5:
-                return jsonify({"error": "Exceed 0.5 rule limit for AM session"}), 422
-
-        if is_pm:
-            approved_pm_requests = WFHRequests.query.filter(
-                and_(
-                    WFHRequests.staff_id.in_([emp.staff_id for emp in employees_under_same_manager]),
-                    WFHRequests.specific_date == start_date,
-                    WFHRequests.request_status.in_(['Approved', 'Pending_Withdraw']),
-                    WFHRequests.is_pm == True  # Check for PM session
-                )
-            ).count()
+        # Approved AM/PM sessions of the team on that day, kept up to date in team_day_occupancy
+        approved_am_requests, approved_pm_requests = get_team_day_occupancy(employee["reporting_manager"], start_date)
 
-            if total_employees > 0:
-                ratio_pm = (approved_pm_requests + 1) / total_employees
-            else:
-                ratio_pm = 0
+        if is_am and exceeds_limit(approved_am_requests, total_employees):
+            return jsonify({"error": "Exceed 0.5 rule limit for AM session"}), 422
 
-            if ratio_pm > 0.5:
-                return jsonify({"error": "Exceed 0.5 rule limit for PM session"}), 422
+        if is_pm and exceeds_limit(approved_pm_requests, total_employees):
+            return jsonify({"error": "Exceed 0.5 rule limit for PM session"}), 422
 
          ###### end of head count check ######
 
         new_req = update_request(request_id, start_date, {"request_status": data.get("decision_status")})
         if new_req is None:
             return jsonify({"error": "Request not found"}), 404
+        if "error" in new_req:
+            return jsonify(new_req), 500
         
         data["specific_date"] = datetime.strptime(start_date, '%Y-%m-%d').date()
         decision = create_request_decision(data)
         if "error" in decision:
             return jsonify(decision), 500 
         
-        log_wfh_request(new_req["new_request"]) # add to wfhrequestlogs
+        requests_changed([new_req["new_request"]]) # wfhrequestlogs entry, written by the outbox relay after commit
 
         return jsonify({
             "message": "Request updated and manager's decision stored successfully",
@@ -111,11 +89,12 @@ def manager_approve_adhoc():
         }), 201
 
     except Exception as e:
-        db.session.rollback() 
+        db.session.rollback()
+        current_app.logger.exception("Ad-hoc approval failed")
         return jsonify({"error": str(e)}), 500
 
 @approve.route("/api/approve_recurring", methods=['POST'])
-
+@transactional
 def manager_approve_recurring():
     data = request.get_json()
     if not data:
@@ -133,66 +112,34 @@ def manager_approve_recurring():
             return jsonify({"error": "Request not found"}), 404
 
         ####### Start of headcount check #######
+        org = get_org_index()
+
         staff_id = req["staff_id"]
-        employee = Employee.query.filter_by(staff_id=staff_id).first()
+        employee = org.get(staff_id)
+        if not employee:
+            return jsonify({"error": f"Employee with staff_id {staff_id} not found"}), 404
 
-        reporting_manager_id = employee.reporting_manager
+        reporting_manager_id = employee["reporting_manager"]
 
-        employees_under_same_manager = Employee.query.filter_by(reporting_manager=reporting_manager_id).all()
+        employees_under_same_manager = get_direct_reports(reporting_manager_id)
         total_employees = len(employees_under_same_manager)
 
-        same_request = WFHRequests.query.filter_by(request_id=request_id).all()
+        # Verdict of the 0.5 rule for every date in the series, from a single query
+        headcount = check_recurring_headcount(request_id, reporting_manager_id, total_employees)
+        exceeded = [verdict for verdict in headcount if verdict["exceeds_am"] or verdict["exceeds_pm"]]
 
-        for arrangement in same_request:
-            arrangement_date = arrangement.specific_date
-            arrangement_is_am = arrangement.is_am
-            arrangement_is_pm = arrangement.is_pm
-            if arrangement_is_am:
-                approved_am_requests = WFHRequests.query.filter(
-                    and_(
-                        WFHRequests.staff_id.in_([emp.staff_id for emp in employees_under_same_manager]),
-                        WFHRequests.specific_date == arrangement_date,
-                        WFHRequests.request_status.in_(['Approved', 'Pending_Withdraw']),
-                        WFHRequests.is_am == True  # Check for AM session
-                    )
-                ).count()
+        if exceeded:
+            session = "AM" if exceeded[0]["exceeds_am"] else "PM"
+            return jsonify({
+                "error": f"Exceed 0.5 rule limit for {session} session",
+                "exceeded_dates": exceeded
+            }), 422
 
-                if total_employees > 0:
-                    ratio_am = (approved_am_requests + 1) / total_employees
-                else:
-                    ratio_am = 0
-
-                if ratio_am > 0.5:
-                    return jsonify({"error": "Exceed 0.5 rule limit for AM session"}), 422
-
-            if arrangement_is_pm:
-                approved_pm_requests = WFHRequests.query.filter(
-                    and_(
-                        WFHRequests.staff_id.in_([emp.staff_id for emp in employees_under_same_manager]),
-                        WFHRequests.specific_date == arrangement_date,
-                        WFHRequests.request_status.in_(['Approved', 'Pending_Withdraw']),
-                        WFHRequests.is_pm == True  # Check for PM session
-                    )
-                ).count()
-
-                if total_employees > 0:
-                    ratio_pm = (approved_pm_requests + 1) / total_employees
-                else:
-                    ratio_pm = 0
-
-                if ratio_pm > 0.5:
-                    return jsonify({"error": "Exceed 0.5 rule limit for PM session"}), 422
-            
-        for arrangement in same_request:
-            arrangement_date = arrangement.specific_date
-            data["specific_date"] = arrangement_date
-            decision = create_request_decision(data)
-
-            if "error" in decision:
-                return jsonify({"error": f"Error creating decision for arrangement {arrangement}: {decision['error']}"}), 500
-            
-            updated_request = update_request(request_id, arrangement_date, {"request_status": data.get("decision_status")})
-            log_wfh_request(updated_request["new_request"]) # add to wfhrequestlogs
+        # Every date of the series is approved in one transaction: a single UPDATE for the request, a
+        # multi-row INSERT for the decisions and one outbox event for the logs, committed when the unit of work ends
+        updated_requests = update_request_status(request_id, data.get("decision_status"))
+        create_request_decisions(data, [updated_request.specific_date for updated_request in updated_requests])
+        requests_changed([updated_request.json() for updated_request in updated_requests]) # wfhrequestlogs entries
 
         return jsonify({
             "message": "Recurring WFH requests processed successfully",
@@ -201,10 +148,11 @@ def manager_approve_recurring():
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error: {str(e)}")
+        current_app.logger.exception("Recurring approval failed")
         return jsonify({"error": str(e)}), 500
 
 @approve.route("/api/approve_withdrawal", methods=["POST"])
+@transactional
 def manager_approve_withdrawal():
     data = request.get_json()
     if not data: 
@@ -222,16 +170,18 @@ def manager_approve_withdrawal():
         if not req: 
             return jsonify({"error": "Request not found"}), 400
 
+        org = get_org_index()
+
         staff_id = req["staff_id"]
-        employee = Employee.query.filter_by(staff_id=staff_id).first()
+        employee = org.get(staff_id)
         if not employee: 
             return jsonify({"error": f"Employee with staff_id {staff_id} not found"}), 404
         
         reporting_manager_id = data["manager_id"]
-        manager = Employee.query.filter_by(staff_id=reporting_manager_id).first()
+        manager = org.get(reporting_manager_id)
         if not manager: 
             return jsonify({"error": f"Reporting manager not found"}), 404
-        if manager.staff_id != req["manager_id"]:
+        if manager["staff_id"] != req["manager_id"]:
             return jsonify({"error": f"Employee {staff_id} reports under {req['manager_id']} instead of {data['manager_id']}"}), 400
         
         request_status = req["request_status"]
@@ -249,11 +199,14 @@ def manager_approve_withdrawal():
         new_req = update_request(request_id, req["specific_date"], {"request_status": updated_status})
         if new_req is None:
             return jsonify({"error": "Request update failed"}), 500
+        if "error" in new_req:
+            return jsonify(new_req), 500
         
         decision = create_withdraw_decision(data)
-        # print("Decision returned:", decision)
         if "error" in decision:
             return jsonify(decision), 500
+
+        requests_changed([new_req["new_request"]]) # wfhrequestlogs entry, written by the outbox relay after commit
         
         return jsonify({
             "message": "Withdrawal request updated and manager's decision stored successfully",
@@ -263,6 +216,6 @@ def manager_approve_withdrawal():
     
     except Exception as e:
         db.session.rollback()
-        print(f"Error: {str(e)}")
+        current_app.logger.exception("Withdrawal approval failed")
         return jsonify({"error": str(e)}), 500
         
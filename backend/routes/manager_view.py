@@ -1,10 +1,13 @@
 from flask import Blueprint, jsonify, request
-from models import Employee, WFHRequests
+from models import Employee, WFHRequests, db
 from util.employee import get_full_team  # Assuming this is the path
+from util.org_index import get_org_index
+from util.response_cache import schedule_version, conditional_response
 from datetime import datetime
 
 manager_view = Blueprint('manager_view', __name__)
 
+# Responds 304 to a matching If-None-Match, see util/response_cache.py
 @manager_view.route('/api/manager/<int:manager_id>/team_schedule', methods=['GET'])
 def get_manager_team_schedule(manager_id):
     # Parse the start and end date from query parameters
@@ -26,16 +29,26 @@ def get_manager_team_schedule(manager_id):
     if not full_team:
         return jsonify({"message": "No team members found under this manager"}), 404
 
+    staff_ids = [manager_id] + [team_member["staff_id"] for team_member in full_team]
+    version = schedule_version(staff_ids, start_date, end_date)
+    return conditional_response(
+        f"manager_team_schedule:{manager_id}:{start_date}:{end_date}", version,
+        lambda: build_manager_team_schedule(manager_id, full_team, staff_ids, start_date, end_date)
+    )
+
+def build_manager_team_schedule(manager_id, full_team, staff_ids, start_date, end_date):
+    # Load the schedule details of the manager and the whole team in one query
+    schedule_details = get_team_schedule_details(staff_ids, start_date, end_date)
+
     # Prepare the manager's schedule details
-    staff_schedule_details = get_staff_schedule_details(manager_id, start_date, end_date)
+    staff_schedule_details = schedule_details[manager_id]
 
     # Prepare the team members' schedules
     team_schedules = []
     for team_member in full_team:
-        member_schedule_details = get_staff_schedule_details(team_member.staff_id, start_date, end_date)
         team_schedules.append({
-            "staff_id": team_member.staff_id,
-            "ScheduleDetails": member_schedule_details
+            "staff_id": team_member["staff_id"],
+            "ScheduleDetails": schedule_details[team_member["staff_id"]]
         })
 
     # Construct the final response
@@ -47,25 +60,40 @@ def get_manager_team_schedule(manager_id):
         "team": team_schedules
     }
 
-    return jsonify(response), 200
+    return response, 200
 
 def get_staff_schedule_details(staff_id, start_date, end_date):
-    # Query the WFHRequests table for 'Approved' requests within the date range
-    approved_requests = WFHRequests.query.filter(
-        WFHRequests.staff_id == staff_id,
+    return get_team_schedule_details([staff_id], start_date, end_date)[staff_id]
+
+def get_team_schedule_details(staff_ids, start_date, end_date):
+    # Query the WFHRequests table for 'Approved' requests within the date range for every staff_id,
+    # selecting only the columns returned instead of loading full WFHRequests objects
+    schedule_details = {staff_id: [] for staff_id in staff_ids}
+
+    approved_requests = db.session.query(
+        WFHRequests.request_id,
+        WFHRequests.staff_id,
+        WFHRequests.specific_date,
+        WFHRequests.is_am,
+        WFHRequests.is_pm
+    ).filter(
+        WFHRequests.staff_id.in_(staff_ids),
         WFHRequests.request_status == 'Approved',
         WFHRequests.specific_date >= start_date,
         WFHRequests.specific_date <= end_date
-    ).all()
+    ).order_by(WFHRequests.specific_date, WFHRequests.request_id)
 
     # Convert the approved requests to JSON format with selected fields
-    return [{
-        "request_id": request.request_id,
-        "staff_id": request.staff_id,
-        "specific_date": request.specific_date.strftime("%Y-%m-%d"),
-        "is_am": request.is_am,
-        "is_pm": request.is_pm
-    } for request in approved_requests]
+    for request_id, staff_id, specific_date, is_am, is_pm in approved_requests:
+        schedule_details[staff_id].append({
+            "request_id": request_id,
+            "staff_id": staff_id,
+            "specific_date": specific_date.strftime("%Y-%m-%d"),
+            "is_am": is_am,
+            "is_pm": is_pm
+        })
+
+    return schedule_details
 
 @manager_view.route('/api/managers', methods=['GET'])
 def get_all_managers():
@@ -75,6 +103,7 @@ def get_all_managers():
         
         # Group managers by department
         department_managers = {}
+        org = get_org_index()
         
         for manager in managers:
             dept = manager.dept.lower()  # Normalize department names
@@ -82,7 +111,7 @@ def get_all_managers():
                 department_managers[dept] = []
             
             # Count team members
-            team_size = Employee.query.filter_by(reporting_manager=manager.staff_id).count()
+            team_size = len(org.direct_reports(manager.staff_id))
             
             department_managers[dept].append({
                 'staff_id': manager.staff_id,
@@ -3,10 +3,12 @@ from datetime import date
 from models import *
 from util.wfh_requests import *
 from util.wfh_request_logs import *
+from util.unit_of_work import transactional
 
 withdraw = Blueprint('withdraw', __name__)
 
 @withdraw.route("/api/withdraw", methods=['POST'])
+@transactional
 def staff_withdraw():
     data = request.get_json()
     if not data:
@@ -38,6 +40,8 @@ def staff_withdraw():
         new_req = update_request(request_id, specific_date, updated_fields)
         if new_req is None:
             return jsonify({"error": "Request not found"}), 404
+        if "error" in new_req:
+            return jsonify(new_req), 500
         
         log_wfh_request(new_req["new_request"])
 
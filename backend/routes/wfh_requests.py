@@ -1,7 +1,11 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, make_response
 from models import *
+from itertools import chain
 from datetime import datetime, timedelta
-from util.employee import get_full_team
+from util.employee import get_full_team, get_employee_by_id
+from util.wfh_requests import get_requests_by_staff, get_team_inbox, team_inbox_query
+from util.response_cache import schedule_version, conditional_response
+from util.streaming import wants_ndjson, stream_json_batches, ndjson_response
 
 dates = Blueprint('dates', __name__)
 
@@ -21,15 +25,39 @@ dates = Blueprint('dates', __name__)
 #     "request_reason": "Sick"
 #   }
 # ]
+# Responds 304 to a matching If-None-Match, see util/response_cache.py
+# With Accept: application/x-ndjson, streams one request per line instead, see util/streaming.py
 @dates.route("/api/staff/<int:staff_id>/all_wfh_dates", methods=["GET"])
 def get_staff_wfh_dates(staff_id):
+    if wants_ndjson():
+        response = make_response(stream_staff_wfh_dates(staff_id))
+    else:
+        version = schedule_version([staff_id])
+        response = make_response(conditional_response(f"all_wfh_dates:{staff_id}", version, lambda: build_staff_wfh_dates(staff_id)))
 
-    wfh_requests = WFHRequests.query.filter_by(staff_id=staff_id).all()
+    response.vary.add("Accept")
+    return response
+
+def staff_wfh_dates_query(staff_id):
+    return select(*WFHRequests.json_columns()).where(WFHRequests.staff_id == staff_id)
+
+def build_staff_wfh_dates(staff_id):
+    wfh_requests = WFHRequests.json_rows(db.session.execute(staff_wfh_dates_query(staff_id)))
 
     if not wfh_requests:
+        return {"message": "No WFH dates found for this staff member"}, 404
+
+    return wfh_requests, 200
+
+def stream_staff_wfh_dates(staff_id):
+    batches = stream_json_batches(WFHRequests, staff_wfh_dates_query(staff_id))
+
+    # The first batch tells an empty result apart before the response is started
+    first_batch = next(batches, None)
+    if first_batch is None:
         return jsonify({"message": "No WFH dates found for this staff member"}), 404
 
-    return jsonify([date_request.json() for date_request in wfh_requests])
+    return ndjson_response(chain([first_batch], batches))
 
 # Get all approved wfh dates for a certain staff id in a certain date range
 #GET /api/staff/1/wfh_requests?start_date=2024-09-01&end_date=2024-09-30
@@ -57,20 +85,21 @@ def get_staff_wfh_requests_in_range(staff_id):
         return jsonify({"error": "Please provide both start_date and end_date"}), 400
 
     # Query WFH requests within the date range for the given staff_id
-    wfh_requests = WFHRequests.query.filter(
+    wfh_requests = WFHRequests.json_rows(db.session.execute(select(*WFHRequests.json_columns()).where(
         WFHRequests.staff_id == staff_id,
         WFHRequests.specific_date >= start_date,
         WFHRequests.specific_date <= end_date,
         WFHRequests.request_status == "Approved"  
-    ).all()
+    )))
 
     if not wfh_requests:
         return jsonify({"message": "No WFH requests found for this staff member in the given date range"}), 404
 
-    return jsonify([date_request.json() for date_request in wfh_requests])
+    return jsonify(wfh_requests)
 
 # Get the entire team schedule of a given staff member
 # GET /api/team/1/schedule?start_date=2024-09-01&end_date=2024-09-30
+# Responds 304 to a matching If-None-Match, see util/response_cache.py
 @dates.route("/api/team/<int:staff_id>/schedule", methods=["GET"])
 def get_team_schedule(staff_id):
     start_date = request.args.get('start_date')
@@ -80,130 +109,70 @@ def get_team_schedule(staff_id):
         return jsonify({"error": "Please provide both start_date and end_date"}), 400
 
     # Find the employee and their reporting manager
-    staff_member = Employee.query.filter_by(staff_id=staff_id).first()
+    staff_member = get_employee_by_id(staff_id)
     if not staff_member:
         return jsonify({"error": "Invalid staff ID"}), 404
 
-    reporting_manager_id = staff_member.reporting_manager
+    reporting_manager_id = staff_member["reporting_manager"]
 
     # Get the full team under the reporting manager
     team = get_full_team(reporting_manager_id)
 
+    version = schedule_version([team_member["staff_id"] for team_member in team], start_date, end_date)
+    return conditional_response(
+        f"team_schedule:{staff_id}:{start_date}:{end_date}", version,
+        lambda: build_team_schedule(team, start_date, end_date)
+    )
+
+def build_team_schedule(team, start_date, end_date):
+    # Get the approved WFH requests of the whole team within the given date range in one query
+    approved_requests = get_requests_by_staff(
+        [team_member["staff_id"] for team_member in team], "Approved", start_date, end_date
+    )
+
     # Prepare the schedule for each team member
     team_schedule = []
     for team_member in team:
-        # Get the approved WFH requests within the given date range
-        wfh_requests = WFHRequests.query.filter(
-            WFHRequests.staff_id == team_member.staff_id,
-            WFHRequests.specific_date >= start_date,
-            WFHRequests.specific_date <= end_date,
-            WFHRequests.request_status == "Approved"
-        ).all()
-
-        # Create the schedule details for the current team member
-        schedule_details = [
-            {
-                "request_id": request_entry.request_id,
-                "staff_id": request_entry.staff_id,
-                "manager_id": request_entry.manager_id,
-                "specific_date": request_entry.specific_date.strftime("%Y-%m-%d"),
-                "is_am": request_entry.is_am,
-                "is_pm": request_entry.is_pm,
-                "request_status": request_entry.request_status,
-                "apply_date": request_entry.apply_date.strftime("%Y-%m-%d"),
-                "request_reason": request_entry.request_reason
-            } for request_entry in wfh_requests
-        ]
+        # The json rows of the requests, dates are written as YYYY-MM-DD by the app's JSON provider
+        schedule_details = approved_requests.get(team_member["staff_id"], [])
 
         if schedule_details:
             # Add the team member's schedule only if they have schedule details
             team_schedule.append({
-                "staff_id": team_member.staff_id,
+                "staff_id": team_member["staff_id"],
                 "ScheduleDetails": schedule_details
             })
 
-    return jsonify(team_schedule), 200
+    return team_schedule, 200
 
 @dates.route("/api/team-manager/<int:manager_id>/pending-requests", methods=["GET"])
 def get_team_pending_requests(manager_id):
-    # Get the full team under the given manager
-    team = get_full_team(manager_id)
-
-    # Prepare the pending requests for each team member
-    team_pending_requests = []
-    for team_member in team:
-        # Get all pending WFH requests without a date filter
-        pending_requests = WFHRequests.query.filter(
-            WFHRequests.staff_id == team_member.staff_id,
-            WFHRequests.request_status == "Pending"
-        ).order_by(WFHRequests.specific_date.asc()).all()
-
-        # Create the request details for the current team member
-        request_details = [
-            {
-                "request_id": request.request_id,
-                "staff_id": request.staff_id,
-                "manager_id": request.manager_id,
-                "specific_date": request.specific_date.strftime("%Y-%m-%d"),
-                "is_am": request.is_am,
-                "is_pm": request.is_pm,
-                "request_status": request.request_status,
-                "apply_date": request.apply_date.strftime("%Y-%m-%d"),
-                "request_reason": request.request_reason,
-            } for request in pending_requests
-        ]
-
-        if request_details:
-            # Add the team member's pending requests only if they have any
-            team_pending_requests.append({
-                "staff_id": team_member.staff_id,
-                "pending_requests": request_details
-            })
-
-    return jsonify({
-        "team_size": len(team),
-        "pending_requests_count": sum(len(member["pending_requests"]) for member in team_pending_requests),
-        "team_pending_requests": team_pending_requests
-    }), 200
+    return get_team_inbox_response(manager_id, ["Pending"])
 
 @dates.route("/api/team-manager/<int:manager_id>/pending-requests-withdraw", methods=["GET"])
 def get_team_pending_withdraw_requests(manager_id):
+    return get_team_inbox_response(manager_id, ["Pending_Withdraw"])
+
+# Optional keyset pagination for both inboxes
+# GET /api/team-manager/1/pending-requests?limit=50&cursor=2024-10-01,<request_id>
+# With Accept: application/x-ndjson, streams the requests one per line in (specific_date, request_id) order.
+# The cursor still applies, a client can resume after the specific_date and request_id of the last line it read
+def get_team_inbox_response(manager_id, request_statuses):
+    limit = request.args.get('limit', type=int)
+    if 'limit' in request.args and (limit is None or limit <= 0):
+        return jsonify({"error": "limit must be a positive integer"}), 400
+
     # Get the full team under the given manager
     team = get_full_team(manager_id)
 
-    # Prepare the pending requests for each team member
-    team_pending_requests = []
-    for team_member in team:
-        # Get all pending WFH requests without a date filter
-        pending_requests = WFHRequests.query.filter(
-            WFHRequests.staff_id == team_member.staff_id,
-            WFHRequests.request_status == "Pending_Withdraw"
-        ).order_by(WFHRequests.specific_date.asc()).all()
-
-        # Create the request details for the current team member
-        request_details = [
-            {
-                "request_id": request.request_id,
-                "staff_id": request.staff_id,
-                "manager_id": request.manager_id,
-                "specific_date": request.specific_date.strftime("%Y-%m-%d"),
-                "is_am": request.is_am,
-                "is_pm": request.is_pm,
-                "request_status": request.request_status,
-                "apply_date": request.apply_date.strftime("%Y-%m-%d"),
-                "request_reason": request.request_reason,
-            } for request in pending_requests
-        ]
-
-        if request_details:
-            # Add the team member's pending requests only if they have any
-            team_pending_requests.append({
-                "staff_id": team_member.staff_id,
-                "pending_requests": request_details
-            })
-
-    return jsonify({
-        "team_size": len(team),
-        "pending_requests_count": sum(len(member["pending_requests"]) for member in team_pending_requests),
-        "team_pending_requests": team_pending_requests
-    }), 200
+    try:
+        if wants_ndjson():
+            query = team_inbox_query(team, request_statuses, limit, request.args.get('cursor'))
+            response = ndjson_response(stream_json_batches(WFHRequests, query) if team else [])
+        else:
+            response = jsonify(get_team_inbox(team, request_statuses, limit, request.args.get('cursor')))
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    response.vary.add("Accept")
+    return response, 200
@@ -3,6 +3,7 @@ from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 from models import db
+from util.json_provider import OrjsonProvider
 from routes.config import config
 from routes.employee import employee
 from routes.wfh_requests import dates
@@ -21,18 +22,27 @@ load_dotenv()
 
 def create_app():
     app = Flask(__name__)
+    # orjson backed JSON for jsonify and request.get_json, see util/json_provider.py
+    app.json = OrjsonProvider(app)
 
     if os.getenv("TESTING") == "True":
         # Use SQLite for testing
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
         CELERY_BROKER_URL = "redis://localhost:6379"
         CELERY_RESULT_BACKEND = "redis://localhost:6379"
+        # Tasks queued by the routes (e.g. relay_outbox) run inline, without a worker
+        CELERY_ALWAYS_EAGER = True
+        # Employee cache stays in-process for tests
+        app.config['CACHE_REDIS_URL'] = None
         
     else:
         # Use PostgreSQL for production
         app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
         CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
         CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
+        CELERY_ALWAYS_EAGER = False
+        # Employee cache shares the Celery Redis unless it has its own
+        app.config['CACHE_REDIS_URL'] = os.getenv("CACHE_REDIS_URL") or CELERY_BROKER_URL
 
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config.from_mapping(
@@ -40,21 +50,29 @@ def create_app():
             broker_url=CELERY_BROKER_URL,
             result_backend=CELERY_RESULT_BACKEND,
             task_ignore_result=True,
+            task_always_eager=CELERY_ALWAYS_EAGER,
             beat_schedule={
                 # FOR TESTING
                 # "task-every-min": {
                 #     "task": "app.task.hello_world",
                 #     "schedule": crontab(minute='*'),
                 # },
+                # Plans the run and fans it out in chunks, see app/task.py
                 "task-auto-rej-every-night-midnight": {
-                    "task": "app.task.auto_reject",
+                    "task": "app.task.plan_auto_reject",
                     "schedule": crontab(hour=0, minute=0),
+                },
+                # Picks up outbox events whose relay_outbox task was lost, see util/outbox.py
+                "task-relay-outbox-every-min": {
+                    "task": "app.task.relay_outbox",
+                    "schedule": crontab(minute='*'),
                 }
             },
         ),
     )
 
-    CORS(app, supports_credentials=True)
+    # The frontend reads the next page cursor of /api/all from X-Next-Cursor
+    CORS(app, supports_credentials=True, expose_headers=["X-Next-Cursor"])
 
     app.register_blueprint(config)
     app.register_blueprint(employee)
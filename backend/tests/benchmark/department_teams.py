@@ -0,0 +1,120 @@
+# Compares get_all_department_teams against the previous per-manager implementation
+# on a synthetic org chart. Run from the backend folder:
+#   TESTING=True python -m tests.benchmark.department_teams --employees 50000
+import argparse
+import random
+import time
+from server import app, db
+from models import Employee
+from util.employee import get_all_department_teams
+
+def legacy_get_full_team(rm_id):
+    # get_full_team before the CTE and the cache: one query per manager in the subtree.
+    # The seen set only keeps the self-reporting CEO from looping, as get_full_team does
+    team = [employee for employee in Employee.query.filter_by(reporting_manager=rm_id).all() if employee.staff_id != rm_id]
+    seen = {rm_id} | {employee.staff_id for employee in team}
+
+    ids = [employee.staff_id for employee in team if employee.role != 2]
+
+    while ids:
+        current_rm_id = ids.pop()
+        subteam = [employee for employee in Employee.query.filter_by(reporting_manager=current_rm_id).all() if employee.staff_id not in seen]
+        seen.update(employee.staff_id for employee in subteam)
+        team += subteam
+
+        ids += [employee.staff_id for employee in subteam if employee.role != 2]
+
+    return team
+
+def legacy_get_all_department_teams():
+    # get_all_department_teams before the single pass rewrite: one legacy_get_full_team per (dept, manager)
+    all_employees = Employee.query.all()
+
+    department_teams = {}
+
+    for employee in all_employees:
+        department = employee.dept
+        reporting_manager = employee.reporting_manager
+
+        if department not in department_teams:
+            department_teams[department] = {}
+
+        if reporting_manager and reporting_manager not in department_teams[department]:
+            team = legacy_get_full_team(reporting_manager)
+            department_teams[department][reporting_manager] = [member.json() for member in team]
+
+    return department_teams
+
+def build_org(total, directors, managers_per_director, seed):
+    # CEO -> directors (role 1) -> managers (role 3) -> staff (role 2), like employeenew.csv
+    rng = random.Random(seed)
+    rows = [(130002, "CEO", 130002, 1)]
+    next_id = 140000
+
+    director_ids = []
+    for d in range(directors):
+        director_ids.append((next_id, f"Dept {d}"))
+        rows.append((next_id, f"Dept {d}", 130002, 1))
+        next_id += 1
+
+    manager_ids = []
+    for director_id, dept in director_ids:
+        for _ in range(managers_per_director):
+            manager_ids.append((next_id, dept))
+            rows.append((next_id, dept, director_id, 3))
+            next_id += 1
+
+    while len(rows) < total:
+        manager_id, dept = rng.choice(manager_ids)
+        rows.append((next_id, dept, manager_id, 2))
+        next_id += 1
+
+    return [
+        {
+            "staff_id": staff_id,
+            "staff_fname": "Staff",
+            "staff_lname": str(staff_id),
+            "dept": dept,
+            "position": "Staff",
+            "country": "Singapore",
+            "email": f"{staff_id}@allinone.com.sg",
+            "reporting_manager": reporting_manager,
+            "role": role
+        } for staff_id, dept, reporting_manager, role in rows
+    ]
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark get_all_department_teams on a synthetic org chart")
+    parser.add_argument("--employees", type=int, default=50000)
+    parser.add_argument("--directors", type=int, default=20)
+    parser.add_argument("--managers-per-director", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=212)
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the single pass implementation")
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(Employee.__table__.insert(), build_org(args.employees, args.directors, args.managers_per_director, args.seed))
+        db.session.commit()
+        print(f"Loaded {args.employees} employees")
+
+        result, elapsed = timed(get_all_department_teams)
+        print(f"single pass: {elapsed:.2f}s")
+
+        if not args.skip_legacy:
+            legacy_result, legacy_elapsed = timed(legacy_get_all_department_teams)
+            print(f"per manager: {legacy_elapsed:.2f}s ({legacy_elapsed / elapsed:.1f}x slower)")
+            print("results match" if result == legacy_result else "RESULTS DIFFER")
+
+        db.drop_all()
+
+if __name__ == "__main__":
+    main()
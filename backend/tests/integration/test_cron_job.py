@@ -157,5 +157,131 @@ class TestStaffApply(TestApp):
             })
         self.assertEqual(cancelled, [])
 
+    def add_pending_requests(self, count, apply_date):
+        for day in range(1, count + 1):
+            db.session.add(WFHRequests(
+                request_id=str(day),
+                staff_id=140008,
+                manager_id=140001,
+                specific_date=date(2024, 9, day),
+                is_am=True,
+                is_pm=False,
+                request_status='Pending',
+                apply_date=apply_date,
+                request_reason='Personal matters'
+            ))
+        db.session.commit()
+
+    def test_auto_reject_in_batches(self, mock_date):
+        mock_date.today.return_value = date(2024, 12, 12)
+        self.add_pending_requests(5, date(2024, 9, 1))
+
+        from app.task import auto_reject
+        with patch('app.task.AUTO_REJECT_BATCH_SIZE', 2):
+            result = auto_reject()
+
+        self.assertEqual(result["cancelled"], 5)
+        self.assertIn("duration_ms", result)
+        self.assertEqual(WFHRequests.query.filter_by(request_status="Pending").all(), [])
+
+        logs = WFHRequestLogs.query.order_by(WFHRequestLogs.request_id).all()
+        self.assertEqual([log.request_id for log in logs], ["1", "2", "3", "4", "5"])
+        self.assertEqual(logs[0].request_status_log, "Cancelled")
+        self.assertEqual(logs[0].reason_log, "Auto-rejected by system")
+        self.assertEqual(logs[0].apply_date_log, date(2024, 9, 1))
+
+    def test_auto_reject_skips_when_locked(self, mock_date):
+        mock_date.today.return_value = date(2024, 12, 12)
+        self.add_pending_requests(1, date(2024, 9, 1))
+
+        from app.task import auto_reject
+        from util.cache import get_cache
+        with get_cache().lock("auto_reject", 60):
+            result = auto_reject()
+
+        self.assertEqual(result, {"cancelled": 0, "duration_ms": 0, "skipped": True})
+        self.assertEqual(len(WFHRequests.query.filter_by(request_status="Pending").all()), 1)
+
+        self.assertEqual(auto_reject()["cancelled"], 1)
+
+    def run_planned_chunks(self):
+        # Runs the chord of plan_auto_reject in process instead of through the broker
+        from app.task import plan_auto_reject, finish_auto_reject
+        with patch('app.task.chord') as mock_chord:
+            plan_auto_reject()
+        chunks = mock_chord.call_args[0][0]
+        results = [chunk.apply().get() for chunk in chunks.tasks]
+        return chunks, finish_auto_reject(results, "2024-10-12")
+
+    def test_planned_auto_reject(self, mock_date):
+        mock_date.today.return_value = date(2024, 12, 12)
+        mock_date.fromisoformat = date.fromisoformat
+        self.add_pending_requests(5, date(2024, 9, 1))
+
+        with patch('app.task.CHUNK_SIZE', 2):
+            chunks, result = self.run_planned_chunks()
+
+        self.assertEqual([chunk.args[2:] for chunk in chunks.tasks], [
+            (None, ["2024-09-01", "2"]),
+            (["2024-09-01", "2"], ["2024-09-01", "4"]),
+            (["2024-09-01", "4"], None)
+        ])
+        self.assertEqual(result["cancelled"], 5)
+        self.assertEqual(result["chunks"], 3)
+        self.assertEqual(result["skipped_chunks"], [])
+        self.assertEqual(WFHRequests.query.filter_by(request_status="Pending").all(), [])
+        self.assertEqual(len(WFHRequestLogs.query.all()), 5)
+
+    def test_planned_auto_reject_resumes(self, mock_date):
+        mock_date.today.return_value = date(2024, 12, 12)
+        mock_date.fromisoformat = date.fromisoformat
+        self.add_pending_requests(5, date(2024, 9, 1))
+
+        from app import task
+        with patch('app.task.CHUNK_SIZE', 2):
+            with patch('app.task.chord') as mock_chord:
+                task.plan_auto_reject()
+        first_chunk = mock_chord.call_args[0][0].tasks[0]
+
+        # Only the first chunk ran before the crash
+        self.assertEqual(first_chunk.apply().get(), {"index": 0, "cancelled": 2, "skipped": False})
+
+        # The rerun keeps the original ranges and does not redo the finished chunk
+        with patch('app.task.cancel_in_batches', wraps=task.cancel_in_batches) as mock_cancel:
+            chunks, result = self.run_planned_chunks()
+        self.assertEqual(len(chunks.tasks), 3)
+        self.assertEqual(mock_cancel.call_count, 2)
+        self.assertEqual(result["cancelled"], 5)
+        self.assertEqual(len(WFHRequestLogs.query.all()), 5)
+
+    def test_planned_chunk_skipped_when_locked(self, mock_date):
+        mock_date.today.return_value = date(2024, 12, 12)
+        mock_date.fromisoformat = date.fromisoformat
+        self.add_pending_requests(5, date(2024, 9, 1))
+
+        from app.task import save_checkpoint
+        from util.cache import get_cache
+        # Another copy of the second chunk is still running and has cancelled one request so far
+        save_checkpoint("auto_reject", "2024-10-12", 1, 1)
+        with get_cache().lock("auto_reject:2024-10-12:1", 60):
+            with patch('app.task.CHUNK_SIZE', 2), self.assertLogs("app.task", "WARNING") as logs:
+                chunks, result = self.run_planned_chunks()
+        self.assertIn("chunk 1 is already running", logs.output[0])
+
+        self.assertEqual(result["skipped_chunks"], [1])
+        self.assertEqual(result["cancelled"], 4)
+        self.assertEqual(len(WFHRequests.query.filter_by(request_status="Pending").all()), 2)
+
+    def test_plan_skipped_when_locked(self, mock_date):
+        mock_date.today.return_value = date(2024, 12, 12)
+        self.add_pending_requests(1, date(2024, 9, 1))
+
+        from app.task import plan_auto_reject
+        from util.cache import get_cache
+        with get_cache().lock("auto_reject", 60):
+            with patch('app.task.chord') as mock_chord:
+                self.assertIsNone(plan_auto_reject())
+        mock_chord.assert_not_called()
+
 if __name__ == '__main__':
     unittest.main()
@@ -483,6 +483,67 @@ class TestManagerApproveAdhoc(TestApp):
         self.assertEqual(response.status_code, 201)
         self.assertIn("Recurring WFH requests processed successfully", response.get_json()["message"])
 
+    def add_recurring_request(self, request_id, staff_id, specific_dates):
+        for specific_date in specific_dates:
+            db.session.add(WFHRequests(
+                request_id=request_id,
+                staff_id=staff_id,
+                manager_id=140001,
+                specific_date=specific_date,
+                is_am=True,
+                is_pm=False,
+                request_status='Pending',
+                apply_date=date(2024, 9, 1),
+                request_reason='Weekly class'
+            ))
+        db.session.commit()
+
+    @patch('util.request_decisions.date')
+    def test_approve_recurring_all_dates(self, mock_date):
+        mock_date.today.return_value = date(2024, 12, 12)
+        specific_dates = [date(2024, 9, 16), date(2024, 9, 23), date(2024, 9, 30)]
+        self.add_recurring_request("10", 140008, specific_dates)
+
+        request_body = {
+            'request_id': "10",
+            'decision_status': 'Approved',
+            'decision_notes': 'Nil',
+            'manager_id': 140001
+        }
+        response = self.client.post("/api/approve_recurring",
+                                    data=json.dumps(request_body),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual({r.request_status for r in WFHRequests.query.filter_by(request_id="10").all()}, {"Approved"})
+        decisions = RequestDecisions.query.filter_by(request_id="10").order_by(RequestDecisions.specific_date).all()
+        self.assertEqual([d.specific_date for d in decisions], specific_dates)
+        self.assertEqual({d.decision_date for d in decisions}, {date(2024, 12, 12)})
+        logs = WFHRequestLogs.query.filter_by(request_id="10").all()
+        self.assertEqual(sorted((log.specific_date, log.request_status_log) for log in logs),
+                         [(specific_date, "Approved") for specific_date in specific_dates])
+        for specific_date in specific_dates:
+            self.assertEqual(TeamDayOccupancy.query.filter_by(manager_id=140001, date=specific_date).first().am_count, 1)
+
+    def test_approve_recurring_is_atomic(self):
+        self.add_recurring_request("10", 140008, [date(2024, 9, 16), date(2024, 9, 23)])
+
+        request_body = {
+            'request_id': "10",
+            'decision_status': 'Approved',
+            'decision_notes': 'Nil',
+            'manager_id': 140001
+        }
+        with patch('routes.manager_approve.requests_changed', side_effect=Exception("outbox failed")):
+            response = self.client.post("/api/approve_recurring",
+                                        data=json.dumps(request_body),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 500)
+
+        self.assertEqual({r.request_status for r in WFHRequests.query.filter_by(request_id="10").all()}, {"Pending"})
+        self.assertEqual(RequestDecisions.query.filter_by(request_id="10").count(), 0)
+        self.assertEqual(TeamDayOccupancy.query.count(), 0)
+
     def test_approve_recurring_headcount_exceed(self):
         wfh_request_1 = WFHRequests(
             request_id=1,
@@ -537,7 +598,20 @@ class TestManagerApproveAdhoc(TestApp):
                                     content_type='application/json')
         
         self.assertEqual(response.status_code, 422)
-        self.assertEqual(response.get_json(), {"error": "Exceed 0.5 rule limit for PM session"})
+        self.assertEqual(response.get_json(), {
+            "error": "Exceed 0.5 rule limit for PM session",
+            "exceeded_dates": [
+                {
+                    "specific_date": "2024-09-16",
+                    "is_am": False,
+                    "is_pm": True,
+                    "approved_am": 0,
+                    "approved_pm": 2,
+                    "exceeds_am": False,
+                    "exceeds_pm": True
+                }
+            ]
+        })
 
     def test_manager_approve_withdrawal_success_approve(self):
         wfh_request_1 = WFHRequests(
@@ -119,6 +119,39 @@ class TestManagerTeamSchedule(TestCase):
         # Check that the response data matches the expected output
         self.assertEqual(response.json, expected_output)
 
+    def test_get_manager_team_schedule_includes_manager(self):
+        """Test the manager's own approved requests are returned with the team's"""
+        db.session.add(WFHRequests(
+            request_id='3', staff_id=140001, manager_id=130002,
+            specific_date=datetime.date(2024, 9, 20), is_am=True, is_pm=True,
+            request_status="Approved", apply_date=datetime.date(2024, 9, 1), request_reason="Offsite"
+        ))
+        db.session.add(WFHRequests(
+            request_id='4', staff_id=140008, manager_id=140001,
+            specific_date=datetime.date(2024, 9, 21), is_am=True, is_pm=True,
+            request_status="Pending", apply_date=datetime.date(2024, 9, 1), request_reason="Pending"
+        ))
+        db.session.commit()
+
+        response = self.client.get("/api/manager/140001/team_schedule?start_date=2024-09-01&end_date=2024-09-30")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["staff"], {
+            "staff_id": 140001,
+            "ScheduleDetails": [
+                {
+                    "request_id": '3',
+                    "staff_id": 140001,
+                    "specific_date": "2024-09-20",
+                    "is_am": True,
+                    "is_pm": True
+                }
+            ]
+        })
+        self.assertEqual(
+            [len(member["ScheduleDetails"]) for member in response.json["team"]],
+            [1, 1]
+        )
+
     def test_missing_date_parameters(self):
         """Test missing date parameters"""
         manager_id = 140001
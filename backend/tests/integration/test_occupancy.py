@@ -0,0 +1,192 @@
+import unittest
+from unittest.mock import patch
+import flask_testing
+import json
+from datetime import date
+from server import app, db
+from models import *
+from util.occupancy import get_team_day_occupancy, rebuild_team_day_occupancy, check_recurring_headcount
+
+class TestApp(flask_testing.TestCase):
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['TESTING'] = True
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.create_all()
+        db.session.add(Employee(
+            staff_id=140001,
+            staff_fname="Derek",
+            staff_lname="Tan",
+            dept="Sales",
+            position="Director",
+            country="Singapore",
+            email="Derek.Tan@allinone.com.sg",
+            reporting_manager=None,
+            role=1
+        ))
+        for staff_id in [140008, 140009, 140010, 140011]:
+            db.session.add(Employee(
+                staff_id=staff_id,
+                staff_fname="Staff",
+                staff_lname=str(staff_id),
+                dept="Sales",
+                position="Sales Manager",
+                country="Singapore",
+                email=f"{staff_id}@allinone.com.sg",
+                reporting_manager=140001,
+                role=3
+            ))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def add_request(self, request_id, staff_id, status, is_am=True, is_pm=True, specific_date=date(2024, 9, 15), manager_id=140001):
+        wfh_request = WFHRequests(
+            request_id=request_id,
+            staff_id=staff_id,
+            manager_id=manager_id,
+            specific_date=specific_date,
+            is_am=is_am,
+            is_pm=is_pm,
+            request_status=status,
+            apply_date=date(2024, 9, 1),
+            request_reason="Personal matters"
+        )
+        db.session.add(wfh_request)
+        db.session.commit()
+        return wfh_request
+
+class TestTeamDayOccupancy(TestApp):
+    def test_occupancy_counts_approved_requests(self):
+        self.add_request("1", 140008, "Approved", is_am=True, is_pm=False)
+        self.add_request("2", 140009, "Pending_Withdraw", is_am=True, is_pm=True)
+        self.add_request("3", 140010, "Pending")
+
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 15)), (2, 1))
+        self.assertEqual(get_team_day_occupancy(140001, "2024-09-16"), (0, 0))
+
+        occupancy = TeamDayOccupancy.query.filter_by(manager_id=140001).first()
+        self.assertEqual(occupancy.json(), {
+            "manager_id": 140001,
+            "date": "2024-09-15",
+            "am_count": 2,
+            "pm_count": 1,
+            "team_size": 4
+        })
+
+    def test_occupancy_follows_status_changes(self):
+        wfh_request = self.add_request("1", 140008, "Pending")
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 15)), (0, 0))
+
+        wfh_request.request_status = "Approved"
+        db.session.commit()
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 15)), (1, 1))
+
+        wfh_request.request_status = "Pending_Withdraw"
+        wfh_request.is_pm = False
+        db.session.commit()
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 15)), (1, 0))
+
+        wfh_request.request_status = "Withdrawn"
+        db.session.commit()
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 15)), (0, 0))
+
+    def test_occupancy_on_delete_and_rollback(self):
+        wfh_request = self.add_request("1", 140008, "Approved")
+
+        wfh_request.request_status = "Withdrawn"
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 15)), (1, 1))
+
+        db.session.delete(WFHRequests.query.filter_by(request_id="1").first())
+        db.session.commit()
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 15)), (0, 0))
+
+    def test_rebuild_team_day_occupancy(self):
+        self.add_request("1", 140008, "Approved")
+        self.add_request("2", 140009, "Approved", is_am=False, specific_date=date(2024, 9, 16))
+        db.session.execute(db.delete(TeamDayOccupancy))
+        db.session.commit()
+
+        self.assertEqual(rebuild_team_day_occupancy(), 2)
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 15)), (1, 1))
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 16)), (0, 1))
+
+    def test_check_recurring_headcount(self):
+        self.add_request("1", 140008, "Approved", is_am=True, is_pm=False, specific_date=date(2024, 9, 16))
+        self.add_request("2", 140009, "Approved", is_am=True, is_pm=False, specific_date=date(2024, 9, 16))
+        for specific_date in [date(2024, 9, 23), date(2024, 9, 9), date(2024, 9, 16)]:
+            self.add_request("3", 140010, "Pending", is_am=True, is_pm=True, specific_date=specific_date)
+
+        verdicts = check_recurring_headcount("3", 140001, 4)
+
+        self.assertEqual([verdict["specific_date"] for verdict in verdicts], ["2024-09-09", "2024-09-16", "2024-09-23"])
+        self.assertEqual(verdicts[1], {
+            "specific_date": "2024-09-16",
+            "is_am": True,
+            "is_pm": True,
+            "approved_am": 2,
+            "approved_pm": 0,
+            "exceeds_am": True,
+            "exceeds_pm": False
+        })
+        self.assertFalse(any(verdicts[i]["exceeds_am"] or verdicts[i]["exceeds_pm"] for i in (0, 2)))
+
+    @patch('util.request_decisions.date')
+    def test_approval_updates_occupancy(self, mock_date):
+        mock_date.today.return_value = date(2024, 12, 12)
+        self.add_request("1", 140008, "Approved", is_am=False, is_pm=True)
+        self.add_request("2", 140009, "Pending", is_am=False, is_pm=True)
+        self.add_request("3", 140010, "Pending", is_am=False, is_pm=True)
+
+        response = self.client.post("/api/approve",
+                                    data=json.dumps({"request_id": "2", "decision_status": "Approved", "decision_notes": "Nil", "manager_id": 140001}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 15)), (0, 2))
+
+        # A third PM session would exceed half of the 4 person team
+        response = self.client.post("/api/approve",
+                                    data=json.dumps({"request_id": "3", "decision_status": "Approved", "decision_notes": "Nil", "manager_id": 140001}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.get_json(), {"error": "Exceed 0.5 rule limit for PM session"})
+
+    @patch('util.request_decisions.date')
+    def test_occupancy_follows_team_move(self, mock_date):
+        mock_date.today.return_value = date(2024, 12, 12)
+        db.session.add(Employee(staff_id=140002, staff_fname="Susan", staff_lname="Goh", dept="Sales", position="Director",
+                                country="Singapore", email="Susan.Goh@allinone.com.sg", reporting_manager=None, role=1))
+        for staff_id in [140012, 140013]:
+            db.session.add(Employee(staff_id=staff_id, staff_fname="Staff", staff_lname=str(staff_id), dept="Sales",
+                                    position="Sales Manager", country="Singapore", email=f"{staff_id}@allinone.com.sg",
+                                    reporting_manager=140002, role=3))
+        db.session.commit()
+        self.add_request("1", 140008, "Approved", is_am=True, is_pm=False)
+        self.add_request("2", 140012, "Pending", is_am=True, is_pm=False, manager_id=140002)
+
+        # The approved slot moves with the employee to the 3 person team
+        Employee.query.get(140008).reporting_manager = 140002
+        db.session.commit()
+        self.assertEqual(get_team_day_occupancy(140001, date(2024, 9, 15)), (0, 0))
+        self.assertEqual(get_team_day_occupancy(140002, date(2024, 9, 15)), (1, 0))
+
+        response = self.client.post("/api/approve",
+                                    data=json.dumps({"request_id": "2", "decision_status": "Approved", "decision_notes": "Nil", "manager_id": 140002}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.get_json(), {"error": "Exceed 0.5 rule limit for AM session"})
+
+        # Same counts as a rebuild from scratch
+        rebuild_team_day_occupancy()
+        self.assertEqual(get_team_day_occupancy(140002, date(2024, 9, 15)), (1, 0))
+
+if __name__ == '__main__':
+    unittest.main()
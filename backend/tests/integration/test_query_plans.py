@@ -0,0 +1,102 @@
+import unittest
+from unittest.mock import patch
+from datetime import date
+import flask_testing
+from sqlalchemy import event, inspect, text
+from server import app, db
+from models import *
+from util.wfh_requests import get_requests_by_staff, get_team_inbox
+from app.task import auto_reject
+
+class TestApp(flask_testing.TestCase):
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['TESTING'] = True
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.manager = Employee(
+            staff_id=140001,
+            staff_fname="Derek",
+            staff_lname="Tan",
+            dept="Sales",
+            position="Director",
+            country="Singapore",
+            email="Derek.Tan@allinone.com.sg",
+            reporting_manager=None,
+            role=1
+        )
+        self.employee = Employee(
+            staff_id=140008,
+            staff_fname="Jaclyn",
+            staff_lname="Lee",
+            dept="Sales",
+            position="Sales Manager",
+            country="Singapore",
+            email="Jaclyn.Lee@allinone.com.sg",
+            reporting_manager=140001,
+            role=3
+        )
+        db.session.add(self.manager)
+        db.session.add(self.employee)
+        db.session.commit()
+
+        self.statements = []
+        event.listen(db.engine, "before_cursor_execute", self.capture)
+
+    def tearDown(self):
+        event.remove(db.engine, "before_cursor_execute", self.capture)
+        db.session.remove()
+        db.drop_all()
+
+    def capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(("SELECT", "UPDATE")) and "FROM wfhrequests" in statement:
+            self.statements.append((statement, parameters))
+
+    def query_plans(self):
+        # EXPLAIN QUERY PLAN for every WFHRequests read (or update reading it) captured so far
+        plans = []
+        connection = db.session.connection()
+        for statement, parameters in self.statements:
+            rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            plans.append(" ".join(row[3] for row in rows))
+        return plans
+
+class TestWFHRequestsIndexes(TestApp):
+    def test_indexes_declared(self):
+        indexes = {index["name"]: index for index in inspect(db.engine).get_indexes("wfhrequests")}
+
+        self.assertEqual(indexes["ix_wfhrequests_staff_status_date"]["column_names"], ["staff_id", "request_status", "specific_date"])
+        self.assertEqual(indexes["ix_wfhrequests_status_apply_date"]["column_names"], ["request_status", "apply_date"])
+        self.assertEqual(indexes["ix_wfhrequests_open"]["column_names"], ["staff_id", "specific_date", "apply_date"])
+
+        open_index = db.session.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'ix_wfhrequests_open'")
+        ).scalar()
+        self.assertIn("WHERE request_status IN ('Pending', 'Pending_Withdraw')", open_index)
+
+    def test_team_schedule_uses_index(self):
+        get_requests_by_staff([140001, 140008], "Approved", "2024-09-01", "2024-09-30")
+
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn("USING INDEX ix_wfhrequests_staff_status_date", self.query_plans()[0])
+
+    def test_inbox_uses_index(self):
+        get_team_inbox([self.employee.json()], ["Pending"])
+        get_team_inbox([self.employee.json()], ["Pending_Withdraw"], limit=10, cursor="2024-09-15,1")
+
+        for plan in self.query_plans():
+            self.assertIn("USING INDEX ix_wfhrequests_staff_status_date", plan)
+
+    @patch('app.task.date')
+    def test_auto_reject_uses_index(self, mock_date):
+        mock_date.today.return_value = date(2024, 12, 12)
+        auto_reject()
+
+        self.assertIn("USING INDEX ix_wfhrequests_status_apply_date", self.query_plans()[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+from unittest.mock import patch
+from datetime import date
+import flask_testing
+import json
+from server import app, db
+from models import *
+
+class TestApp(flask_testing.TestCase):
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['TESTING'] = True
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.create_all()
+        db.session.add(Employee(
+            staff_id=140001,
+            staff_fname="Derek",
+            staff_lname="Tan",
+            dept="Sales",
+            position="Director",
+            country="Singapore",
+            email="Derek.Tan@allinone.com.sg",
+            reporting_manager=None,
+            role=1
+        ))
+        for staff_id in [140008, 140009, 140010, 140011]:
+            db.session.add(Employee(
+                staff_id=staff_id,
+                staff_fname="Staff",
+                staff_lname=str(staff_id),
+                dept="Sales",
+                position="Sales Manager",
+                country="Singapore",
+                email=f"{staff_id}@allinone.com.sg",
+                reporting_manager=140001,
+                role=3
+            ))
+        db.session.add(WFHRequests(
+            request_id="1",
+            staff_id=140008,
+            manager_id=140001,
+            specific_date=date(2024, 9, 15),
+            is_am=True,
+            is_pm=True,
+            request_status="Pending",
+            apply_date=date(2024, 9, 1),
+            request_reason="Personal matters"
+        ))
+        db.session.add(WFHRequests(
+            request_id="2",
+            staff_id=140009,
+            manager_id=140001,
+            specific_date=date(2024, 9, 16),
+            is_am=True,
+            is_pm=False,
+            request_status="Pending_Withdraw",
+            apply_date=date(2024, 9, 1),
+            request_reason="Personal matters"
+        ))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def approve(self, request_id):
+        with patch('util.request_decisions.date') as mock_date:
+            mock_date.today.return_value = date(2024, 9, 10)
+            response = self.client.post("/api/approve",
+                                        data=json.dumps({"request_id": request_id, "decision_status": "Approved", "decision_notes": "Nil", "manager_id": 140001}),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+class TestScheduleETag(TestApp):
+    def test_team_schedule_not_modified(self):
+        url = "/api/team/140008/schedule?start_date=2024-09-01&end_date=2024-09-30"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+        self.approve("1")
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.get_json()[0]["staff_id"], 140008)
+
+    def test_body_served_from_cache(self):
+        url = "/api/manager/140001/team_schedule?start_date=2024-09-01&end_date=2024-09-30"
+        first = self.client.get(url)
+
+        with patch('routes.manager_view.get_team_schedule_details') as mock_details:
+            second = self.client.get(url)
+            mock_details.assert_not_called()
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers["ETag"], first.headers["ETag"])
+
+    def test_manager_team_schedule_follows_team_changes(self):
+        url = "/api/manager/140001/team_schedule?start_date=2024-09-01&end_date=2024-09-30"
+        etag = self.client.get(url).headers["ETag"]
+
+        db.session.add(Employee(
+            staff_id=140012,
+            staff_fname="Staff",
+            staff_lname="140012",
+            dept="Sales",
+            position="Sales Manager",
+            country="Singapore",
+            email="140012@allinone.com.sg",
+            reporting_manager=140001,
+            role=3
+        ))
+        db.session.commit()
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(140012, [member["staff_id"] for member in response.get_json()["team"]])
+
+    def test_all_wfh_dates_follows_withdrawal(self):
+        url = "/api/staff/140009/all_wfh_dates"
+        etag = self.client.get(url).headers["ETag"]
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 304)
+
+        response = self.client.post("/api/approve_withdrawal",
+                                    data=json.dumps({"request_id": "2", "specific_date": "2024-09-16", "decision_status": "Approved", "decision_notes": "Nil", "manager_id": 140001}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()[0]["request_status"], "Withdrawn")
+
+    def test_not_found_has_no_etag(self):
+        response = self.client.get("/api/staff/140010/all_wfh_dates")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response.headers)
+
+if __name__ == '__main__':
+    unittest.main()
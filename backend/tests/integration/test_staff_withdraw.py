@@ -152,3 +152,39 @@ class TestStaffWithdraw(TestApp):
             })
 
 
+
+    @patch('util.wfh_requests.commit')
+    def test_staff_withdraw_update_failed(self, mock_commit):
+        mock_commit.side_effect = Exception("flush failed")
+
+        request_body = {
+            'request_id': "1",
+            'reason': 'Applied for the wrong day',
+            'specific_date': "2024-09-15",
+        }
+
+        response = self.client.post("/api/withdraw",
+                                    data=json.dumps(request_body),
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.get_json(), {"error": "An error occurred: flush failed"})
+        self.assertEqual(WFHRequests.query.filter_by(request_id="1").first().request_status, "Approved")
+
+    @patch('routes.staff_withdraw.log_wfh_request')
+    def test_staff_withdraw_rolled_back_when_log_fails(self, mock_log):
+        mock_log.side_effect = Exception("log failed")
+
+        request_body = {
+            'request_id': "1",
+            'reason': 'Applied for the wrong day',
+            'specific_date': "2024-09-15",
+        }
+
+        response = self.client.post("/api/withdraw",
+                                    data=json.dumps(request_body),
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(WFHRequests.query.filter_by(request_id="1").first().request_status, "Approved")
+        self.assertEqual(WFHRequestLogs.query.count(), 0)
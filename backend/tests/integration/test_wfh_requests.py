@@ -3,6 +3,7 @@ import flask_testing
 from server import app, db
 from models import *
 import datetime
+import json
 from unittest.mock import patch, MagicMock
 
 class TestApp(flask_testing.TestCase):
@@ -167,7 +168,7 @@ class TestWFHRequests(TestApp):
     # Test getting the entire team schedule for a given staff member
     @patch('util.employee.get_full_team')
     def test_get_team_schedule(self, mock_get_full_team):
-        mock_get_full_team.return_value = [self.employee]
+        mock_get_full_team.return_value = [self.employee.json()]
 
         response = self.client.get("/api/team/140008/schedule?start_date=2024-09-01&end_date=2024-09-30", content_type='application/json')
         self.assertEqual(response.status_code, 200)
@@ -190,6 +191,71 @@ class TestWFHRequests(TestApp):
             }
         ])
 
+    # Test the team schedule of a team with more than one member with approved requests
+    def test_get_team_schedule_multiple_members(self):
+        colleague = Employee(
+            staff_id=140009,
+            staff_fname="John",
+            staff_lname="Doe",
+            dept="Sales",
+            position="Sales Associate",
+            country="Singapore",
+            email="John.Doe@allinone.com.sg",
+            reporting_manager=140001,
+            role=2
+        )
+        colleague_request = WFHRequests(
+            request_id='3',
+            staff_id=140009,
+            manager_id=140001,
+            specific_date=datetime.date(2024, 9, 20),
+            is_am=False,
+            is_pm=True,
+            request_status='Approved',
+            apply_date=datetime.date(2024, 9, 1),
+            request_reason="Errands"
+        )
+        db.session.add(colleague)
+        db.session.add(colleague_request)
+        db.session.commit()
+
+        response = self.client.get("/api/team/140009/schedule?start_date=2024-09-01&end_date=2024-09-30", content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [
+            {
+                "staff_id": 140008,
+                "ScheduleDetails": [
+                    {
+                        "request_id": '1',
+                        "staff_id": 140008,
+                        "manager_id": 140001,
+                        "specific_date": '2024-09-15',
+                        "is_am": True,
+                        "is_pm": True,
+                        "request_status": 'Approved',
+                        "apply_date": '2024-09-30',
+                        "request_reason": 'Sick'
+                    }
+                ]
+            },
+            {
+                "staff_id": 140009,
+                "ScheduleDetails": [
+                    {
+                        "request_id": '3',
+                        "staff_id": 140009,
+                        "manager_id": 140001,
+                        "specific_date": '2024-09-20',
+                        "is_am": False,
+                        "is_pm": True,
+                        "request_status": 'Approved',
+                        "apply_date": '2024-09-01',
+                        "request_reason": 'Errands'
+                    }
+                ]
+            }
+        ])
+
     # Test missing date range parameters for team schedule
     def test_get_team_schedule_missing_date_range(self):
         response = self.client.get("/api/team/140008/schedule", content_type='application/json')
@@ -205,7 +271,7 @@ class TestWFHRequests(TestApp):
     # Test no WFH requests found for team schedule
     @patch('util.employee.get_full_team')
     def test_get_team_schedule_no_data(self, mock_get_full_team):
-        mock_get_full_team.return_value = [self.employee]
+        mock_get_full_team.return_value = [self.employee.json()]
 
         response = self.client.get("/api/team/140008/schedule?start_date=2025-01-01&end_date=2025-01-31", content_type='application/json')
         self.assertEqual(response.status_code, 200)
@@ -213,7 +279,7 @@ class TestWFHRequests(TestApp):
     def test_get_team_pending_requests(self):
         # Mock the get_full_team function
         with patch('util.employee.get_full_team') as mock_get_full_team:
-            mock_get_full_team.return_value = [self.employee]
+            mock_get_full_team.return_value = [self.employee.json()]
             
             response = self.client.get("/api/team-manager/140001/pending-requests", 
                                     content_type='application/json')
@@ -242,6 +308,49 @@ class TestWFHRequests(TestApp):
                 ]
             })
 
+    def test_get_team_pending_requests_paginated(self):
+        db.session.add(WFHRequests(
+            request_id='3',
+            staff_id=140008,
+            manager_id=140001,
+            specific_date=datetime.date(2024, 10, 2),
+            is_am=True,
+            is_pm=False,
+            request_status='Pending',
+            apply_date=datetime.date(2024, 9, 30),
+            request_reason="Doctor's Appointment"
+        ))
+        db.session.commit()
+
+        response = self.client.get("/api/team-manager/140001/pending-requests?limit=1", content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        first_page = response.get_json()
+        self.assertEqual(first_page["pending_requests_count"], 1)
+        self.assertEqual(first_page["team_pending_requests"][0]["pending_requests"][0]["request_id"], '2')
+        self.assertEqual(first_page["next_cursor"], "2024-10-01,2")
+
+        response = self.client.get(f"/api/team-manager/140001/pending-requests?limit=1&cursor={first_page['next_cursor']}", content_type='application/json')
+        second_page = response.get_json()
+        self.assertEqual(second_page["team_pending_requests"][0]["pending_requests"][0]["request_id"], '3')
+        self.assertEqual(second_page["next_cursor"], "2024-10-02,3")
+
+        response = self.client.get(f"/api/team-manager/140001/pending-requests?limit=1&cursor={second_page['next_cursor']}", content_type='application/json')
+        self.assertEqual(response.get_json(), {
+            "team_size": 1,
+            "pending_requests_count": 0,
+            "team_pending_requests": [],
+            "next_cursor": None
+        })
+
+    def test_get_team_pending_requests_invalid_pagination(self):
+        response = self.client.get("/api/team-manager/140001/pending-requests?limit=0", content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json(), {"error": "limit must be a positive integer"})
+
+        response = self.client.get("/api/team-manager/140001/pending-requests-withdraw?limit=10&cursor=yesterday", content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json(), {"error": "Invalid cursor"})
+
     def test_get_team_pending_requests_no_pending(self):
         # First, let's update the existing pending request to be approved
         pending_request = WFHRequests.query.filter_by(request_id='2').first()
@@ -266,7 +375,7 @@ class TestWFHRequests(TestApp):
         # Mock the get_full_team function to return both team members
         with patch('util.employee.get_full_team') as mock_get_full_team:
             # Set up mock to return both team members
-            mock_get_full_team.return_value = [self.manager, self.employee]
+            mock_get_full_team.return_value = [self.manager.json(), self.employee.json()]
             
             response = self.client.get("/api/team-manager/130002/pending-requests", 
                                     content_type='application/json')
@@ -336,7 +445,7 @@ class TestWFHRequests(TestApp):
         # Mock the get_full_team function to return both team members
         with patch('util.employee.get_full_team') as mock_get_full_team:
             # Set up mock to return both team members
-            mock_get_full_team.return_value = [self.manager, self.employee]
+            mock_get_full_team.return_value = [self.manager.json(), self.employee.json()]
             
             response = self.client.get("/api/team-manager/130002/pending-requests-withdraw", 
                                     content_type='application/json')
@@ -371,7 +480,7 @@ class TestWFHRequests(TestApp):
 
         # Mock the get_full_team function
         with patch('util.employee.get_full_team') as mock_get_full_team:
-            mock_get_full_team.return_value = [self.employee]
+            mock_get_full_team.return_value = [self.employee.json()]
             
             response = self.client.get("/api/team-manager/140001/pending-requests-withdraw", 
                                     content_type='application/json')
@@ -399,7 +508,85 @@ class TestWFHRequests(TestApp):
                     }
                 ]
             })
-    
+
+class TestNDJSON(TestApp):
+    def get_ndjson(self, url):
+        return self.client.get(url, headers={"Accept": "application/x-ndjson"})
+
+    def ndjson_lines(self, response):
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def test_wfh_dates_stream(self):
+        response = self.get_ndjson("/api/staff/140008/all_wfh_dates")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertIn("Accept", response.headers["Vary"])
+        self.assertNotIn("ETag", response.headers)
+
+        json_response = self.client.get("/api/staff/140008/all_wfh_dates")
+        self.assertEqual(self.ndjson_lines(response), json_response.get_json())
+        self.assertIn("Accept", json_response.headers["Vary"])
+
+    def test_wfh_dates_stream_in_batches(self):
+        for day in range(1, 6):
+            db.session.add(WFHRequests(
+                request_id=str(10 + day),
+                staff_id=140008,
+                manager_id=140001,
+                specific_date=datetime.date(2024, 11, day),
+                is_am=True,
+                is_pm=False,
+                request_status='Pending',
+                apply_date=datetime.date(2024, 10, 30),
+                request_reason="Sick"
+            ))
+        db.session.commit()
+
+        with patch('util.streaming.STREAM_BATCH_SIZE', 2):
+            response = self.get_ndjson("/api/staff/140008/all_wfh_dates")
+            chunks = list(response.response)
+
+        # 7 rows, written 2 rows per chunk
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [2, 2, 2, 1])
+
+    def test_wfh_dates_stream_not_found(self):
+        response = self.get_ndjson("/api/staff/140001/all_wfh_dates")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json(), {"message": "No WFH dates found for this staff member"})
+
+    def test_json_preferred_over_ndjson(self):
+        response = self.client.get("/api/staff/140008/all_wfh_dates", headers={"Accept": "application/json, application/x-ndjson;q=0.5"})
+        self.assertEqual(response.mimetype, "application/json")
+
+    def test_pending_requests_stream(self):
+        db.session.add(WFHRequests(
+            request_id='3',
+            staff_id=140008,
+            manager_id=140001,
+            specific_date=datetime.date(2024, 10, 2),
+            is_am=True,
+            is_pm=False,
+            request_status='Pending',
+            apply_date=datetime.date(2024, 9, 30),
+            request_reason="Doctor's Appointment"
+        ))
+        db.session.commit()
+
+        response = self.get_ndjson("/api/team-manager/140001/pending-requests")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([line["request_id"] for line in self.ndjson_lines(response)], ['2', '3'])
+
+        response = self.get_ndjson("/api/team-manager/140001/pending-requests?cursor=2024-10-01,2")
+        self.assertEqual([line["request_id"] for line in self.ndjson_lines(response)], ['3'])
+
+        response = self.get_ndjson("/api/team-manager/140001/pending-requests-withdraw")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), b"")
+
+    def test_pending_requests_stream_invalid_cursor(self):
+        response = self.get_ndjson("/api/team-manager/140001/pending-requests?cursor=yesterday")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json(), {"error": "Invalid cursor"})
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,277 @@
+import unittest
+from unittest.mock import patch
+import flask_testing
+from server import app, db
+from models import Employee
+from sqlalchemy import event
+from util.cache import Cache, MemoryBackend, LocalCache, TieredBackend, get_cache, full_team_key
+from util.employee import get_employee_by_id, get_direct_reports, get_full_team
+from util.org_index import get_org_index
+
+def employee(staff_id, reporting_manager, role):
+    return Employee(
+        staff_id=staff_id,
+        staff_fname="Test",
+        staff_lname=str(staff_id),
+        dept="Sales",
+        position="Staff",
+        country="Singapore",
+        email=f"{staff_id}@allinone.com.sg",
+        reporting_manager=reporting_manager,
+        role=role
+    )
+
+class FailingBackend(MemoryBackend):
+    def get(self, key):
+        raise ConnectionError("Redis is down")
+
+    def add(self, key, value, ttl):
+        raise ConnectionError("Redis is down")
+
+class TestCacheBackend(flask_testing.TestCase):
+    def create_app(self):
+        return app
+
+    def test_msgpack_round_trip(self):
+        cache = Cache(MemoryBackend())
+        cache.set("employee:1", {"staff_id": 1, "reporting_manager": None})
+        self.assertEqual(cache.get("employee:1"), {"staff_id": 1, "reporting_manager": None})
+        self.assertIsInstance(cache.backend.get("wfh:employee:1"), bytes)
+
+    def test_ttl(self):
+        cache = Cache(MemoryBackend())
+        with patch('util.cache.time.monotonic', return_value=100):
+            cache.set("employee:1", {"staff_id": 1}, ttl=10)
+        with patch('util.cache.time.monotonic', return_value=109):
+            self.assertIsNotNone(cache.get("employee:1"))
+        with patch('util.cache.time.monotonic', return_value=110):
+            self.assertIsNone(cache.get("employee:1"))
+
+    def test_get_or_load_counts_hits_and_misses(self):
+        cache = Cache(MemoryBackend())
+        self.assertEqual(cache.get_or_load("employee:1", lambda: {"staff_id": 1}), {"staff_id": 1})
+        self.assertEqual(cache.get_or_load("employee:1", lambda: None), {"staff_id": 1})
+        # None is not cached
+        self.assertIsNone(cache.get_or_load("employee:2", lambda: None))
+        self.assertIsNone(cache.get_or_load("employee:2", lambda: None))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 3, "errors": 0})
+
+    def test_failing_backend_is_a_miss(self):
+        cache = Cache(FailingBackend())
+        self.assertEqual(cache.get_or_load("employee:1", lambda: {"staff_id": 1}), {"staff_id": 1})
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 1, "errors": 1})
+
+    def test_lock(self):
+        cache = Cache(MemoryBackend())
+        with cache.lock("auto_reject", 60) as acquired:
+            self.assertTrue(acquired)
+            with cache.lock("auto_reject", 60) as acquired_again:
+                self.assertFalse(acquired_again)
+        # Released on exit
+        with cache.lock("auto_reject", 60) as acquired:
+            self.assertTrue(acquired)
+
+    def test_lock_expires(self):
+        cache = Cache(MemoryBackend())
+        with patch('util.cache.time.monotonic', return_value=100):
+            first = cache.lock("auto_reject", 10)
+            self.assertTrue(first.__enter__())
+        with patch('util.cache.time.monotonic', return_value=110):
+            with cache.lock("auto_reject", 10) as acquired:
+                self.assertTrue(acquired)
+                # The expired holder does not release the new holder's lock
+                first.__exit__(None, None, None)
+                with cache.lock("auto_reject", 10) as acquired_again:
+                    self.assertFalse(acquired_again)
+
+    def test_lock_fails_open(self):
+        cache = Cache(FailingBackend())
+        with cache.lock("auto_reject", 60) as acquired:
+            self.assertTrue(acquired)
+        self.assertEqual(cache.stats()["errors"], 1)
+
+class TestTieredCache(flask_testing.TestCase):
+    def create_app(self):
+        return app
+
+    def test_local_lru(self):
+        local = LocalCache(maxsize=2, ttl=5)
+        local.set("a", b"1")
+        local.set("b", b"2")
+        local.get("a")
+        local.set("c", b"3")
+        # b was the least recently used
+        self.assertIsNone(local.get("b"))
+        self.assertEqual(local.get("a"), b"1")
+
+        with patch('util.cache.time.monotonic', return_value=float("inf")):
+            self.assertIsNone(local.get("a"))
+
+    def test_local_tier_serves_repeated_reads(self):
+        shared = MemoryBackend()
+        cache = Cache(TieredBackend(shared))
+        cache.set("employee:1", {"staff_id": 1})
+
+        shared.values.clear()
+        self.assertEqual(cache.get("employee:1"), {"staff_id": 1})
+        self.assertEqual(cache.stats()["local_hits"], 1)
+
+    def test_responses_skip_local_tier(self):
+        backend = TieredBackend(MemoryBackend())
+        cache = Cache(backend)
+        cache.set("response:1", b"body")
+        cache.set_many({"response:2": b"body"})
+
+        self.assertEqual(cache.get("response:1"), b"body")
+        self.assertEqual(cache.get_many(["response:2"]), {"response:2": b"body"})
+        self.assertEqual(len(backend.local.values), 0)
+        self.assertEqual(cache.stats()["local_hits"], 0)
+
+    def test_get_or_load_many(self):
+        cache = Cache(TieredBackend(MemoryBackend()))
+        cache.set("employee:1", {"staff_id": 1})
+        loaded = []
+
+        def loader(missing):
+            loaded.append(missing)
+            return {"employee:2": {"staff_id": 2}}
+
+        values = cache.get_or_load_many(["employee:1", "employee:2", "employee:3"], loader)
+        self.assertEqual(values, {"employee:1": {"staff_id": 1}, "employee:2": {"staff_id": 2}})
+        self.assertEqual(loaded, [["employee:2", "employee:3"]])
+
+        cache.get_or_load_many(["employee:2"], loader)
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_delete_reaches_other_workers(self):
+        shared = MemoryBackend()
+        worker_a = Cache(TieredBackend(shared))
+        worker_b = Cache(TieredBackend(shared))
+
+        worker_a.set("employee:1", {"staff_id": 1, "position": "Staff"})
+        self.assertEqual(worker_b.get("employee:1")["position"], "Staff")
+
+        worker_a.delete("employee:1")
+        self.assertIsNone(worker_b.get("employee:1"))
+
+        worker_b.set("full_team:1", [])
+        worker_a.get("full_team:1")
+        worker_b.clear("full_team:")
+        self.assertIsNone(worker_a.get("full_team:1"))
+
+class TestEmployeeCache(flask_testing.TestCase):
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['TESTING'] = True
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.create_all()
+        db.session.add(employee(140001, 140001, 1))
+        db.session.add(employee(140008, 140001, 3))
+        db.session.add(employee(150008, 140001, 1))
+        db.session.commit()
+        self.cache = get_cache()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_employee_read_through(self):
+        hits = self.cache.hits
+        self.assertEqual(get_employee_by_id(140008)["reporting_manager"], 140001)
+        self.assertEqual(self.cache.hits, hits)
+        self.assertEqual(get_employee_by_id(140008)["reporting_manager"], 140001)
+        self.assertEqual(self.cache.hits, hits + 1)
+        self.assertIsNone(get_employee_by_id(999999))
+
+    def test_employee_invalidated_on_write(self):
+        self.assertEqual(get_employee_by_id(140008)["position"], "Staff")
+
+        db.session.get(Employee, 140008).position = "Sales Manager"
+        db.session.commit()
+
+        self.assertEqual(get_employee_by_id(140008)["position"], "Sales Manager")
+
+    def test_direct_reports_invalidated_on_move(self):
+        self.assertEqual([emp["staff_id"] for emp in get_direct_reports(140001)], [140008, 150008])
+        self.assertEqual(get_direct_reports(150008), [])
+
+        # The employee is expired after the commit in setUp, the old manager must still be invalidated
+        db.session.get(Employee, 140008).reporting_manager = 150008
+        db.session.commit()
+
+        self.assertEqual([emp["staff_id"] for emp in get_direct_reports(140001)], [150008])
+        self.assertEqual([emp["staff_id"] for emp in get_direct_reports(150008)], [140008])
+
+    def test_new_employee_found_after_miss(self):
+        self.assertIsNone(get_employee_by_id(140009))
+
+        db.session.add(employee(140009, 140001, 2))
+        db.session.commit()
+
+        self.assertEqual(get_employee_by_id(140009)["staff_id"], 140009)
+        self.assertEqual(len(get_direct_reports(140001)), 3)
+
+    def test_full_team_cached(self):
+        statements = []
+        count = lambda *args: statements.append(args[2])
+
+        team = get_full_team(140001)
+        self.assertEqual([member["staff_id"] for member in team], [140008, 150008])
+        self.assertEqual(team[0]["reporting_manager"], 140001)
+
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            get_full_team(140001)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+        self.assertEqual(statements, [])
+
+        db.session.add(employee(150010, 150008, 2))
+        db.session.commit()
+        self.assertEqual([member["staff_id"] for member in get_full_team(140001)], [140008, 150008, 150010])
+
+    def test_full_team_dropped_along_management_chain(self):
+        db.session.add(employee(140009, 140008, 2))
+        db.session.add(employee(150010, 150008, 2))
+        db.session.commit()
+        for manager_id in [140001, 140008, 150008]:
+            get_full_team(manager_id)
+
+        db.session.get(Employee, 150010).position = "Developer"
+        db.session.commit()
+
+        # 150010 is in the teams of 150008 and 140001 only
+        self.assertIsNone(self.cache.get(full_team_key(150008)))
+        self.assertIsNone(self.cache.get(full_team_key(140001)))
+        self.assertIsNotNone(self.cache.get(full_team_key(140008)))
+        self.assertEqual(get_full_team(150008)[0]["position"], "Developer")
+
+    def test_bulk_delete_invalidates(self):
+        self.assertIsNotNone(get_employee_by_id(150008))
+        org = get_org_index()
+
+        Employee.query.filter_by(staff_id=150008).delete()
+        db.session.commit()
+
+        self.assertIsNone(get_employee_by_id(150008))
+        self.assertEqual([emp["staff_id"] for emp in get_direct_reports(140001)], [140008])
+        self.assertIsNot(get_org_index(), org)
+        self.assertIsNone(get_org_index().get(150008))
+
+    def test_other_worker_change_rebuilds_org_index(self):
+        org = get_org_index()
+        # A delete broadcast by another worker
+        get_cache().backend.remote.publish({"keys": ["wfh:employee:140008"]})
+        self.assertIsNot(get_org_index(), org)
+
+        org = get_org_index()
+        get_cache().backend.remote.publish({"keys": ["wfh:schedule:140008"]})
+        self.assertIs(get_org_index(), org)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,7 @@ import unittest
 import flask_testing
 from server import app, db
 from models import Employee
-from util.employee import get_all_department_teams
+from util.employee import get_all_department_teams, get_full_team
 
 class TestApp(flask_testing.TestCase):
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
@@ -87,7 +87,59 @@ class TestGetAllDepartmentTeams(TestApp):
         # print("Expected result:", expected_result)
         self.assertEqual(result, expected_result)
 
+    def add_sales_managers(self):
+        # Alice -> Dave (manager) -> Erin, and Alice -> Frank (manager) -> Grace
+        for staff_id, fname, manager_id, role in [
+            (140010, "Dave", 140001, 3),
+            (140011, "Erin", 140010, 2),
+            (140012, "Frank", 140001, 3),
+            (140013, "Grace", 140012, 2),
+        ]:
+            db.session.add(Employee(
+                staff_id=staff_id,
+                staff_fname=fname,
+                staff_lname="Tan",
+                dept="Sales",
+                position="Sales Associate",
+                country="Singapore",
+                email=f"{fname.lower()}.tan@example.com",
+                reporting_manager=manager_id,
+                role=role
+            ))
+        db.session.commit()
+
+    def test_get_all_department_teams_matches_full_team(self):
+        self.add_sales_managers()
+
+        result = get_all_department_teams()
+
+        for manager_id in [140001, 140010, 140012]:
+            self.assertEqual(result["Sales"][manager_id], get_full_team(manager_id))
+        self.assertEqual(
+            [member["staff_id"] for member in result["Sales"][140001]],
+            [140002, 140010, 140012, 140013, 140011]
+        )
+
+    def test_get_all_department_teams_skips_inactive(self):
+        self.add_sales_managers()
+        Employee.query.filter_by(staff_id=140010).first().is_active = False
+        db.session.commit()
+
+        result = get_all_department_teams()
+
+        self.assertEqual(result["Sales"][140001], get_full_team(140001))
+        self.assertEqual([member["staff_id"] for member in result["Sales"][140001]], [140002, 140012, 140013, 140011])
+
+    def test_get_all_department_teams_cycle(self):
+        self.add_sales_managers()
+        alice = Employee.query.filter_by(staff_id=140001).first()
+        alice.reporting_manager = 140012
+        db.session.commit()
+
+        result = get_all_department_teams()
 
+        for manager_id in [140001, 140010, 140012]:
+            self.assertEqual(result["Sales"][manager_id], get_full_team(manager_id))
 
 
 if __name__ == '__main__':
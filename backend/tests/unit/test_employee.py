@@ -1,5 +1,6 @@
 import unittest
 import flask_testing
+from sqlalchemy import event
 from server import app, db
 from models import Employee
 
@@ -136,5 +137,82 @@ class TestEmployee(TestApp):
             }
         ])
 
+class TestOrgData(TestApp):
+    def setUp(self):
+        super().setUp()
+        db.session.add(Employee(
+            staff_id=150008,
+            staff_fname="Eric",
+            staff_lname="Loh",
+            dept="Solutioning",
+            position="Director",
+            country="Malaysia",
+            email="Eric.Loh@allinone.com.sg",
+            reporting_manager=140008,
+            role=1
+        ))
+        db.session.commit()
+
+    def test_get_all(self):
+        response = self.client.get("/api/all")
+
+        self.assertEqual([employee["staff_id"] for employee in response.get_json()], [140008, 140880, 150008])
+        self.assertEqual(response.get_json()[0]["email"], "Jaclyn.Lee@allinone.com.sg")
+        self.assertNotIn("X-Next-Cursor", response.headers)
+
+    def test_get_all_pages(self):
+        response = self.client.get("/api/all?limit=2&fields=staff_id")
+        self.assertEqual(response.get_json(), [{"staff_id": 140008}, {"staff_id": 140880}])
+        self.assertEqual(response.headers["X-Next-Cursor"], "140880")
+
+        response = self.client.get("/api/all?limit=2&fields=staff_id&after=140880")
+        self.assertEqual(response.get_json(), [{"staff_id": 150008}])
+        self.assertNotIn("X-Next-Cursor", response.headers)
+
+    def test_get_all_fields_and_filters(self):
+        response = self.client.get("/api/all?fields=staff_fname,dept&dept=Sales")
+        self.assertEqual(response.get_json(), [
+            {"staff_fname": "Jaclyn", "dept": "Sales"},
+            {"staff_fname": "Heng", "dept": "Sales"}
+        ])
+
+        response = self.client.get("/api/all?fields=staff_id&country=Malaysia")
+        self.assertEqual(response.get_json(), [{"staff_id": 150008}])
+
+    def test_get_all_invalid_parameters(self):
+        self.assertEqual(self.client.get("/api/all?fields=staff_id,salary").get_json(), {"error": "Unknown fields: salary"})
+        self.assertEqual(self.client.get("/api/all?limit=0").status_code, 400)
+        self.assertEqual(self.client.get("/api/all?limit=abc").status_code, 400)
+        self.assertEqual(self.client.get("/api/all?after=abc").status_code, 400)
+
+class TestEmployeeBatch(TestApp):
+    def test_batch_lookup(self):
+        response = self.client.post("/api/employees/batch", json={"staff_ids": [140880, 999999, 140008]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([employee["staff_id"] for employee in response.get_json()["data"]], [140880, 140008])
+        self.assertEqual(response.get_json()["data"][0]["staff_fname"], "Heng")
+        self.assertEqual(response.get_json()["missing"], [999999])
+
+    def test_batch_lookup_one_query(self):
+        statements = []
+        count = lambda *args: statements.append(args[2])
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            self.client.post("/api/employees/batch", json={"staff_ids": [140008, 140880]})
+            # Both are cached now
+            response = self.client.post("/api/employees/batch", json={"staff_ids": [140880, 140008]})
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([employee["staff_id"] for employee in response.get_json()["data"]], [140880, 140008])
+
+    def test_batch_lookup_invalid(self):
+        self.assertEqual(self.client.post("/api/employees/batch", json={}).status_code, 400)
+        self.assertEqual(self.client.post("/api/employees/batch", json={"staff_ids": "140008"}).status_code, 400)
+        self.assertEqual(self.client.post("/api/employees/batch", json={"staff_ids": ["abc"]}).status_code, 400)
+        self.assertEqual(self.client.post("/api/employees/batch", json={"staff_ids": list(range(5001))}).status_code, 400)
+
 if __name__ == '__main__':
     unittest.main()
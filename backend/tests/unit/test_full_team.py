@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import patch
+import flask_testing
+from sqlalchemy import event
+from server import app, db
+from models import Employee
+from util.employee import get_full_team
+
+class TestApp(flask_testing.TestCase):
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['TESTING'] = True
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.create_all()
+        employees = [
+            # The CEO reports to himself, like in employeenew.csv
+            {"staff_id": 130002, "staff_fname": "Jack", "staff_lname": "Sim", "dept": "CEO", "position": "MD", "reporting_manager": 130002, "role": 1},
+            {"staff_id": 140001, "staff_fname": "Derek", "staff_lname": "Tan", "dept": "Sales", "position": "Director", "reporting_manager": 130002, "role": 1},
+            {"staff_id": 140008, "staff_fname": "Jaclyn", "staff_lname": "Lee", "dept": "Sales", "position": "Sales Manager", "reporting_manager": 140001, "role": 3},
+            {"staff_id": 140894, "staff_fname": "Rahim", "staff_lname": "Khalid", "dept": "Sales", "position": "Sales Manager", "reporting_manager": 140001, "role": 3},
+            {"staff_id": 140880, "staff_fname": "Heng", "staff_lname": "Chan", "dept": "Sales", "position": "Account Manager", "reporting_manager": 140008, "role": 2},
+            {"staff_id": 140881, "staff_fname": "Wei", "staff_lname": "Lim", "dept": "Sales", "position": "Account Manager", "reporting_manager": 140894, "role": 2},
+            {"staff_id": 140882, "staff_fname": "Siti", "staff_lname": "Salleh", "dept": "Sales", "position": "Account Manager", "reporting_manager": 140894, "role": 2},
+            {"staff_id": 150008, "staff_fname": "Eric", "staff_lname": "Loh", "dept": "Solutioning", "position": "Director", "reporting_manager": 130002, "role": 1},
+        ]
+
+        for emp in employees:
+            db.session.add(Employee(
+                country="Singapore",
+                email=f"{emp['staff_fname']}.{emp['staff_lname']}@allinone.com.sg",
+                **emp
+            ))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+class TestGetFullTeam(TestApp):
+    def team_ids(self, rm_id):
+        return [employee["staff_id"] for employee in get_full_team(rm_id)]
+
+    def test_get_full_team_order(self):
+        # Direct reports first, then the last manager's subteam is explored first
+        self.assertEqual(self.team_ids(140001), [140008, 140894, 140881, 140882, 140880])
+
+    def test_get_full_team_self_reporting_root(self):
+        self.assertEqual(self.team_ids(130002), [140001, 150008, 140008, 140894, 140881, 140882, 140880])
+
+    def test_get_full_team_cycle(self):
+        director = Employee.query.get(140001)
+        director.reporting_manager = 140008
+        db.session.commit()
+
+        self.assertEqual(self.team_ids(140008), [140001, 140880, 140894, 140881, 140882])
+
+    def test_get_full_team_skips_inactive(self):
+        for staff_id in [140894, 140880]:
+            Employee.query.get(staff_id).is_active = False
+        db.session.commit()
+
+        # 140894 left, the staff reporting to them are still part of the team
+        self.assertEqual(self.team_ids(140001), [140008, 140881, 140882])
+
+    def test_get_full_team_no_team(self):
+        self.assertEqual(self.team_ids(140880), [])
+        self.assertEqual(self.team_ids(999999), [])
+
+    def test_get_full_team_single_query(self):
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", count_statement)
+        try:
+            get_full_team(130002)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_statement)
+
+        self.assertEqual(len(statements), 1)
+
+    def test_team_route_matches_full_team(self):
+        # Reports of role 2 employees are not part of the team
+        db.session.add(Employee(staff_id=140883, staff_fname="Ali", staff_lname="Tan", dept="Sales", position="Intern",
+                                country="Singapore", email="Ali.Tan@allinone.com.sg", reporting_manager=140880, role=2))
+        db.session.commit()
+
+        response = self.client.get("/api/team/140001")
+        self.assertEqual([employee["staff_id"] for employee in response.get_json()], [140008, 140894, 140881, 140882, 140880])
+
+        # A role 2 employee gets their manager's team
+        response = self.client.get("/api/team/140880")
+        self.assertEqual([employee["staff_id"] for employee in response.get_json()], [140880])
+
+    @patch('util.employee.RECURSIVE_CTE_DIALECTS', set())
+    def test_get_full_team_level_fallback(self):
+        self.assertEqual(self.team_ids(140001), [140008, 140894, 140881, 140882, 140880])
+        self.assertEqual(self.team_ids(130002), [140001, 150008, 140008, 140894, 140881, 140882, 140880])
+
+if __name__ == '__main__':
+    unittest.main()
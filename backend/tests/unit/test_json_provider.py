@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import patch
+import datetime
+import decimal
+import uuid
+from markupsafe import Markup
+from server import app
+from models import *
+from util.json_provider import OrjsonProvider
+
+class TestOrjsonProvider(unittest.TestCase):
+    def setUp(self):
+        self.provider = OrjsonProvider(app)
+
+    def test_app_uses_provider(self):
+        self.assertIsInstance(app.json, OrjsonProvider)
+
+    def test_native_types(self):
+        request_uuid = uuid.UUID("12345678-1234-5678-1234-567812345678")
+        data = self.provider.loads(self.provider.dumps({
+            "specific_date": datetime.date(2024, 9, 15),
+            "log_datetime": datetime.datetime(2024, 9, 15, 10, 30),
+            "request_id": request_uuid,
+            140008: "Jaclyn"
+        }))
+
+        self.assertEqual(data, {
+            "specific_date": "2024-09-15",
+            "log_datetime": "2024-09-15T10:30:00",
+            "request_id": "12345678-1234-5678-1234-567812345678",
+            "140008": "Jaclyn"
+        })
+
+    def test_sorts_keys(self):
+        self.assertEqual(self.provider.dumps({"b": 1, "a": 2}), '{"a":2,"b":1}')
+
+    def test_response(self):
+        with app.app_context():
+            response = self.provider.response([{"specific_date": datetime.date(2024, 9, 15)}])
+
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(response.get_data(), b'[{"specific_date":"2024-09-15"}]\n')
+
+    def test_falls_back_to_json_module(self):
+        with patch('util.json_provider.orjson', None):
+            data = self.provider.dumps({"specific_date": datetime.date(2024, 9, 15)})
+            self.assertEqual(self.provider.loads(data), {"specific_date": "2024-09-15"})
+
+            with app.app_context():
+                response = self.provider.response({"staff_id": 140008})
+            self.assertEqual(response.get_json(), {"staff_id": 140008})
+
+    def test_falls_back_for_big_integers(self):
+        self.assertEqual(self.provider.dumps({"value": 2 ** 70}), '{"value": %d}' % 2 ** 70)
+
+    def test_flask_default_types(self):
+        data = self.provider.loads(self.provider.dumps({"amount": decimal.Decimal("1.50"), "html": Markup("<b>hi</b>")}))
+        self.assertEqual(data, {"amount": "1.50", "html": "<b>hi</b>"})
+
+    def test_response_arguments(self):
+        with app.app_context():
+            self.assertEqual(self.provider.response(1, 2).get_json(), [1, 2])
+            self.assertEqual(self.provider.response(staff_id=140008).get_json(), {"staff_id": 140008})
+            self.assertIsNone(self.provider.response().get_json())
+            with self.assertRaises(TypeError):
+                self.provider.response(1, staff_id=140008)
+
+    def test_unsupported_type(self):
+        with self.assertRaises(TypeError):
+            self.provider.dumps({"value": object()})
+
+class TestJsonColumns(unittest.TestCase):
+    def test_rows_match_json(self):
+        req = WFHRequests(
+            request_id="1",
+            staff_id=140008,
+            manager_id=140001,
+            specific_date=datetime.date(2024, 9, 15),
+            is_am=True,
+            is_pm=False,
+            request_status="Pending",
+            apply_date=datetime.date(2024, 9, 1),
+            request_reason="Personal matters"
+        )
+        row = tuple(getattr(req, field) for field in WFHRequests.json_fields)
+
+        provider = OrjsonProvider(app)
+        self.assertEqual(provider.loads(provider.dumps(WFHRequests.json_rows([row]))), [req.json()])
+
+    def test_columns_follow_fields(self):
+        self.assertEqual([column.key for column in Employee.json_columns()], list(Employee.json_fields))
+        self.assertEqual(set(Employee.json_fields), set(Employee(staff_id=1).json()))
+        self.assertEqual(set(WFHRequests.json_fields), set(WFHRequests(request_id="1").json()))
+
+if __name__ == '__main__':
+    unittest.main()
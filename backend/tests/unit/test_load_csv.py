@@ -0,0 +1,262 @@
+import os
+import unittest
+import tempfile
+import flask_testing
+from datetime import date
+from server import app, db
+from models import Employee, EmployeeSyncHash, WFHRequests
+from util.employee import get_direct_reports
+from util.occupancy import get_team_day_occupancy
+from util.load_csv import import_employee_data, sync_employee_data, order_by_reporting_line, order_chunks_by_reporting_line, iter_employee_chunks, read_employee_rows, DEFAULT_CSV
+from util.org_index import get_org_index
+
+HEADER = "Staff_ID,Staff_FName,Staff_LName,Dept,Position,Country,Email,Reporting_Manager,Role\n"
+
+def employee_row(staff_id, reporting_manager, role=2):
+    return {
+        "staff_id": staff_id,
+        "staff_fname": "Test",
+        "staff_lname": str(staff_id),
+        "dept": "Sales",
+        "position": "Staff",
+        "country": "Singapore",
+        "email": f"{staff_id}@allinone.com.sg",
+        "reporting_manager": reporting_manager,
+        "role": role
+    }
+
+class TestOrderByReportingLine(unittest.TestCase):
+    def test_managers_before_reports(self):
+        rows = [employee_row(3, 2), employee_row(2, 1, 3), employee_row(4, 1), employee_row(1, 1, 1)]
+        ordered = [row["staff_id"] for row in order_by_reporting_line(rows)]
+
+        self.assertEqual(sorted(ordered), [1, 2, 3, 4])
+        self.assertLess(ordered.index(1), ordered.index(2))
+        self.assertLess(ordered.index(2), ordered.index(3))
+
+    def test_manager_outside_file(self):
+        rows = [employee_row(3, 2), employee_row(2, 999, 3)]
+        self.assertEqual([row["staff_id"] for row in order_by_reporting_line(rows)], [2, 3])
+
+    def test_cycle(self):
+        rows = [employee_row(1, 2), employee_row(2, 1), employee_row(3, 3, 1)]
+        with self.assertRaises(ValueError):
+            order_by_reporting_line(rows)
+
+    def test_chunks_wait_for_manager(self):
+        chunks = [[employee_row(3, 2), employee_row(1, 1, 1)], [employee_row(4, 999)], [employee_row(2, 1, 3)]]
+        ordered = [[row["staff_id"] for row in chunk] for chunk in order_chunks_by_reporting_line(chunks)]
+
+        # 3 waits for its manager 2, 4 reports to a manager outside the file and is written last
+        self.assertEqual(ordered, [[1], [2, 3], [4]])
+
+    def test_chunks_cycle(self):
+        chunks = [[employee_row(1, 2)], [employee_row(2, 1)]]
+        with self.assertRaises(ValueError):
+            list(order_chunks_by_reporting_line(chunks))
+
+class TestApp(flask_testing.TestCase):
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['TESTING'] = True
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def write_csv(self, lines):
+        csv_file = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False)
+        csv_file.write(HEADER + "".join(line + "\n" for line in lines))
+        csv_file.close()
+        self.addCleanup(os.remove, csv_file.name)
+        return csv_file.name
+
+class TestImportEmployeeData(TestApp):
+    def test_read_in_chunks(self):
+        csv_file = self.write_csv([
+            "140008,Jaclyn,Lee,Sales,Sales Manager,Singapore,Jaclyn.Lee@allinone.com.sg,140001,3",
+            "140001,Derek,Tan,Sales,Director,Singapore,Derek.Tan@allinone.com.sg,,1",
+            "140009,Sophia,Toh,Sales,Sales Manager,Singapore,Sophia.Toh@allinone.com.sg,140001,3",
+        ])
+
+        chunks = list(iter_employee_chunks(csv_file, chunk_size=2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertEqual(chunks[0][0]["staff_id"], 140008)
+        self.assertIsNone(chunks[0][1]["reporting_manager"])
+
+    def test_invalid_rows(self):
+        with self.assertRaisesRegex(ValueError, "Line 3: Role must be an integer"):
+            read_employee_rows(self.write_csv([
+                "140001,Derek,Tan,Sales,Director,Singapore,Derek.Tan@allinone.com.sg,,1",
+                "140008,Jaclyn,Lee,Sales,Sales Manager,Singapore,Jaclyn.Lee@allinone.com.sg,140001,Staff",
+            ]))
+        with self.assertRaisesRegex(ValueError, "Line 2: Email is required"):
+            read_employee_rows(self.write_csv(["140001,Derek,Tan,Sales,Director,Singapore,,,1"]))
+
+    def test_missing_columns(self):
+        csv_file = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False)
+        csv_file.write("Staff_ID,Staff_FName\n140001,Derek\n")
+        csv_file.close()
+        self.addCleanup(os.remove, csv_file.name)
+
+        with self.assertRaisesRegex(ValueError, "Missing columns"):
+            read_employee_rows(csv_file.name)
+
+    def test_import_in_chunks(self):
+        result = import_employee_data(DEFAULT_CSV, chunk_size=50)
+
+        self.assertEqual(result["rows"], Employee.query.count())
+        self.assertEqual(db.session.get(Employee, 140001).reporting_manager, 130002)
+
+    def test_import_company_file(self):
+        result = import_employee_data(DEFAULT_CSV)
+
+        self.assertEqual(result["rows"], len(read_employee_rows(DEFAULT_CSV)))
+        self.assertEqual(Employee.query.count(), result["rows"])
+        self.assertEqual(db.session.get(Employee, 130002).reporting_manager, 130002)
+        self.assertEqual(db.session.get(Employee, 140001).dept, "Sales")
+
+    def test_upsert_on_staff_id(self):
+        import_employee_data(self.write_csv([
+            "140008,Jaclyn,Lee,Sales,Sales Manager,Singapore,Jaclyn.Lee@allinone.com.sg,140001,3",
+            "140001,Derek,Tan,Sales,Director,Singapore,Derek.Tan@allinone.com.sg,140001,1",
+        ]))
+        self.assertEqual(len(get_org_index().direct_reports(140001)), 1)
+
+        result = import_employee_data(self.write_csv([
+            "140001,Derek,Tan,Sales,Director,Singapore,Derek.Tan@allinone.com.sg,140001,1",
+            "140008,Jaclyn,Lee,Sales,Sales Director,Singapore,Jaclyn.Lee@allinone.com.sg,140001,1",
+            "140009,Sophia,Toh,Sales,Sales Manager,Singapore,Sophia.Toh@allinone.com.sg,140008,3",
+        ]))
+
+        self.assertEqual(result["rows"], 3)
+        self.assertEqual(Employee.query.count(), 3)
+        self.assertEqual(db.session.get(Employee, 140008).position, "Sales Director")
+        self.assertEqual([emp["staff_id"] for emp in get_org_index().direct_reports(140008)], [140009])
+
+class TestSyncEmployeeData(TestApp):
+    def setUp(self):
+        super().setUp()
+        import_employee_data(self.write_csv([
+            "130002,Jack,Sim,CEO,MD,Singapore,jack.sim@allinone.com.sg,130002,1",
+            "140001,Derek,Tan,Sales,Director,Singapore,Derek.Tan@allinone.com.sg,130002,1",
+            "150008,Eric,Loh,Solutioning,Director,Singapore,Eric.Loh@allinone.com.sg,130002,1",
+            "140008,Jaclyn,Lee,Sales,Sales Manager,Singapore,Jaclyn.Lee@allinone.com.sg,140001,3",
+            "140009,Sophia,Toh,Sales,Sales Manager,Singapore,Sophia.Toh@allinone.com.sg,140001,3",
+            "140010,Susan,Goh,Sales,Sales Manager,Singapore,Susan.Goh@allinone.com.sg,140001,3",
+        ]))
+        db.session.add(WFHRequests(
+            request_id="1",
+            staff_id=140009,
+            manager_id=140001,
+            specific_date=date(2024, 9, 15),
+            is_am=True,
+            is_pm=True,
+            request_status="Approved",
+            apply_date=date(2024, 9, 1),
+            request_reason="Personal matters"
+        ))
+        db.session.commit()
+
+    def new_export(self):
+        # 140008 moves to Eric's team, 150010 joins it, 140009 and 140010 leave
+        return self.write_csv([
+            "130002,Jack,Sim,CEO,MD,Singapore,jack.sim@allinone.com.sg,130002,1",
+            "140001,Derek,Tan,Sales,Director,Singapore,Derek.Tan@allinone.com.sg,130002,1",
+            "150008,Eric,Loh,Solutioning,Director,Singapore,Eric.Loh@allinone.com.sg,130002,1",
+            "150010,Wei,Lim,Solutioning,Developers,Singapore,Wei.Lim@allinone.com.sg,150008,2",
+            "140008,Jaclyn,Lee,Solutioning,Sales Manager,Singapore,Jaclyn.Lee@allinone.com.sg,150008,3",
+        ])
+
+    def test_sync_applies_only_changes(self):
+        result = sync_employee_data(self.new_export())
+
+        self.assertEqual(result["inserted"], 1)
+        self.assertEqual(result["updated"], 1)
+        self.assertEqual(result["deleted"], 1)
+        self.assertEqual(result["unchanged"], 3)
+        # 140009 has WFH history and is kept
+        self.assertEqual(result["retained"], [140009])
+        self.assertEqual(result["affected_managers"], [140001, 150008])
+
+        self.assertIsNone(db.session.get(Employee, 140010))
+        self.assertIsNotNone(db.session.get(Employee, 140009))
+        self.assertEqual(db.session.get(Employee, 140008).reporting_manager, 150008)
+        self.assertEqual([emp["staff_id"] for emp in get_org_index().direct_reports(150008)], [140008, 150010])
+        self.assertEqual(EmployeeSyncHash.query.count(), 6)
+
+    def test_sync_without_changes(self):
+        sync_employee_data(self.new_export())
+        org = get_org_index()
+
+        result = sync_employee_data(self.new_export())
+
+        self.assertEqual((result["inserted"], result["updated"], result["deleted"], result["unchanged"]), (0, 0, 0, 5))
+        self.assertEqual(result["affected_managers"], [])
+        self.assertIs(get_org_index(), org)
+
+    def test_retained_employee_inactive(self):
+        self.assertEqual(get_team_day_occupancy(140001, "2024-09-15"), (1, 1))
+        sync_employee_data(self.new_export())
+
+        # 140009 left, only their history is kept
+        self.assertFalse(db.session.get(Employee, 140009).is_active)
+        self.assertEqual(get_direct_reports(140001), [])
+        self.assertEqual(get_org_index().direct_reports(140001), [])
+        self.assertEqual(get_team_day_occupancy(140001, "2024-09-15"), (0, 0))
+
+    def move_export(self):
+        # 140009 moves to Eric's team
+        return self.write_csv([
+            "130002,Jack,Sim,CEO,MD,Singapore,jack.sim@allinone.com.sg,130002,1",
+            "140001,Derek,Tan,Sales,Director,Singapore,Derek.Tan@allinone.com.sg,130002,1",
+            "150008,Eric,Loh,Solutioning,Director,Singapore,Eric.Loh@allinone.com.sg,130002,1",
+            "140008,Jaclyn,Lee,Sales,Sales Manager,Singapore,Jaclyn.Lee@allinone.com.sg,140001,3",
+            "140009,Sophia,Toh,Sales,Sales Manager,Singapore,Sophia.Toh@allinone.com.sg,150008,3",
+            "140010,Susan,Goh,Sales,Sales Manager,Singapore,Susan.Goh@allinone.com.sg,140001,3",
+        ])
+
+    def test_sync_moves_occupancy(self):
+        sync_employee_data(self.move_export())
+
+        self.assertEqual(get_team_day_occupancy(140001, "2024-09-15"), (0, 0))
+        self.assertEqual(get_team_day_occupancy(150008, "2024-09-15"), (1, 1))
+
+    def test_manager_of_retained_employee_kept(self):
+        sync_employee_data(self.move_export())
+        # Eric has no WFH history of his own, but 140009 still reports to him
+        result = sync_employee_data(self.write_csv([
+            "130002,Jack,Sim,CEO,MD,Singapore,jack.sim@allinone.com.sg,130002,1",
+            "140001,Derek,Tan,Sales,Director,Singapore,Derek.Tan@allinone.com.sg,130002,1",
+            "140008,Jaclyn,Lee,Sales,Sales Manager,Singapore,Jaclyn.Lee@allinone.com.sg,140001,3",
+        ]))
+
+        self.assertEqual(result["retained"], [140009, 150008])
+        self.assertEqual(result["deleted"], 1)
+        self.assertFalse(db.session.get(Employee, 150008).is_active)
+        self.assertEqual(db.session.get(Employee, 140009).reporting_manager, 150008)
+        self.assertEqual(get_team_day_occupancy(150008, "2024-09-15"), (0, 0))
+
+    def test_returning_employee_reactivated(self):
+        sync_employee_data(self.new_export())
+        result = sync_employee_data(self.write_csv([
+            "130002,Jack,Sim,CEO,MD,Singapore,jack.sim@allinone.com.sg,130002,1",
+            "140001,Derek,Tan,Sales,Director,Singapore,Derek.Tan@allinone.com.sg,130002,1",
+            "150008,Eric,Loh,Solutioning,Director,Singapore,Eric.Loh@allinone.com.sg,130002,1",
+            "140009,Sophia,Toh,Sales,Sales Manager,Singapore,Sophia.Toh@allinone.com.sg,140001,3",
+        ]))
+
+        self.assertEqual(result["reactivated"], [140009])
+        self.assertTrue(db.session.get(Employee, 140009).is_active)
+        self.assertEqual([emp["staff_id"] for emp in get_direct_reports(140001)], [140009])
+        self.assertEqual(get_team_day_occupancy(140001, "2024-09-15"), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
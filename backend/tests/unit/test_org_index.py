@@ -0,0 +1,127 @@
+import unittest
+import flask_testing
+from sqlalchemy import text
+from server import app, db
+from models import Employee
+from util.cache import get_cache
+from util.org_index import OrgIndex, get_org_index, ORG_VERSION_KEY
+
+def employee(staff_id, reporting_manager, role):
+    return {
+        "staff_id": staff_id,
+        "staff_fname": "Test",
+        "staff_lname": str(staff_id),
+        "dept": "Sales",
+        "position": "Staff",
+        "country": "Singapore",
+        "email": f"{staff_id}@allinone.com.sg",
+        "reporting_manager": reporting_manager,
+        "role": role
+    }
+
+class TestOrgIndex(unittest.TestCase):
+    def setUp(self):
+        self.org = OrgIndex([
+            employee(130002, 130002, 1),
+            employee(140001, 130002, 1),
+            employee(140008, 140001, 3),
+            employee(140894, 140001, 3),
+            employee(140880, 140008, 2),
+            employee(140881, 140894, 2),
+            employee(150008, 130002, 1),
+        ])
+
+    def ids(self, employees):
+        return [emp["staff_id"] for emp in employees]
+
+    def test_subtree(self):
+        self.assertEqual(self.ids(self.org.subtree(140001)), [140008, 140880, 140894, 140881])
+        self.assertEqual(self.ids(self.org.subtree(130002)), [140001, 140008, 140880, 140894, 140881, 150008])
+        self.assertEqual(self.org.subtree(140880), [])
+        self.assertEqual(self.org.subtree(999999), [])
+
+    def test_subtree_skips_inactive(self):
+        org = OrgIndex(self.org.employees.values(), inactive=[140894, 140880])
+        self.assertEqual(self.ids(org.subtree(140001)), [140008, 140881])
+
+    def test_direct_reports(self):
+        self.assertEqual(self.ids(self.org.direct_reports(140001)), [140008, 140894])
+        # The CEO is not his own direct report
+        self.assertEqual(self.ids(self.org.direct_reports(130002)), [140001, 150008])
+
+    def test_is_descendant(self):
+        self.assertTrue(self.org.is_descendant(140880, 140001))
+        self.assertTrue(self.org.is_descendant(140880, 130002))
+        self.assertFalse(self.org.is_descendant(140880, 140894))
+        self.assertFalse(self.org.is_descendant(140001, 140001))
+        self.assertFalse(self.org.is_descendant(140001, 140880))
+        self.assertFalse(self.org.is_descendant(140001, 999999))
+
+    def test_ancestors(self):
+        self.assertEqual(self.ids(self.org.ancestors(140880)), [140008, 140001, 130002])
+        self.assertEqual(self.org.ancestors(130002), [])
+
+    def test_get_accepts_string_ids(self):
+        self.assertEqual(self.org.get("140008")["staff_id"], 140008)
+        self.assertIsNone(self.org.get("abc"))
+
+    def test_cycle(self):
+        org = OrgIndex([
+            employee(1, 2, 3),
+            employee(2, 1, 3),
+            employee(3, 2, 2),
+        ])
+        self.assertEqual(self.ids(org.subtree(1)), [2, 3])
+        self.assertEqual(self.ids(org.ancestors(3)), [2, 1])
+
+class TestOrgIndexVersion(flask_testing.TestCase):
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['TESTING'] = True
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.create_all()
+        db.session.add(Employee(**employee(140001, None, 1)))
+        db.session.add(Employee(**employee(140008, 140001, 3)))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_index_is_reused(self):
+        self.assertIs(get_org_index(), get_org_index())
+
+    def test_index_rebuilt_on_employee_change(self):
+        org = get_org_index()
+        self.assertEqual(len(org.direct_reports(140001)), 1)
+
+        db.session.add(Employee(**employee(140009, 140001, 2)))
+        db.session.commit()
+
+        self.assertIsNot(get_org_index(), org)
+        self.assertEqual(len(get_org_index().direct_reports(140001)), 2)
+
+    def test_commit_publishes_shared_version(self):
+        version = get_cache().get(ORG_VERSION_KEY)
+        db.session.add(Employee(**employee(140009, 140001, 2)))
+        db.session.commit()
+        self.assertNotEqual(get_cache().get(ORG_VERSION_KEY), version)
+
+    def test_index_rebuilt_on_change_in_other_process(self):
+        org = get_org_index()
+
+        # Written by another process, nothing in this one saw it but the shared version
+        db.session.execute(text("UPDATE employee SET reporting_manager = NULL WHERE staff_id = 140008"))
+        db.session.commit()
+        self.assertIs(get_org_index(), org)
+
+        get_cache().set(ORG_VERSION_KEY, "other process")
+        self.assertIsNot(get_org_index(), org)
+        self.assertEqual(get_org_index().direct_reports(140001), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import unittest
+from unittest.mock import patch
+import flask_testing
+from datetime import date
+from server import app, db
+from models import *
+from util.outbox import add_outbox_event, requests_changed, process_outbox, retry_failed_outbox, MAX_ATTEMPTS
+from util.response_cache import schedule_version
+from util.unit_of_work import unit_of_work
+from app.task import relay_outbox
+
+class TestApp(flask_testing.TestCase):
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['TESTING'] = True
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.create_all()
+        db.session.add(Employee(
+            staff_id=140001,
+            staff_fname="Derek",
+            staff_lname="Tan",
+            dept="Sales",
+            position="Director",
+            country="Singapore",
+            email="Derek.Tan@allinone.com.sg",
+            reporting_manager=None,
+            role=1
+        ))
+        self.wfh_request = WFHRequests(
+            request_id="1",
+            staff_id=140001,
+            manager_id=140001,
+            specific_date=date(2024, 9, 15),
+            is_am=True,
+            is_pm=False,
+            request_status="Approved",
+            apply_date=date(2024, 9, 1),
+            request_reason="Personal matters"
+        )
+        db.session.add(self.wfh_request)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+@patch('util.outbox.dispatch_outbox')
+class TestOutbox(TestApp):
+    def test_event_written_with_the_change(self, mock_dispatch):
+        with unit_of_work():
+            requests_changed([self.wfh_request.json()])
+            mock_dispatch.assert_not_called()
+        mock_dispatch.assert_called_once()
+
+        with unit_of_work() as uow:
+            requests_changed([self.wfh_request.json()])
+            uow.mark_rollback_only()
+        self.assertEqual(Outbox.query.count(), 1)
+        self.assertEqual(mock_dispatch.call_count, 1)
+
+    def test_process_writes_logs_at_change_time(self, mock_dispatch):
+        requests_changed([self.wfh_request.json()])
+        created_at = Outbox.query.first().created_at
+
+        self.assertEqual(process_outbox(), 1)
+
+        log = WFHRequestLogs.query.one()
+        self.assertEqual(log.log_datetime, created_at)
+        self.assertEqual(log.request_status_log, "Approved")
+        self.assertIsNotNone(Outbox.query.first().processed_at)
+        # Nothing left to do
+        self.assertEqual(process_outbox(), 0)
+
+    def test_failing_event_does_not_block_others(self, mock_dispatch):
+        add_outbox_event("wfh_requests_changed", {"requests": [{"request_id": "1"}]})
+        requests_changed([self.wfh_request.json()])
+
+        self.assertEqual(process_outbox(), 1)
+
+        failed, processed = Outbox.query.order_by(Outbox.outbox_id).all()
+        self.assertEqual((failed.attempts, failed.processed_at), (1, None))
+        self.assertIsNotNone(processed.processed_at)
+        self.assertEqual(WFHRequestLogs.query.count(), 1)
+
+    def test_gives_up_after_max_attempts(self, mock_dispatch):
+        add_outbox_event("wfh_requests_changed", {"requests": [{"request_id": "1"}]})
+        with self.assertLogs(app.logger, "ERROR") as logs:
+            for _ in range(MAX_ATTEMPTS + 1):
+                process_outbox()
+
+        event = Outbox.query.first()
+        self.assertEqual(event.attempts, MAX_ATTEMPTS)
+        self.assertIsNotNone(event.failed_at)
+        self.assertIn("Traceback", logs.output[0])
+        self.assertTrue(logs.output[-1].startswith("CRITICAL"))
+
+    def test_retry_failed_event(self, mock_dispatch):
+        add_outbox_event("wfh_requests_changed", {"requests": [{"request_id": "1"}]})
+        with patch('util.outbox.MAX_ATTEMPTS', 1), self.assertLogs(app.logger, "ERROR"):
+            self.assertEqual(process_outbox(), 0)
+        self.assertIsNotNone(Outbox.query.first().failed_at)
+        self.assertEqual(retry_failed_outbox(), 1)
+
+        # Retried events get a fresh set of attempts and land once the handler works again
+        event = Outbox.query.first()
+        self.assertEqual((event.attempts, event.failed_at), (0, None))
+        with patch('util.outbox.OUTBOX_HANDLERS', {"wfh_requests_changed": []}):
+            self.assertEqual(process_outbox(), 1)
+        self.assertIsNotNone(Outbox.query.first().processed_at)
+        self.assertEqual(retry_failed_outbox(), 0)
+
+    def test_relay_drains_backlog(self, mock_dispatch):
+        for day in range(15, 18):
+            requests_changed([{**self.wfh_request.json(), "specific_date": f"2024-09-{day}"}])
+
+        with patch('app.task.OUTBOX_BATCH_SIZE', 2):
+            self.assertEqual(relay_outbox(), {"processed": 3})
+        self.assertEqual(Outbox.query.filter(Outbox.processed_at.is_(None)).count(), 0)
+
+    def test_pending_event_changes_schedule_version(self, mock_dispatch):
+        version = schedule_version([140001])
+        requests_changed([self.wfh_request.json()])
+        pending_version = schedule_version([140001])
+        self.assertNotEqual(pending_version, version)
+
+        process_outbox()
+        self.assertNotIn(schedule_version([140001]), [version, pending_version])
+
+    def test_other_staff_events_do_not_reuse_version(self, mock_dispatch):
+        db.session.add(Employee(staff_id=140002, staff_fname="Susan", staff_lname="Goh", dept="Sales",
+                                position="Account Manager", country="Singapore", email="Susan.Goh@allinone.com.sg",
+                                reporting_manager=140001, role=2))
+        other_request = WFHRequests(request_id="2", staff_id=140002, manager_id=140001, specific_date=date(2024, 9, 16),
+                                    is_am=True, is_pm=False, request_status="Pending", apply_date=date(2024, 9, 1),
+                                    request_reason="Personal matters")
+        self.wfh_request.request_status = "Pending"
+        db.session.add(other_request)
+        db.session.commit()
+
+        # Staff 2 has a pending event, which is not part of staff 1's version
+        requests_changed([other_request.json()])
+        version = schedule_version([140001])
+
+        # The relay drains it, then staff 1's request is approved
+        process_outbox()
+        self.assertEqual(schedule_version([140001]), version)
+        self.wfh_request.request_status = "Approved"
+        db.session.commit()
+        requests_changed([self.wfh_request.json()])
+        self.assertNotEqual(schedule_version([140001]), version)
+
+    def test_one_event_per_staff(self, mock_dispatch):
+        requests_changed([self.wfh_request.json(), {**self.wfh_request.json(), "staff_id": 140002}])
+        self.assertEqual([event.staff_id for event in Outbox.query.order_by(Outbox.outbox_id)], [140001, 140002])
+
+class TestOutboxDispatch(TestApp):
+    def test_relayed_after_commit(self):
+        # Celery runs tasks eagerly under TESTING
+        with unit_of_work():
+            requests_changed([self.wfh_request.json()])
+        self.assertEqual(WFHRequestLogs.query.count(), 1)
+
+    def test_lost_dispatch_left_for_beat(self):
+        with patch('app.task.relay_outbox.delay', side_effect=ConnectionError("broker down")):
+            with unit_of_work():
+                requests_changed([self.wfh_request.json()])
+
+        self.assertEqual(WFHRequestLogs.query.count(), 0)
+        self.assertEqual(relay_outbox(), {"processed": 1})
+        self.assertEqual(WFHRequestLogs.query.count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import unittest
+from unittest.mock import patch
+import flask_testing
+import json
+from datetime import date
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from server import app, db
+from models import *
+from util.unit_of_work import unit_of_work, in_unit_of_work, on_commit
+from util.wfh_requests import update_request
+from util.request_decisions import create_request_decision
+from util.wfh_request_logs import log_wfh_request
+
+class TestApp(flask_testing.TestCase):
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['TESTING'] = True
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.create_all()
+        db.session.add(Employee(
+            staff_id=140001,
+            staff_fname="Derek",
+            staff_lname="Tan",
+            dept="Sales",
+            position="Director",
+            country="Singapore",
+            email="Derek.Tan@allinone.com.sg",
+            reporting_manager=None,
+            role=1
+        ))
+        for staff_id in [140008, 140009]:
+            db.session.add(Employee(
+                staff_id=staff_id,
+                staff_fname="Staff",
+                staff_lname=str(staff_id),
+                dept="Sales",
+                position="Sales Manager",
+                country="Singapore",
+                email=f"{staff_id}@allinone.com.sg",
+                reporting_manager=140001,
+                role=3
+            ))
+        db.session.add(WFHRequests(
+            request_id="1",
+            staff_id=140008,
+            manager_id=140001,
+            specific_date=date(2024, 9, 15),
+            is_am=True,
+            is_pm=False,
+            request_status="Pending",
+            apply_date=date(2024, 9, 1),
+            request_reason="Personal matters"
+        ))
+        db.session.commit()
+
+        self.commits = 0
+        event.listen(Session, "after_commit", self.count_commit)
+
+    def tearDown(self):
+        event.remove(Session, "after_commit", self.count_commit)
+        db.session.remove()
+        db.drop_all()
+
+    def count_commit(self, session):
+        self.commits += 1
+
+class TestUnitOfWork(TestApp):
+    def test_helpers_commit_on_their_own(self):
+        new_req = update_request("1", "2024-09-15", {"request_status": "Approved"})
+        log_wfh_request(new_req["new_request"])
+
+        self.assertEqual(self.commits, 2)
+        self.assertFalse(in_unit_of_work())
+
+    def test_helpers_share_one_commit(self):
+        with unit_of_work():
+            self.assertTrue(in_unit_of_work())
+            new_req = update_request("1", "2024-09-15", {"request_status": "Approved"})
+            log_wfh_request(new_req["new_request"])
+            self.assertEqual(self.commits, 0)
+
+        self.assertEqual(self.commits, 1)
+        self.assertFalse(in_unit_of_work())
+        self.assertEqual(WFHRequestLogs.query.count(), 1)
+
+    def test_rollback_on_exception(self):
+        with self.assertRaises(ValueError):
+            with unit_of_work():
+                update_request("1", "2024-09-15", {"request_status": "Approved"})
+                raise ValueError("failed")
+
+        self.assertEqual(self.commits, 0)
+        self.assertEqual(WFHRequests.query.filter_by(request_id="1").first().request_status, "Pending")
+
+    def test_on_commit(self):
+        callbacks = []
+        with unit_of_work():
+            on_commit(lambda: callbacks.append(self.commits))
+            self.assertEqual(callbacks, [])
+        self.assertEqual(callbacks, [1])
+
+        with unit_of_work() as uow:
+            on_commit(lambda: callbacks.append("rolled back"))
+            uow.mark_rollback_only()
+        self.assertEqual(callbacks, [1])
+
+        # Outside of a unit of work there is nothing to wait for
+        on_commit(lambda: callbacks.append("now"))
+        self.assertEqual(callbacks, [1, "now"])
+
+    def test_nested_unit_of_work_joins_outer(self):
+        with unit_of_work() as outer:
+            with unit_of_work() as inner:
+                self.assertIs(inner, outer)
+                update_request("1", "2024-09-15", {"request_status": "Approved"})
+            self.assertEqual(self.commits, 0)
+
+        self.assertEqual(self.commits, 1)
+
+    def test_failing_helper_keeps_flushed_writes_for_the_unit_of_work(self):
+        with unit_of_work() as uow:
+            update_request("1", "2024-09-15", {"request_status": "Approved"})
+            decision = create_request_decision({"request_id": "1"})
+            self.assertIn("error", decision)
+            self.assertTrue(uow.rollback_only)
+            # Not discarded halfway, later reads in the action still see the update
+            self.assertEqual(WFHRequests.query.filter_by(request_id="1").first().request_status, "Approved")
+
+        self.assertEqual(self.commits, 0)
+        self.assertEqual(WFHRequests.query.filter_by(request_id="1").first().request_status, "Pending")
+
+    def test_update_request_error(self):
+        with patch('util.wfh_requests.commit', side_effect=Exception("flush failed")):
+            with unit_of_work() as uow:
+                new_req = update_request("1", "2024-09-15", {"request_status": "Approved"})
+                self.assertTrue(uow.rollback_only)
+
+        self.assertEqual(new_req, {"error": "An error occurred: flush failed"})
+        self.assertEqual(self.commits, 0)
+
+    @patch('util.outbox.dispatch_outbox')
+    @patch('util.request_decisions.date')
+    def test_approval_commits_once(self, mock_date, mock_dispatch):
+        mock_date.today.return_value = date(2024, 9, 10)
+        response = self.client.post("/api/approve",
+                                    data=json.dumps({"request_id": "1", "decision_status": "Approved", "decision_notes": "Nil", "manager_id": 140001}),
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(RequestDecisions.query.count(), 1)
+        # The log is left to the outbox relay, queued once the approval committed
+        mock_dispatch.assert_called_once()
+        self.assertEqual(Outbox.query.filter(Outbox.processed_at.is_(None)).count(), 1)
+        self.assertEqual(WFHRequestLogs.query.count(), 0)
+
+    @patch('routes.manager_approve.requests_changed')
+    def test_approval_rolled_back_on_failure(self, mock_log):
+        mock_log.side_effect = Exception("Outbox failed")
+        with self.assertLogs(app.logger, "ERROR") as logs:
+            response = self.client.post("/api/approve",
+                                        data=json.dumps({"request_id": "1", "decision_status": "Approved", "decision_notes": "Nil", "manager_id": 140001}),
+                                        content_type='application/json')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertIn("Outbox failed", logs.output[0])
+        self.assertEqual(self.commits, 0)
+        self.assertEqual(WFHRequests.query.filter_by(request_id="1").first().request_status, "Pending")
+        self.assertEqual(RequestDecisions.query.count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
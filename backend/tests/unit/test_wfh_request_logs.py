@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import patch
+import flask_testing
+from datetime import date, datetime
+from sqlalchemy import event
+from server import app, db
+from models import *
+from util.unit_of_work import unit_of_work
+from util.wfh_request_logs import log_wfh_request, log_wfh_requests, backfill_request_logs, LogBackfill, log_entry_from_row, _flush_backfills
+
+class TestApp(flask_testing.TestCase):
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['TESTING'] = True
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.create_all()
+        db.session.add(Employee(
+            staff_id=140001,
+            staff_fname="Derek",
+            staff_lname="Tan",
+            dept="Sales",
+            position="Director",
+            country="Singapore",
+            email="Derek.Tan@allinone.com.sg",
+            reporting_manager=None,
+            role=1
+        ))
+        for day in range(15, 18):
+            db.session.add(WFHRequests(
+                request_id="1",
+                staff_id=140001,
+                manager_id=140001,
+                specific_date=date(2024, 9, day),
+                is_am=True,
+                is_pm=False,
+                request_status="Pending",
+                apply_date=date(2024, 9, 1),
+                request_reason="Personal matters"
+            ))
+        db.session.commit()
+        self.wfh_requests = [wfh_request.json() for wfh_request in WFHRequests.query.order_by(WFHRequests.specific_date).all()]
+
+        self.log_inserts = []
+        event.listen(db.engine, "before_cursor_execute", self.capture)
+
+    def tearDown(self):
+        event.remove(db.engine, "before_cursor_execute", self.capture)
+        db.session.remove()
+        db.drop_all()
+
+    def capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO wfhrequestlogs"):
+            self.log_inserts.append(len(parameters) if executemany else 1)
+
+class TestLogBuffer(TestApp):
+    def test_one_insert_per_transaction(self):
+        with unit_of_work():
+            for wfh_request in self.wfh_requests:
+                log_wfh_request(wfh_request)
+            self.assertEqual(self.log_inserts, [])
+
+        self.assertEqual(self.log_inserts, [3])
+        self.assertEqual(WFHRequestLogs.query.count(), 3)
+
+    def test_commits_on_its_own(self):
+        log_wfh_request(self.wfh_requests[0])
+        self.assertEqual(self.log_inserts, [1])
+        self.assertEqual(WFHRequestLogs.query.count(), 1)
+
+    def test_dropped_on_rollback(self):
+        with unit_of_work() as uow:
+            log_wfh_requests(self.wfh_requests)
+            uow.mark_rollback_only()
+
+        db.session.commit()
+        self.assertEqual(self.log_inserts, [])
+        self.assertEqual(WFHRequestLogs.query.count(), 0)
+
+    def test_bounded_buffer_flushes_inline(self):
+        with patch('util.wfh_request_logs.LOG_BUFFER_SIZE', 2):
+            with unit_of_work():
+                for wfh_request in self.wfh_requests:
+                    log_wfh_request(wfh_request)
+                self.assertEqual(self.log_inserts, [2])
+
+        self.assertEqual(self.log_inserts, [2, 1])
+        self.assertEqual(WFHRequestLogs.query.count(), 3)
+
+    def test_invalid_entry_raises(self):
+        with self.assertRaises(KeyError):
+            log_wfh_request({"request_id": "1"})
+
+class TestLogBackfill(TestApp):
+    def test_backfill(self):
+        log_wfh_request(self.wfh_requests[0])
+        self.log_inserts = []
+
+        self.assertEqual(backfill_request_logs(batch_size=1), 2)
+        self.assertEqual(self.log_inserts, [1, 1])
+
+        logs = WFHRequestLogs.query.order_by(WFHRequestLogs.specific_date).all()
+        self.assertEqual([log.specific_date for log in logs], [date(2024, 9, 15), date(2024, 9, 16), date(2024, 9, 17)])
+        self.assertEqual(logs[1].request_status_log, "Pending")
+
+        # Nothing left to backfill
+        self.assertEqual(backfill_request_logs(), 0)
+
+    def test_flushed_at_exit(self):
+        row = WFHRequests.json_rows(db.session.execute(select(*WFHRequests.json_columns()).limit(1)))[0]
+        backfill = LogBackfill(db.engine, batch_size=10)
+        backfill.add([log_entry_from_row(row, datetime.now())])
+        self.assertEqual(self.log_inserts, [])
+
+        _flush_backfills()
+        self.assertEqual(backfill.written, 1)
+        self.assertEqual(WFHRequestLogs.query.count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,486 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import msgpack
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from models import db, Employee
+from util.org_index import invalidate_org_index, is_bulk_employee_write
+
+# Shared read-through cache for employee lookups. Values are msgpack encoded and kept in Redis,
+# or in an in-process dict when TESTING or when no CACHE_REDIS_URL is configured.
+# A failing backend is treated as a miss, the cache never fails a request.
+#
+# Each worker process also keeps a small LRU of recently read values in front of the shared backend.
+# Deletes are broadcast on INVALIDATION_CHANNEL so every worker drops its local copy (and its org index
+# when employee data changed). LOCAL_TTL bounds how stale a worker can be if it misses a message.
+
+DEFAULT_TTL = 300
+KEY_PREFIX = "wfh:"
+LOCAL_MAXSIZE = 1024
+LOCAL_TTL = 5
+INVALIDATION_CHANNEL = "wfh:invalidate"
+
+# Keys holding employee data, a change to any of them means the org chart changed
+EMPLOYEE_KEY_PREFIXES = ("employee:", "direct_reports:", "full_team:")
+# Keys only kept in the shared backend. The local LRU is bounded by entry count, not size,
+# so large values such as serialized responses would grow every worker's memory
+SHARED_ONLY_PREFIXES = ("response:",)
+
+class MemoryBackend:
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+        self.subscribers = []
+
+    def get(self, key):
+        with self.lock:
+            item = self.values.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self.values[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.values[key] = (value, time.monotonic() + ttl)
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set_many(self, values, ttl):
+        for key, value in values.items():
+            self.set(key, value, ttl)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.values.pop(key, None)
+
+    def clear(self, prefix):
+        with self.lock:
+            for key in [key for key in self.values if key.startswith(prefix)]:
+                del self.values[key]
+
+    def add(self, key, value, ttl):
+        # Set only if the key is not set yet, returns whether it was set
+        with self.lock:
+            item = self.values.get(key)
+            if item is not None and item[1] > time.monotonic():
+                return False
+            self.values[key] = (value, time.monotonic() + ttl)
+            return True
+
+    def delete_if(self, key, value):
+        # Delete only if the key still holds value
+        with self.lock:
+            item = self.values.get(key)
+            if item is not None and item[0] == value:
+                del self.values[key]
+
+    def publish(self, message):
+        for callback in list(self.subscribers):
+            callback(message)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+class LocalCache:
+    # Bounded LRU with a short TTL, private to one worker process
+    def __init__(self, maxsize=LOCAL_MAXSIZE, ttl=LOCAL_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.values = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.values.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self.values[key]
+                return None
+            self.values.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.values[key] = (value, time.monotonic() + self.ttl)
+            self.values.move_to_end(key)
+            while len(self.values) > self.maxsize:
+                self.values.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.values.pop(key, None)
+
+    def clear(self, prefix):
+        with self.lock:
+            for key in [key for key in self.values if key.startswith(prefix)]:
+                del self.values[key]
+
+# Compare and delete in one step, so a lock that expired and was taken by someone else is left alone
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+class RedisBackend:
+    def __init__(self, url):
+        import redis
+        self.url = url
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.subscriber = None
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=ttl)
+
+    def get_many(self, keys):
+        return self.client.mget(keys) if keys else []
+
+    def set_many(self, values, ttl):
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in values.items():
+            pipeline.set(key, value, ex=ttl)
+        pipeline.execute()
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self, prefix):
+        keys = []
+        for key in self.client.scan_iter(match=prefix + "*", count=1000):
+            keys.append(key)
+            if len(keys) == 1000:
+                self.client.delete(*keys)
+                keys = []
+        self.delete(*keys)
+
+    def add(self, key, value, ttl):
+        return bool(self.client.set(key, value, ex=ttl, nx=True))
+
+    def delete_if(self, key, value):
+        self.client.eval(RELEASE_SCRIPT, 1, key, value)
+
+    def publish(self, message):
+        self.client.publish(INVALIDATION_CHANNEL, msgpack.packb(message))
+
+    def subscribe(self, callback):
+        import redis
+        # Own connection without the short socket timeout, it blocks waiting for messages
+        pubsub = redis.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{INVALIDATION_CHANNEL: lambda message: callback(msgpack.unpackb(message["data"]))})
+        self.subscriber = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+class TieredBackend:
+    # Local LRU in front of a shared backend, kept in step through the shared backend's pub/sub
+    def __init__(self, remote, local=None):
+        self.remote = remote
+        self.local = local or LocalCache()
+        self.local_hits = 0
+        self.shared_only = tuple(KEY_PREFIX + prefix for prefix in SHARED_ONLY_PREFIXES)
+        remote.subscribe(self._invalidated)
+
+    def get(self, key):
+        if key.startswith(self.shared_only):
+            return self.remote.get(key)
+        value = self.local.get(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+        value = self.remote.get(key)
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value, ttl):
+        self.remote.set(key, value, ttl)
+        if not key.startswith(self.shared_only):
+            self.local.set(key, value)
+
+    def get_many(self, keys):
+        values = [None if key.startswith(self.shared_only) else self.local.get(key) for key in keys]
+        self.local_hits += sum(1 for value in values if value is not None)
+
+        remote_keys = [key for key, value in zip(keys, values) if value is None]
+        remote_values = dict(zip(remote_keys, self.remote.get_many(remote_keys)))
+        for key, value in remote_values.items():
+            if value is not None and not key.startswith(self.shared_only):
+                self.local.set(key, value)
+        return [value if value is not None else remote_values[key] for key, value in zip(keys, values)]
+
+    def set_many(self, values, ttl):
+        self.remote.set_many(values, ttl)
+        for key, value in values.items():
+            if not key.startswith(self.shared_only):
+                self.local.set(key, value)
+
+    def delete(self, *keys):
+        self.local.delete(*keys)
+        self.remote.delete(*keys)
+        self.remote.publish({"keys": list(keys)})
+
+    def clear(self, prefix):
+        self.local.clear(prefix)
+        self.remote.clear(prefix)
+        self.remote.publish({"prefix": prefix})
+
+    # Locks only live in the shared backend, they are never read through the local LRU
+    def add(self, key, value, ttl):
+        return self.remote.add(key, value, ttl)
+
+    def delete_if(self, key, value):
+        self.remote.delete_if(key, value)
+
+    def _invalidated(self, message):
+        employee_prefixes = tuple(KEY_PREFIX + prefix for prefix in EMPLOYEE_KEY_PREFIXES)
+        if "keys" in message:
+            self.local.delete(*message["keys"])
+            employees_changed = any(key.startswith(employee_prefixes) for key in message["keys"])
+        else:
+            prefix = message["prefix"]
+            self.local.clear(prefix)
+            employees_changed = prefix.startswith(employee_prefixes) or any(
+                employee_prefix.startswith(prefix) for employee_prefix in employee_prefixes
+            )
+
+        if employees_changed:
+            invalidate_org_index()
+
+class Cache:
+    def __init__(self, backend, prefix=KEY_PREFIX, ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key):
+        try:
+            raw = self.backend.get(self.prefix + key)
+        except Exception as e:
+            self._error("get", e)
+            return None
+        if raw is None:
+            return None
+        return msgpack.unpackb(raw)
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.backend.set(self.prefix + key, msgpack.packb(value), ttl or self.ttl)
+        except Exception as e:
+            self._error("set", e)
+
+    def get_many(self, keys):
+        # Returns {key: value} for the keys found
+        try:
+            raws = self.backend.get_many([self.prefix + key for key in keys])
+        except Exception as e:
+            self._error("get_many", e)
+            return {}
+        return {key: msgpack.unpackb(raw) for key, raw in zip(keys, raws) if raw is not None}
+
+    def set_many(self, values, ttl=None):
+        try:
+            self.backend.set_many({self.prefix + key: msgpack.packb(value) for key, value in values.items()}, ttl or self.ttl)
+        except Exception as e:
+            self._error("set_many", e)
+
+    def get_or_load_many(self, keys, loader, ttl=None):
+        # loader(missing_keys) returns {key: value} for the keys it found, in one round trip
+        values = self.get_many(keys)
+        self.hits += len(values)
+
+        missing = [key for key in keys if key not in values]
+        self.misses += len(missing)
+        if missing:
+            loaded = {key: value for key, value in loader(missing).items() if value is not None}
+            if loaded:
+                self.set_many(loaded, ttl)
+            values.update(loaded)
+        return values
+
+    def get_or_load(self, key, loader, ttl=None):
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = loader()
+        # Misses are not cached, so a lookup for an employee who is added later still finds them
+        if value is not None:
+            self.set(key, value, ttl)
+        return value
+
+    def delete(self, *keys):
+        try:
+            self.backend.delete(*[self.prefix + key for key in keys])
+        except Exception as e:
+            self._error("delete", e)
+
+    def clear(self, key_prefix=""):
+        try:
+            self.backend.clear(self.prefix + key_prefix)
+        except Exception as e:
+            self._error("clear", e)
+
+    @contextmanager
+    def lock(self, name, ttl):
+        # Yields whether the lock was acquired, it is released on exit or expires after ttl seconds.
+        # Fails open like the rest of the cache: without a backend the caller runs unlocked
+        key = self.prefix + f"lock:{name}"
+        token = uuid.uuid4().hex.encode()
+        try:
+            acquired = self.backend.add(key, token, ttl)
+        except Exception as e:
+            self._error("lock", e)
+            yield True
+            return
+
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    self.backend.delete_if(key, token)
+                except Exception as e:
+                    self._error("unlock", e)
+
+    def stats(self):
+        stats = {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+        if isinstance(self.backend, TieredBackend):
+            stats["local_hits"] = self.backend.local_hits
+        return stats
+
+    def _error(self, operation, e):
+        self.errors += 1
+        current_app.logger.warning(f"Cache {operation} failed: {e}")
+
+def get_cache():
+    cache = current_app.extensions.get("cache")
+    if cache is None:
+        url = current_app.config.get("CACHE_REDIS_URL")
+        if current_app.config.get("TESTING") or not url:
+            remote = MemoryBackend()
+        else:
+            remote = RedisBackend(url)
+
+        try:
+            backend = TieredBackend(remote)
+        except Exception as e:
+            # Without invalidation messages a local copy could go stale, so use the shared backend alone
+            current_app.logger.warning(f"Cache invalidation channel unavailable: {e}")
+            backend = remote
+        cache = current_app.extensions["cache"] = Cache(backend)
+    return cache
+
+def employee_key(staff_id):
+    return f"employee:{staff_id}"
+
+def direct_reports_key(manager_id):
+    return f"direct_reports:{manager_id}"
+
+def full_team_key(manager_id):
+    return f"full_team:{manager_id}"
+
+def invalidate_employees(staff_ids=(), manager_ids=()):
+    # For writers that bypass the ORM, e.g. the HR import, once they have committed
+    with db.engine.connect() as connection:
+        team_keys = [full_team_key(manager_id) for manager_id in _management_chain(connection, list(staff_ids) + list(manager_ids))]
+    _drop_employee_keys([employee_key(staff_id) for staff_id in staff_ids] + [direct_reports_key(manager_id) for manager_id in manager_ids] + team_keys)
+
+def _management_chain(connection, staff_ids):
+    # staff_ids and every manager above them, one query per level of the org chart. A change to an employee
+    # can only reach the full teams of these managers, so only their full_team keys are dropped
+    chain = set()
+    level = {staff_id for staff_id in staff_ids if staff_id is not None}
+    while level:
+        chain |= level
+        managers = connection.execute(select(Employee.reporting_manager).where(Employee.staff_id.in_(level))).scalars()
+        level = {manager_id for manager_id in managers if manager_id is not None} - chain
+    return chain
+
+def _drop_employee_keys(keys):
+    if keys:
+        get_cache().delete(*keys)
+
+def invalidate_all_employees():
+    cache = get_cache()
+    for prefix in EMPLOYEE_KEY_PREFIXES:
+        cache.clear(prefix)
+
+# Load the previous manager when reporting_manager is set on an expired employee,
+# otherwise the flush below cannot tell which team the employee left
+@event.listens_for(Employee.reporting_manager, "set", active_history=True, retval=True)
+def _keep_old_manager(target, value, oldvalue, initiator):
+    return value
+
+def _changed_keys(session):
+    keys = set()
+    staff_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Employee):
+            continue
+        state = inspect(obj)
+        staff_id = state.identity[0] if state.identity else obj.staff_id
+        keys.add(employee_key(staff_id))
+        staff_ids.add(staff_id)
+        # Both the old and the new manager, without loading anything from the database
+        for manager_id in state.attrs.reporting_manager.history.sum():
+            if manager_id is not None:
+                keys.add(direct_reports_key(manager_id))
+                staff_ids.add(manager_id)
+    # Worked out while the session can still query, the keys are dropped again after the commit
+    if staff_ids:
+        keys.update(full_team_key(manager_id) for manager_id in _management_chain(session.connection(), staff_ids))
+    return keys
+
+@event.listens_for(Session, "after_flush")
+def _employee_flushed(session, flush_context):
+    keys = _changed_keys(session)
+    if keys and has_app_context():
+        session.info.setdefault("cache_keys", set()).update(keys)
+        _drop_employee_keys(keys)
+
+@event.listens_for(Session, "do_orm_execute")
+def _employee_bulk_statement(orm_execute_state):
+    # Bulk UPDATE/DELETE/INSERT statements skip the flush, drop every employee entry instead
+    if is_bulk_employee_write(orm_execute_state) and has_app_context():
+        orm_execute_state.session.info["cache_all_employees"] = True
+        invalidate_all_employees()
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _employee_transaction_ended(session):
+    # Delete again once the transaction settles, another request may have cached the old row meanwhile
+    keys = session.info.pop("cache_keys", None)
+    all_employees = session.info.pop("cache_all_employees", False)
+    if not has_app_context():
+        return
+    if all_employees:
+        invalidate_all_employees()
+    elif keys:
+        _drop_employee_keys(keys)
+
+@event.listens_for(db.metadata, "after_create")
+@event.listens_for(db.metadata, "after_drop")
+def _employee_table_recreated(target, connection, **kw):
+    if has_app_context():
+        get_cache().clear()
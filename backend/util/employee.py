@@ -1,34 +1,183 @@
 from models import *
 from flask import jsonify
+from util.cache import get_cache, employee_key, direct_reports_key, full_team_key
+
+# Dialects that can resolve a whole subtree with WITH RECURSIVE in one round trip.
+# Anything else falls back to walking the org chart one level at a time.
+RECURSIVE_CTE_DIALECTS = {"postgresql", "sqlite", "mysql"}
+
+# Fields of Employee.json(), in the same order
+EMPLOYEE_FIELDS = list(Employee.json_fields)
 
 def get_employee_by_id(staff_id):
-    employee = Employee.query.filter_by(staff_id=staff_id).first()
-    if not employee:
+    return get_employees_by_ids([staff_id]).get(_to_staff_id(staff_id))
+
+def get_employees_by_ids(staff_ids):
+    # {staff_id: employee json} for the staff_ids that exist. Reads through the shared cache, which
+    # util.cache drops whenever an employee is written, with one query for all the ids not cached
+    keys = {employee_key(staff_id): staff_id for staff_id in map(_to_staff_id, staff_ids) if staff_id is not None}
+    employees = get_cache().get_or_load_many(list(keys), lambda missing: _load_employees([keys[key] for key in missing]))
+    return {keys[key]: employee for key, employee in employees.items()}
+
+def _load_employees(staff_ids):
+    employees = Employee.json_rows(db.session.execute(
+        select(*Employee.json_columns()).where(Employee.staff_id.in_(staff_ids))
+    ))
+    return {employee_key(employee["staff_id"]): employee for employee in employees}
+
+def _to_staff_id(staff_id):
+    try:
+        return int(staff_id)
+    except (TypeError, ValueError):
         return None
-    return employee.json()
+
+def get_direct_reports(rm_id):
+    # Active employees reporting directly to rm_id, ordered by staff_id. The CEO is not his own direct report
+    return get_cache().get_or_load(direct_reports_key(rm_id), lambda: Employee.json_rows(db.session.execute(
+        select(*Employee.json_columns()).where(
+            Employee.reporting_manager == rm_id,
+            Employee.staff_id != rm_id,
+            Employee.is_active == True
+        ).order_by(Employee.staff_id)
+    )))
+
+def get_employees_page(fields=None, dept=None, country=None, limit=None, after=None):
+    # Employees ordered by staff_id, selecting only the requested fields. With a limit, returns one page
+    # after the staff_id cursor and the cursor of the next page (None on the last page)
+    fields = fields or EMPLOYEE_FIELDS
+    query = db.session.query(Employee.staff_id, *[getattr(Employee, field) for field in fields])
+    if dept:
+        query = query.filter(Employee.dept == dept)
+    if country:
+        query = query.filter(Employee.country == country)
+    if after is not None:
+        query = query.filter(Employee.staff_id > after)
+    query = query.order_by(Employee.staff_id)
+    if limit:
+        query = query.limit(limit)
+
+    rows = query.all()
+    employees = [dict(zip(fields, row[1:])) for row in rows]
+    next_cursor = rows[-1][0] if limit and len(rows) == limit else None
+    return employees, next_cursor
 
 def get_full_team(rm_id):
-    team = Employee.query.filter_by(reporting_manager=rm_id).all()
-    full_team = team.copy()  # To store the entire hierarchy
+    # The json of every team member, read through the shared cache
+    return get_cache().get_or_load(full_team_key(rm_id), lambda: [employee.json() for employee in _load_full_team(rm_id)])
+
+def _load_full_team(rm_id):
+    if db.engine.dialect.name in RECURSIVE_CTE_DIALECTS:
+        members = _fetch_subtree_cte(rm_id)
+    else:
+        members = _fetch_subtree_by_level(rm_id)
+
+    # Inactive employees are left out after ordering, their active reports still belong to the team
+    return [employee for employee in _order_team(rm_id, members) if employee.is_active]
+
+def _fetch_subtree_cte(rm_id):
+    # Only non role 2 employees are expanded further, same as the traversal in _order_team.
+    # UNION (not UNION ALL) drops rows already seen, so reporting cycles terminate,
+    # and rm_id is never part of its own team (e.g. the CEO reports to himself)
+    team = select(Employee.staff_id, Employee.role).where(
+        Employee.reporting_manager == rm_id,
+        Employee.staff_id != rm_id
+    ).cte("team", recursive=True)
+
+    parent = team.alias("parent")
+    team = team.union(
+        select(Employee.staff_id, Employee.role)
+        .join(parent, Employee.reporting_manager == parent.c.staff_id)
+        .where(parent.c.role != 2, Employee.staff_id != rm_id)
+    )
+
+    return Employee.query.filter(Employee.staff_id.in_(select(team.c.staff_id))).all()
+
+def _fetch_subtree_by_level(rm_id):
+    # One query per level of the hierarchy instead of one per manager
+    members = []
+    seen = {rm_id}
+    frontier = [rm_id]
+
+    while frontier:
+        level = Employee.query.filter(Employee.reporting_manager.in_(frontier)).all()
+        level = [employee for employee in level if employee.staff_id not in seen]
+
+        seen.update(employee.staff_id for employee in level)
+        members += level
+        frontier = [employee.staff_id for employee in level if employee.role != 2]
+
+    return members
+
+def _group_reports(members):
+    reports = {}
+    for member in sorted(members, key=lambda employee: employee.staff_id):
+        reports.setdefault(member.reporting_manager, []).append(member)
+    return reports
+
+def _order_team(rm_id, members=None, reports=None):
+    # Rebuild the order the team used to be returned in: direct reports first,
+    # then each manager's subteam, exploring the most recently added manager first
+    if reports is None:
+        reports = _group_reports(members)
+
+    team = [employee for employee in reports.get(rm_id, []) if employee.staff_id != rm_id]
+    seen = {rm_id} | {employee.staff_id for employee in team}
 
     ids = [employee.staff_id for employee in team if employee.role != 2]
 
     while ids:
         current_rm_id = ids.pop()
-        subteam = Employee.query.filter_by(reporting_manager=current_rm_id).all()
-        full_team += subteam
+        subteam = [employee for employee in reports.get(current_rm_id, []) if employee.staff_id not in seen]
+        seen.update(employee.staff_id for employee in subteam)
+        team += subteam
 
-        # Add non-role 2 employees to the ids list for further exploration
         ids += [employee.staff_id for employee in subteam if employee.role != 2]
 
-    return full_team
+    return team
+
+def _memoized_team(rm_id, reports, memo):
+    # Same order as _order_team, built bottom up: a team is the direct reports followed by
+    # the teams of the managers among them, last manager first. Returns None on a reporting cycle
+    stack = [(rm_id, False)]
+    visiting = set()
+
+    while stack:
+        current_rm_id, expanded = stack.pop()
+        if current_rm_id in memo:
+            continue
+
+        direct_reports = [employee for employee in reports.get(current_rm_id, []) if employee.staff_id != current_rm_id]
+        managers = [employee.staff_id for employee in direct_reports if employee.role != 2]
+
+        if not expanded:
+            if current_rm_id in visiting:
+                return None
+            visiting.add(current_rm_id)
+            stack.append((current_rm_id, True))
+            stack += [(manager_id, False) for manager_id in managers if manager_id not in memo]
+            continue
+
+        team = list(direct_reports)
+        for manager_id in reversed(managers):
+            team += memo[manager_id]
+        memo[current_rm_id] = team
+        visiting.discard(current_rm_id)
+
+    return memo[rm_id]
 
 def get_all_department_teams():
+    # Group the employees by manager once and reuse every subtree that has already been built
     all_employees = Employee.query.all()
 
+    reports = _group_reports(all_employees)
+    profiles = {employee.staff_id: employee.json() for employee in all_employees}
+    memo = {}
+
     department_teams = {}
 
     for employee in all_employees:
+        if not employee.is_active:
+            continue
         department = employee.dept
         reporting_manager = employee.reporting_manager 
 
@@ -36,8 +185,10 @@ def get_all_department_teams():
             department_teams[department] = {}
         
         if reporting_manager and reporting_manager not in department_teams[department]:
-            team = get_full_team(reporting_manager)
-            department_teams[department][reporting_manager] = [member.json() for member in team]
+            team = _memoized_team(reporting_manager, reports, memo)
+            if team is None:
+                team = _order_team(reporting_manager, reports=reports)
+            department_teams[department][reporting_manager] = [profiles[member.staff_id] for member in team if member.is_active]
             
     
     return department_teams
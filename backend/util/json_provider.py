@@ -0,0 +1,84 @@
+import uuid
+import decimal
+import dataclasses
+from datetime import date
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON provider for the Flask app, set in server.create_app. orjson serializes large schedule and inbox
+# payloads several times faster than the json module and handles date, datetime and UUID natively, so the
+# column tuple rows of models.JsonColumns can be returned without converting every date to a string first.
+# Dates are written as ISO 8601 ("2024-09-15"), the same strings Model.json() produces with str().
+# Without orjson, or for anything orjson refuses (e.g. integers over 64 bits), it falls back to the json module.
+# Only the public provider API is used (dumps, loads, response, default), nothing private to Flask
+
+def _json_default(o):
+    # The types Flask's provider handles, except that dates are ISO 8601 instead of HTTP dates
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def _response_obj(args, kwargs):
+    # Same arguments as Flask's jsonify: one value, several values as a list, or keyword arguments as a dict
+    if args and kwargs:
+        raise TypeError("app.json.response() takes either args or kwargs, not both")
+    if not args and not kwargs:
+        return None
+    if len(args) == 1:
+        return args[0]
+    return args or kwargs
+
+class OrjsonProvider(DefaultJSONProvider):
+    default = staticmethod(_json_default)
+
+    def _options(self, compact=True):
+        # Non string keys (e.g. staff_id) become strings, like the json module does
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if not compact:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _dumps_bytes(self, obj, compact=True):
+        # None when orjson cannot serialize obj, the caller falls back to the json module
+        if orjson is None:
+            return None
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options(compact))
+        except orjson.JSONEncodeError:
+            return None
+
+    def dumps(self, obj, **kwargs):
+        # Keyword arguments are json.dumps arguments, only the json module understands them
+        if not kwargs:
+            data = self._dumps_bytes(obj)
+            if data is not None:
+                return data.decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Builds the body straight from the orjson bytes instead of going through a str
+        obj = _response_obj(args, kwargs)
+        compact = not ((self.compact is None and current_app.debug) or self.compact is False)
+
+        data = self._dumps_bytes(obj, compact)
+        if data is None:
+            return super().response(*args, **kwargs)
+        return current_app.response_class(data + b"\n", mimetype=self.mimetype)
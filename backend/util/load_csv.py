@@ -1,57 +1,324 @@
 import os
-import pandas as pd
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
-
-load_dotenv()
-
-Base = declarative_base()
-
-class Employee(Base):
-    __tablename__ = 'employee'
-
-    staff_id = Column(Integer, primary_key=True)
-    staff_fname = Column(String, nullable=False)
-    staff_lname = Column(String, nullable=False)
-    dept = Column(String, nullable=False)
-    position = Column(String, nullable=False)
-    country = Column(String, nullable=False)
-    email = Column(String, nullable=False)
-    reporting_manager = Column(Integer, ForeignKey('employee.staff_id'))
-    role = Column(Integer, nullable=False)
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-Base.metadata.create_all(engine) 
-Session = sessionmaker(bind=engine)
-
-def import_employee_data(csv_file_path):
-    """Import employee data from a CSV file into the PostgreSQL database."""
+import io
+import csv
+import time
+import hashlib
+import argparse
+from sqlalchemy import insert, delete, select, bindparam, union
+from sqlalchemy.dialects import sqlite
+from models import db, Employee, EmployeeSyncHash, WFHRequests, RequestDecisions, WithdrawDecisions, TeamDayOccupancy
+from util.org_index import publish_org_change
+from util.cache import get_cache, invalidate_employees
+from util.occupancy import set_staff_active, move_staff_occupancy
+
+# Run from the backend folder with: python -m util.load_csv [--sync] [path/to/employees.csv]
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'employeenew.csv')
+
+# HR export header -> Employee column
+CSV_COLUMNS = {
+    "Staff_ID": "staff_id",
+    "Staff_FName": "staff_fname",
+    "Staff_LName": "staff_lname",
+    "Dept": "dept",
+    "Position": "position",
+    "Country": "country",
+    "Email": "email",
+    "Reporting_Manager": "reporting_manager",
+    "Role": "role"
+}
+EMPLOYEE_COLUMNS = list(CSV_COLUMNS.values())
+INTEGER_COLUMNS = ("staff_id", "reporting_manager", "role")
+OPTIONAL_COLUMNS = ("reporting_manager",)
+
+# Rows are validated and written this many at a time, so memory does not grow with the file
+CHUNK_SIZE = 5000
+
+def iter_employee_chunks(csv_file_path, chunk_size=CHUNK_SIZE):
+    # Yields the rows of the HR export in lists of up to chunk_size dicts keyed by Employee column
+    with open(csv_file_path, newline="", encoding="utf-8-sig") as csv_file:
+        reader = csv.DictReader(csv_file)
+        missing = [csv_column for csv_column in CSV_COLUMNS if csv_column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"Missing columns in {csv_file_path}: {missing}")
+
+        chunk = []
+        for record in reader:
+            chunk.append(_employee_row(record, reader.line_num))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def read_employee_rows(csv_file_path):
+    # Returns all the rows of the HR export, for callers that need the whole file at once
+    return [row for chunk in iter_employee_chunks(csv_file_path) for row in chunk]
+
+def _employee_row(record, line_num):
+    row = {}
+    for csv_column, column in CSV_COLUMNS.items():
+        value = (record[csv_column] or "").strip()
+        if not value:
+            if column not in OPTIONAL_COLUMNS:
+                raise ValueError(f"Line {line_num}: {csv_column} is required")
+            value = None
+        elif column in INTEGER_COLUMNS:
+            try:
+                value = int(value)
+            except ValueError:
+                raise ValueError(f"Line {line_num}: {csv_column} must be an integer, got {value!r}")
+        row[column] = value
+    return row
+
+def _chunked(rows, chunk_size=CHUNK_SIZE):
+    for i in range(0, len(rows), chunk_size):
+        yield rows[i:i + chunk_size]
+
+def order_by_reporting_line(rows):
+    # Managers come before their reports so every reporting_manager already exists when a row is inserted.
+    # Managers missing from the file must already be in the database.
+    by_id = {row["staff_id"]: row for row in rows}
+    reports = {}
+    ordered = []
+    for row in rows:
+        manager_id = row["reporting_manager"]
+        if manager_id in by_id and manager_id != row["staff_id"]:
+            reports.setdefault(manager_id, []).append(row)
+        else:
+            ordered.append(row)
+
+    i = 0
+    while i < len(ordered):
+        ordered.extend(reports.pop(ordered[i]["staff_id"], []))
+        i += 1
+
+    if reports:
+        staff_ids = sorted(row["staff_id"] for team in reports.values() for row in team)
+        raise ValueError(f"Reporting line cycle between employees {staff_ids}")
+
+    return ordered
+
+def order_chunks_by_reporting_line(chunks):
+    # Streaming version of order_by_reporting_line: a row whose manager has not been written yet waits
+    # until the manager's row arrives. Only those rows and the staff_ids seen so far are kept in memory.
+    seen = set()
+    waiting = {}
+    for chunk in chunks:
+        ready = []
+        for row in chunk:
+            manager_id = row["reporting_manager"]
+            if manager_id is None or manager_id == row["staff_id"] or manager_id in seen:
+                stack = [row]
+                while stack:
+                    ready_row = stack.pop()
+                    ready.append(ready_row)
+                    seen.add(ready_row["staff_id"])
+                    stack.extend(waiting.pop(ready_row["staff_id"], []))
+            else:
+                waiting.setdefault(manager_id, []).append(row)
+        if ready:
+            yield ready
+
+    # Rows still waiting report to a manager outside the file, or are part of a cycle
+    leftover = [row for team in waiting.values() for row in team]
+    if leftover:
+        yield order_by_reporting_line(leftover)
+
+def import_employee_data(csv_file_path, upsert=True, chunk_size=CHUNK_SIZE):
+    """Import employee data from a CSV file, updating employees whose staff_id already exists."""
+    csv_file_path = os.path.abspath(csv_file_path)
+    start = time.perf_counter()
+
+    chunks = order_chunks_by_reporting_line(iter_employee_chunks(csv_file_path, chunk_size))
+    rows = _write_employees(db.session.connection(), chunks, upsert)
+    db.session.commit()
+    # Bulk statements skip the ORM flush that normally invalidates the org index and employee cache
+    publish_org_change()
+    get_cache().clear()
+
+    seconds = time.perf_counter() - start
+    rows_per_sec = rows / seconds if seconds else 0
+    print(f"Imported {rows} employees in {seconds:.2f}s ({rows_per_sec:.0f} rows/sec)")
+
+    return {"rows": rows, "seconds": seconds, "rows_per_sec": rows_per_sec}
+
+def sync_employee_data(csv_file_path):
+    """Apply only the inserts, updates and deletes needed to make the employee table match an HR export."""
     csv_file_path = os.path.abspath(csv_file_path)
-    df = pd.read_csv(csv_file_path)
-    print(df.head())
-
-    session = Session()
-
-    for index, row in df.iterrows():
-        employee = Employee(
-            staff_id=row['Staff_ID'],
-            staff_fname=row['Staff_FName'],
-            staff_lname=row['Staff_LName'],
-            dept=row['Dept'],
-            position=row['Position'],
-            country=row['Country'],
-            email=row['Email'],
-            reporting_manager=row['Reporting_Manager'],
-            role=row['Role']
-        )  
-        
-        session.add(employee)
+    start = time.perf_counter()
 
+    rows = read_employee_rows(csv_file_path)
+    file_hashes = {row["staff_id"]: employee_hash(row) for row in rows}
+
+    session = db.session
+    current_managers = dict(session.execute(select(Employee.staff_id, Employee.reporting_manager)).all())
+    stored_hashes = dict(session.execute(select(EmployeeSyncHash.staff_id, EmployeeSyncHash.content_hash)).all())
+
+    # Employees added before the first sync (e.g. by import_employee_data) have no stored hash yet
+    baseline_hashes = {}
+    if any(staff_id not in stored_hashes for staff_id in current_managers):
+        columns = [getattr(Employee, column) for column in EMPLOYEE_COLUMNS]
+        for values in session.execute(select(*columns)).all():
+            row = dict(zip(EMPLOYEE_COLUMNS, values))
+            if row["staff_id"] not in stored_hashes:
+                baseline_hashes[row["staff_id"]] = employee_hash(row)
+        stored_hashes.update(baseline_hashes)
+
+    inserted = [row for row in rows if row["staff_id"] not in current_managers]
+    updated = [row for row in rows if row["staff_id"] in current_managers and stored_hashes.get(row["staff_id"]) != file_hashes[row["staff_id"]]]
+    removed = set(current_managers) - set(file_hashes)
+
+    # Employees with WFH history, or still named as someone's reporting manager, are kept but marked inactive,
+    # so they no longer count towards their team's size. They become active again if they are back in the file
+    retained = removed & (_employees_with_history(session) | {row["reporting_manager"] for row in rows})
+    # Retained employees keep their reporting line, so their managers stay as well
+    managers = {current_managers[staff_id] for staff_id in retained} & removed
+    while not managers <= retained:
+        retained |= managers
+        managers = {current_managers[staff_id] for staff_id in retained} & removed
+    deleted = removed - retained
+    inactive = set(session.execute(select(Employee.staff_id).where(Employee.is_active == False)).scalars())
+    deactivated = retained - inactive
+    reactivated = inactive & set(file_hashes)
+
+    connection = session.connection()
+    changed = order_by_reporting_line(inserted + updated)
+    _write_employees(connection, _chunked(changed), True)
+    # Bulk writes skip the ORM flush, so the slots of employees changing team are moved here
+    move_staff_occupancy(connection, {
+        row["staff_id"]: (current_managers[row["staff_id"]], row["reporting_manager"]) for row in updated
+    })
+    if deleted:
+        connection.execute(delete(TeamDayOccupancy.__table__).where(TeamDayOccupancy.manager_id.in_(deleted)))
+        connection.execute(delete(Employee.__table__).where(Employee.staff_id.in_(deleted)))
+    set_staff_active(connection, deactivated, False)
+    set_staff_active(connection, reactivated, True)
+
+    _store_hashes(connection, {staff_id: content_hash for staff_id, content_hash in baseline_hashes.items() if staff_id not in deleted})
+    _store_hashes(connection, {row["staff_id"]: file_hashes[row["staff_id"]] for row in changed})
+    if deleted:
+        connection.execute(delete(EmployeeSyncHash.__table__).where(EmployeeSyncHash.staff_id.in_(deleted)))
     session.commit()
-    session.close()  
+
+    # Managers whose team changed: old and new manager of every moved, added or removed employee,
+    # and every changed employee who manages a team (their profile is part of the team data)
+    affected_managers = set()
+    for row in changed:
+        affected_managers.add(row["reporting_manager"])
+        if row["staff_id"] in current_managers:
+            affected_managers.add(current_managers[row["staff_id"]])
+        affected_managers.add(row["staff_id"])
+    for staff_id in deleted | deactivated | reactivated:
+        affected_managers.add(current_managers[staff_id])
+    reporting_managers = {row["reporting_manager"] for row in rows} | set(current_managers.values())
+    affected_managers = sorted(staff_id for staff_id in affected_managers if staff_id is not None and staff_id in reporting_managers)
+
+    if changed or deleted or deactivated or reactivated:
+        publish_org_change()
+        invalidate_employees([row["staff_id"] for row in changed] + list(deleted | deactivated | reactivated), affected_managers)
+
+    seconds = time.perf_counter() - start
+    print(f"Synced {len(rows)} employees in {seconds:.2f}s: {len(inserted)} inserted, {len(updated)} updated, "
+          f"{len(deleted)} deleted, {len(retained)} retained, {len(reactivated)} reactivated")
+
+    return {
+        "inserted": len(inserted),
+        "updated": len(updated),
+        "deleted": len(deleted),
+        "retained": sorted(retained),
+        "reactivated": sorted(reactivated),
+        "unchanged": len(rows) - len(changed),
+        "affected_managers": affected_managers,
+        "seconds": seconds
+    }
+
+def employee_hash(row):
+    values = ["" if row[column] is None else str(row[column]) for column in EMPLOYEE_COLUMNS]
+    return hashlib.sha256("\x1f".join(values).encode()).hexdigest()
+
+def _employees_with_history(session):
+    referenced = union(
+        select(WFHRequests.staff_id),
+        select(WFHRequests.manager_id),
+        select(RequestDecisions.manager_id),
+        select(WithdrawDecisions.manager_id)
+    )
+    return set(session.execute(referenced).scalars())
+
+def _store_hashes(connection, hashes):
+    if not hashes:
+        return
+    table = EmployeeSyncHash.__table__
+    connection.execute(delete(table).where(table.c.staff_id == bindparam("old_staff_id")),
+                       [{"old_staff_id": staff_id} for staff_id in hashes])
+    connection.execute(insert(table), [{"staff_id": staff_id, "content_hash": content_hash} for staff_id, content_hash in hashes.items()])
+
+def _write_employees(connection, chunks, upsert):
+    # Writes chunks of rows and returns how many rows were written
+    if connection.dialect.name == "postgresql":
+        return _copy_employees(connection, chunks, upsert)
+
+    rows = 0
+    for chunk in chunks:
+        _insert_employees(connection, chunk, upsert)
+        rows += len(chunk)
+    return rows
+
+def _copy_employees(connection, chunks, upsert):
+    # COPY the chunks into a staging table, then move them into employee with one INSERT ... SELECT
+    columns = ", ".join(EMPLOYEE_COLUMNS)
+    rows = 0
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute("CREATE TEMP TABLE employee_staging (LIKE employee INCLUDING DEFAULTS, position_in_file SERIAL) ON COMMIT DROP")
+        for chunk in chunks:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in chunk:
+                writer.writerow(["" if row[column] is None else row[column] for column in EMPLOYEE_COLUMNS])
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY employee_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            rows += len(chunk)
+
+        on_conflict = ""
+        if upsert:
+            updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in EMPLOYEE_COLUMNS if column != "staff_id")
+            on_conflict = f" ON CONFLICT (staff_id) DO UPDATE SET {updates}"
+        cursor.execute(
+            f"INSERT INTO employee ({columns}) SELECT {columns} FROM employee_staging ORDER BY position_in_file{on_conflict}"
+        )
+        cursor.execute("DROP TABLE employee_staging")
+    finally:
+        cursor.close()
+    return rows
+
+def _insert_employees(connection, rows, upsert):
+    # One executemany per chunk, in reporting line order
+    table = Employee.__table__
+    if upsert and connection.dialect.name == "sqlite":
+        stmt = sqlite.insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.staff_id],
+            set_={column: stmt.excluded[column] for column in EMPLOYEE_COLUMNS if column != "staff_id"}
+        )
+    else:
+        stmt = insert(table)
+
+    connection.execute(stmt, rows)
 
 if __name__ == "__main__":
-    import_employee_data('../employeenew.csv')
+    from server import app
+
+    parser = argparse.ArgumentParser(description="Load the HR employee export into the employee table")
+    parser.add_argument("csv_file", nargs="?", default=DEFAULT_CSV)
+    parser.add_argument("--sync", action="store_true", help="only apply rows that changed since the last sync")
+    args = parser.parse_args()
+
+    with app.app_context():
+        Employee.__table__.create(db.engine, checkfirst=True)
+        EmployeeSyncHash.__table__.create(db.engine, checkfirst=True)
+        if args.sync:
+            sync_employee_data(args.csv_file)
+        else:
+            import_employee_data(args.csv_file)
@@ -0,0 +1,282 @@
+from datetime import datetime
+from sqlalchemy import event, inspect, select, update, delete, insert, func, case, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import db, Employee, WFHRequests, TeamDayOccupancy
+
+# Requests in these statuses take up a WFH slot in the 0.5 rule
+OCCUPIED_STATUSES = ("Approved", "Pending_Withdraw")
+
+# team_day_occupancy is kept in step with WFHRequests in the same transaction as the request change,
+# from the flush of any session. Bulk UPDATE/DELETE statements on WFHRequests skip the ORM flush and
+# must call apply_occupancy_changes themselves. Requests of inactive employees take no slot, see
+# set_staff_active.
+#
+# Slots are counted under the staff's current reporting_manager, the team the 0.5 rule checks, not under
+# the manager_id the request was made to. When an employee moves to another team their slots move with
+# them, from the flush of any session or through move_staff_occupancy for writes that bypass the ORM.
+
+def get_team_day_occupancy(manager_id, specific_date):
+    # Returns (am_count, pm_count) for a manager's team on a date
+    row = db.session.execute(
+        select(TeamDayOccupancy.am_count, TeamDayOccupancy.pm_count).where(
+            TeamDayOccupancy.manager_id == manager_id,
+            TeamDayOccupancy.date == _to_date(specific_date)
+        )
+    ).first()
+    if not row:
+        return 0, 0
+    return row.am_count, row.pm_count
+
+def exceeds_limit(approved_count, team_size):
+    # 0.5 rule: approving one more session must not put more than half of the team at home
+    if team_size <= 0:
+        return False
+    return (approved_count + 1) / team_size > 0.5
+
+def check_recurring_headcount(request_id, manager_id, team_size):
+    # Evaluates the 0.5 rule for every date of a request with one query, returning a verdict per date
+    rows = db.session.execute(
+        select(
+            WFHRequests.specific_date,
+            WFHRequests.is_am,
+            WFHRequests.is_pm,
+            func.coalesce(TeamDayOccupancy.am_count, 0),
+            func.coalesce(TeamDayOccupancy.pm_count, 0)
+        ).select_from(WFHRequests).outerjoin(
+            TeamDayOccupancy,
+            and_(TeamDayOccupancy.manager_id == manager_id, TeamDayOccupancy.date == WFHRequests.specific_date)
+        ).where(
+            WFHRequests.request_id == request_id
+        ).order_by(WFHRequests.specific_date)
+    ).all()
+
+    return [{
+        "specific_date": specific_date.strftime("%Y-%m-%d"),
+        "is_am": is_am,
+        "is_pm": is_pm,
+        "approved_am": approved_am,
+        "approved_pm": approved_pm,
+        "exceeds_am": bool(is_am) and exceeds_limit(approved_am, team_size),
+        "exceeds_pm": bool(is_pm) and exceeds_limit(approved_pm, team_size)
+    } for specific_date, is_am, is_pm, approved_am, approved_pm in rows]
+
+def occupancy_change(staff_id, specific_date, is_am, is_pm, sign):
+    # sign is 1 when a request starts taking up a slot and -1 when it frees it
+    return (staff_id, _to_date(specific_date)), (sign if is_am else 0, sign if is_pm else 0)
+
+def apply_occupancy_changes(connection, changes):
+    # Adds the changes of staff members to the team of their current reporting manager, skipping inactive staff
+    staff_ids = {staff_id for (staff_id, specific_date), slots in changes}
+    if not staff_ids:
+        return
+    teams = dict(connection.execute(
+        select(Employee.staff_id, Employee.reporting_manager).where(
+            Employee.staff_id.in_(staff_ids),
+            Employee.is_active == True
+        )
+    ).all())
+    _apply_team_changes(connection, [
+        ((teams[staff_id], specific_date), slots)
+        for (staff_id, specific_date), slots in changes if teams.get(staff_id) is not None
+    ])
+
+def move_staff_occupancy(connection, moves):
+    # Moves the slots of active staff to their new team, moves is {staff_id: (old_manager_id, new_manager_id)}
+    moves = {staff_id: managers for staff_id, managers in moves.items() if managers[0] != managers[1]}
+    if not moves:
+        return
+    occupied = connection.execute(
+        select(WFHRequests.staff_id, WFHRequests.specific_date, WFHRequests.is_am, WFHRequests.is_pm).join(
+            Employee, Employee.staff_id == WFHRequests.staff_id
+        ).where(
+            WFHRequests.staff_id.in_(list(moves)),
+            WFHRequests.request_status.in_(OCCUPIED_STATUSES),
+            Employee.is_active == True
+        )
+    ).all()
+
+    changes = []
+    for staff_id, specific_date, is_am, is_pm in occupied:
+        old_manager_id, new_manager_id = moves[staff_id]
+        for manager_id, sign in ((old_manager_id, -1), (new_manager_id, 1)):
+            if manager_id is not None:
+                changes.append(((manager_id, specific_date), (sign if is_am else 0, sign if is_pm else 0)))
+    _apply_team_changes(connection, changes)
+
+def set_staff_active(connection, staff_ids, active):
+    # Marks employees active or inactive and adds or removes their requests from team_day_occupancy
+    staff_ids = list(staff_ids)
+    if not staff_ids:
+        return
+    occupied = connection.execute(
+        select(WFHRequests.staff_id, WFHRequests.specific_date, WFHRequests.is_am, WFHRequests.is_pm).where(
+            WFHRequests.staff_id.in_(staff_ids),
+            WFHRequests.request_status.in_(OCCUPIED_STATUSES)
+        )
+    ).all()
+    sign = 1 if active else -1
+    changes = [occupancy_change(*row, sign) for row in occupied]
+
+    # Slots are only counted for active staff: taken away while still active, given back once active again
+    if not active:
+        apply_occupancy_changes(connection, changes)
+    connection.execute(update(Employee.__table__).where(Employee.__table__.c.staff_id.in_(staff_ids)).values(is_active=active))
+    if active:
+        apply_occupancy_changes(connection, changes)
+
+def _apply_team_changes(connection, changes):
+    totals = {}
+    for key, (am, pm) in changes:
+        current_am, current_pm = totals.get(key, (0, 0))
+        totals[key] = (current_am + am, current_pm + pm)
+
+    for (manager_id, specific_date), (am, pm) in totals.items():
+        if am or pm:
+            _apply(connection, manager_id, specific_date, am, pm)
+
+def rebuild_team_day_occupancy():
+    # Recompute the whole table from WFHRequests, e.g. after it is first created on an existing database
+    session = db.session
+    session.execute(delete(TeamDayOccupancy))
+
+    counts = session.execute(
+        select(
+            Employee.reporting_manager,
+            WFHRequests.specific_date,
+            func.sum(case((WFHRequests.is_am == True, 1), else_=0)),
+            func.sum(case((WFHRequests.is_pm == True, 1), else_=0))
+        ).join(Employee, Employee.staff_id == WFHRequests.staff_id).where(
+            WFHRequests.request_status.in_(OCCUPIED_STATUSES),
+            Employee.is_active == True,
+            Employee.reporting_manager.is_not(None)
+        ).group_by(Employee.reporting_manager, WFHRequests.specific_date)
+    ).all()
+
+    connection = session.connection()
+    for manager_id, specific_date, am, pm in counts:
+        _apply(connection, manager_id, specific_date, am, pm)
+
+    session.commit()
+    return len(counts)
+
+def _team_size(manager_id):
+    return select(func.count()).select_from(Employee).where(
+        Employee.reporting_manager == manager_id,
+        Employee.staff_id != manager_id,
+        Employee.is_active == True
+    ).scalar_subquery()
+
+def _apply(connection, manager_id, specific_date, am, pm):
+    table = TeamDayOccupancy.__table__
+    values = {
+        "manager_id": manager_id,
+        "date": specific_date,
+        "am_count": am,
+        "pm_count": pm,
+        "team_size": _team_size(manager_id)
+    }
+
+    dialect_name = connection.dialect.name
+    if dialect_name in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+        stmt = dialect_insert(table).values(**values)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.manager_id, table.c.date],
+            set_={
+                "am_count": table.c.am_count + stmt.excluded.am_count,
+                "pm_count": table.c.pm_count + stmt.excluded.pm_count,
+                "team_size": stmt.excluded.team_size
+            }
+        ))
+        return
+
+    # Other databases: increment the row, or create it if it does not exist yet
+    result = connection.execute(
+        update(table).where(table.c.manager_id == manager_id, table.c.date == specific_date).values(
+            am_count=table.c.am_count + am,
+            pm_count=table.c.pm_count + pm,
+            team_size=values["team_size"]
+        )
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(**values))
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return value
+
+# Load the previous value when one of these attributes is set on an expired request,
+# otherwise the flush below cannot tell which slot the request is leaving
+TRACKED_ATTRIBUTES = ("specific_date", "is_am", "is_pm", "request_status")
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    return value
+
+for attr in TRACKED_ATTRIBUTES:
+    event.listen(getattr(WFHRequests, attr), "set", _keep_old_value, active_history=True, retval=True)
+# Same for the team an employee is leaving
+event.listen(Employee.reporting_manager, "set", _keep_old_value, active_history=True, retval=True)
+
+def _old_value(state, attr):
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), attr)
+
+def _request_changes(session):
+    changes = []
+
+    for obj in session.new:
+        if isinstance(obj, WFHRequests) and obj.request_status in OCCUPIED_STATUSES:
+            changes.append(occupancy_change(obj.staff_id, obj.specific_date, obj.is_am, obj.is_pm, 1))
+
+    for obj in session.dirty:
+        if not isinstance(obj, WFHRequests) or not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        old = {attr: _old_value(state, attr) for attr in TRACKED_ATTRIBUTES}
+        if old["request_status"] in OCCUPIED_STATUSES:
+            changes.append(occupancy_change(obj.staff_id, old["specific_date"], old["is_am"], old["is_pm"], -1))
+        if obj.request_status in OCCUPIED_STATUSES:
+            changes.append(occupancy_change(obj.staff_id, obj.specific_date, obj.is_am, obj.is_pm, 1))
+
+    for obj in session.deleted:
+        if not isinstance(obj, WFHRequests):
+            continue
+        state = inspect(obj)
+        if _old_value(state, "request_status") in OCCUPIED_STATUSES:
+            changes.append(occupancy_change(
+                obj.staff_id, _old_value(state, "specific_date"),
+                _old_value(state, "is_am"), _old_value(state, "is_pm"), -1
+            ))
+
+    return changes
+
+def _team_moves(session):
+    # {staff_id: (old_manager_id, new_manager_id)} of the employees changing team in this flush
+    moves = {}
+    for obj in session.dirty:
+        if not isinstance(obj, Employee):
+            continue
+        history = inspect(obj).attrs.reporting_manager.history
+        if history.deleted and history.added and history.deleted[0] != history.added[0]:
+            moves[obj.staff_id] = (history.deleted[0], history.added[0])
+    return moves
+
+@event.listens_for(Session, "before_flush")
+def _move_occupancy(session, flush_context, instances):
+    # Before the flush the requests and the team still match what is counted, so the slots move as they
+    # are. Request changes in the same flush are then counted under the new team by _update_occupancy
+    moves = _team_moves(session)
+    if moves:
+        move_staff_occupancy(session.connection(), moves)
+
+@event.listens_for(Session, "after_flush")
+def _update_occupancy(session, flush_context):
+    changes = _request_changes(session)
+    if changes:
+        apply_occupancy_changes(session.connection(), changes)
@@ -0,0 +1,182 @@
+import uuid
+import threading
+from flask import has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from models import db, Employee
+
+# In-memory view of the org chart. Every employee gets a pre-order number and the
+# pre-order number of the last employee in their subtree, so a subtree is a slice
+# of the pre-order list and "is X under Y" is an interval check.
+class OrgIndex:
+    def __init__(self, employees, inactive=()):
+        self.employees = {employee["staff_id"]: employee for employee in employees}
+        # Employees kept after leaving, still part of the chart but left out of direct reports and subtrees
+        self.inactive = set(inactive)
+
+        self.reports = {}
+        for staff_id in sorted(self.employees):
+            rm_id = self.employees[staff_id]["reporting_manager"]
+            # The CEO reports to himself, so self references are treated as roots
+            if rm_id is not None and rm_id != staff_id and rm_id in self.employees:
+                self.reports.setdefault(rm_id, []).append(staff_id)
+
+        self.order = []
+        self.pre = {}
+        self.post = {}
+        self._number()
+
+    def _number(self):
+        roots = [staff_id for staff_id in sorted(self.employees) if not self._has_manager(staff_id)]
+        # Employees stuck in a reporting cycle are not reachable from any root
+        for staff_id in roots + sorted(self.employees):
+            if staff_id not in self.pre:
+                self._visit(staff_id)
+
+    def _has_manager(self, staff_id):
+        rm_id = self.employees[staff_id]["reporting_manager"]
+        return rm_id is not None and rm_id != staff_id and rm_id in self.employees
+
+    def _visit(self, root_id):
+        stack = [(root_id, False)]
+        while stack:
+            staff_id, done = stack.pop()
+            if done:
+                self.post[staff_id] = len(self.order) - 1
+                continue
+            if staff_id in self.pre:
+                continue
+
+            self.pre[staff_id] = len(self.order)
+            self.order.append(staff_id)
+
+            stack.append((staff_id, True))
+            for report_id in reversed(self.reports.get(staff_id, [])):
+                if report_id not in self.pre:
+                    stack.append((report_id, False))
+
+    def _key(self, staff_id):
+        try:
+            return int(staff_id)
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, staff_id):
+        return self.employees.get(self._key(staff_id))
+
+    def direct_reports(self, staff_id):
+        return [self.employees[report_id] for report_id in self.reports.get(self._key(staff_id), []) if report_id not in self.inactive]
+
+    def subtree(self, manager_id):
+        manager_id = self._key(manager_id)
+        if manager_id not in self.pre:
+            return []
+        ids = self.order[self.pre[manager_id] + 1:self.post[manager_id] + 1]
+        return [self.employees[staff_id] for staff_id in ids if staff_id not in self.inactive]
+
+    def is_descendant(self, staff_id, manager_id):
+        staff_id = self._key(staff_id)
+        manager_id = self._key(manager_id)
+        if staff_id not in self.pre or manager_id not in self.pre:
+            return False
+        return self.pre[manager_id] < self.pre[staff_id] <= self.post[manager_id]
+
+    def ancestors(self, staff_id):
+        staff_id = self._key(staff_id)
+        if staff_id not in self.employees:
+            return []
+
+        chain = []
+        seen = {staff_id}
+        while self._has_manager(staff_id):
+            staff_id = self.employees[staff_id]["reporting_manager"]
+            if staff_id in seen:
+                break
+            seen.add(staff_id)
+            chain.append(self.employees[staff_id])
+        return chain
+
+# Bumped whenever employees are written through a session or the tables are recreated, and when
+# another worker changes employees (see util.cache). Writers that bypass the session (e.g. the HR
+# import on a raw connection) should call publish_org_change() once they commit
+_version = 0
+_index = None
+_index_version = None
+_lock = threading.RLock()
+
+# Stamp in the shared cache, replaced whenever an employee change commits in any process. The invalidation
+# message of util.cache reaches the other workers straight away, the stamp makes sure they rebuild even if
+# they missed it (within the cache's LOCAL_TTL), e.g. after an HR import or a Celery task
+ORG_VERSION_KEY = "org_version"
+ORG_VERSION_TTL = 86400
+
+def get_org_index():
+    global _index, _index_version
+
+    with _lock:
+        version = (_version, _shared_version())
+        if _index is None or _index_version != version:
+            rows = db.session.execute(select(*Employee.json_columns(), Employee.is_active)).all()
+            _index = OrgIndex(Employee.json_rows(row[:-1] for row in rows), [row[0] for row in rows if not row[-1]])
+            _index_version = version
+        return _index
+
+def invalidate_org_index():
+    # This process only
+    global _version
+    with _lock:
+        _version += 1
+
+def publish_org_change():
+    # Every process, for employee changes that have been committed
+    invalidate_org_index()
+    if has_app_context():
+        from util.cache import get_cache # util.cache imports this module
+        get_cache().set(ORG_VERSION_KEY, uuid.uuid4().hex, ORG_VERSION_TTL)
+
+def _shared_version():
+    if not has_app_context():
+        return None
+    from util.cache import get_cache
+    return get_cache().get(ORG_VERSION_KEY)
+
+def _touches_employees(session):
+    return any(isinstance(obj, Employee) for obj in list(session.new) + list(session.dirty) + list(session.deleted))
+
+@event.listens_for(Session, "after_flush")
+def _employee_flushed(session, flush_context):
+    if _touches_employees(session):
+        session.info["org_changed"] = True
+        invalidate_org_index()
+
+def is_bulk_employee_write(orm_execute_state):
+    # UPDATE/DELETE/INSERT statements on employee, e.g. Employee.query.filter(...).delete()
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return False
+    # ORM statements target an annotated copy of the table, so compare by name
+    table = getattr(orm_execute_state.statement, "table", None)
+    return getattr(table, "name", None) == Employee.__tablename__
+
+@event.listens_for(Session, "do_orm_execute")
+def _employee_bulk_statement(orm_execute_state):
+    # Bulk statements skip the flush above
+    if is_bulk_employee_write(orm_execute_state):
+        orm_execute_state.session.info["org_changed"] = True
+        invalidate_org_index()
+
+@event.listens_for(Session, "after_commit")
+def _employee_committed(session):
+    # Rebuild again once the change is visible, here and in the other processes
+    if session.info.pop("org_changed", False):
+        publish_org_change()
+
+@event.listens_for(Session, "after_rollback")
+def _employee_rolled_back(session):
+    # The flush above may have been rolled back
+    if session.info.pop("org_changed", False):
+        invalidate_org_index()
+
+@event.listens_for(db.metadata, "after_create")
+@event.listens_for(db.metadata, "after_drop")
+def _employee_table_recreated(target, connection, **kw):
+    invalidate_org_index()
@@ -0,0 +1,104 @@
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from models import db, Outbox
+from util.unit_of_work import commit, on_commit, unit_of_work
+from util.wfh_request_logs import log_wfh_requests
+
+# Transactional outbox for the side effects of a request change. The route writes an Outbox row in the same
+# transaction as the change, so the side effects are recorded if and only if the change commits, and the
+# response goes out without waiting for them. Once the transaction commits the relay_outbox Celery task
+# is queued to carry them out; the same task also runs every minute from beat and picks up any event whose
+# task was lost (e.g. the broker was down), so every event is eventually processed.
+
+OUTBOX_BATCH_SIZE = 100
+
+# Events still failing after this many attempts are marked failed and logged as critical, so they are
+# not silently dropped. Once the cause is fixed retry_failed_outbox puts them back in front of the relay
+MAX_ATTEMPTS = 5
+
+def write_request_logs(payload, created_at):
+    # Logged with the time of the change, not the time the relay got to it
+    log_wfh_requests(payload["requests"], created_at)
+
+# Handlers of each event type, run in order in one transaction with marking the event processed.
+# Notifications for request changes belong here too
+OUTBOX_HANDLERS = {
+    "wfh_requests_changed": [write_request_logs]
+}
+
+def add_outbox_event(event_type, payload, staff_id=None):
+    # Recorded in the caller's transaction, relayed once it commits
+    db.session.add(Outbox(event_type=event_type, staff_id=staff_id, payload=json.dumps(payload), created_at=datetime.now()))
+    commit()
+    on_commit(dispatch_outbox)
+
+def requests_changed(new_requests):
+    # The WFHRequestLogs entries of changed requests (their json()), one event per staff member
+    # so each event only changes the schedule version of the staff it is about
+    requests_by_staff = {}
+    for new_request in new_requests:
+        requests_by_staff.setdefault(new_request["staff_id"], []).append(new_request)
+    for staff_id, staff_requests in requests_by_staff.items():
+        add_outbox_event("wfh_requests_changed", {"requests": staff_requests}, staff_id)
+
+def dispatch_outbox():
+    from app.task import relay_outbox
+    try:
+        relay_outbox.delay()
+    except Exception as e:
+        # The change is already committed, the periodic relay will get to the event
+        current_app.logger.warning(f"Could not queue relay_outbox: {e}")
+
+def process_outbox(limit=OUTBOX_BATCH_SIZE):
+    # Carries out up to limit pending events, oldest first, each in its own transaction so one failing
+    # event does not hold back the others. Returns the number processed
+    event_ids = db.session.execute(
+        select(Outbox.outbox_id).where(Outbox.processed_at.is_(None), Outbox.failed_at.is_(None))
+        .order_by(Outbox.outbox_id).limit(limit)
+    ).scalars().all()
+
+    processed = 0
+    for event_id in event_ids:
+        try:
+            with unit_of_work():
+                # Locked so a concurrent relay skips it, and checked again in case one already did it
+                event = db.session.execute(
+                    select(Outbox).where(Outbox.outbox_id == event_id, Outbox.processed_at.is_(None))
+                    .with_for_update(skip_locked=True)
+                ).scalar_one_or_none()
+                if event is None:
+                    continue
+
+                payload = json.loads(event.payload)
+                for handler in OUTBOX_HANDLERS[event.event_type]:
+                    handler(payload, event.created_at)
+                event.processed_at = datetime.now()
+            processed += 1
+        except Exception:
+            current_app.logger.exception(f"Outbox event {event_id} failed")
+            _record_failure(event_id)
+    return processed
+
+def _record_failure(event_id):
+    with unit_of_work():
+        event = db.session.get(Outbox, event_id)
+        event.attempts += 1
+        if event.attempts >= MAX_ATTEMPTS:
+            event.failed_at = datetime.now()
+            current_app.logger.critical(
+                f"Outbox event {event_id} ({event.event_type}) failed {event.attempts} times and was set aside, "
+                f"retry it with retry_failed_outbox"
+            )
+
+def retry_failed_outbox(event_ids=None):
+    # Hands failed events back to the relay with a fresh set of attempts. Returns the number of events
+    query = Outbox.__table__.update().where(Outbox.failed_at.is_not(None), Outbox.processed_at.is_(None))
+    if event_ids is not None:
+        query = query.where(Outbox.outbox_id.in_(event_ids))
+    with unit_of_work():
+        retried = db.session.execute(query.values(failed_at=None, attempts=0)).rowcount
+    if retried:
+        dispatch_outbox()
+    return retried
@@ -1,5 +1,6 @@
 from datetime import date
 from models import *
+from util.unit_of_work import commit, rollback
 
 def create_request_decision(data):
     try: 
@@ -13,7 +14,7 @@ def create_request_decision(data):
         )
 
         db.session.add(decision)
-        db.session.commit()
+        commit()
 
         return {
             "message": "Manager's request decision successfully created.",
@@ -21,5 +22,19 @@ def create_request_decision(data):
         }
         
     except Exception as e:
-        db.session.rollback()
-        return {"error": str(e)}
\ No newline at end of file
+        rollback()
+        return {"error": str(e)}
+
+def create_request_decisions(data, specific_dates):
+    # One decision per date in a single multi-row INSERT, the caller commits
+    decision_date = date.today()
+    db.session.execute(insert(RequestDecisions), [
+        {
+            "request_id": data["request_id"],
+            "manager_id": data["manager_id"],
+            "specific_date": specific_date,
+            "decision_status": data["decision_status"],
+            "decision_date": decision_date,
+            "decision_notes": data["decision_notes"]
+        } for specific_date in specific_dates
+    ])
\ No newline at end of file
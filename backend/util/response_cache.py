@@ -0,0 +1,51 @@
+import hashlib
+from flask import current_app, request, jsonify
+from sqlalchemy import select, func, and_
+from models import db, WFHRequests, WFHRequestLogs, Outbox
+from util.cache import get_cache
+
+# Schedule responses are versioned by the WFHRequestLogs of the requests they cover: every change to a
+# request writes a log row, so the number of log rows and the latest log_datetime change with it.
+# The version is cheap to compute (one aggregate query) and lets us answer If-None-Match with 304,
+# or serve the serialized body cached under the same version without building it again.
+
+def schedule_version(staff_ids, start_date=None, end_date=None):
+    # Approvals write their log rows through the outbox relay after the change commits (util/outbox.py).
+    # The latest outbox event of these staff stands in for them until then. Event ids only go up, and every
+    # change gets a new event, so a change is never served under an older version, and events of other
+    # staff leave this version alone
+    last_event = select(func.max(Outbox.outbox_id)).where(Outbox.staff_id.in_(staff_ids)).scalar_subquery()
+    query = select(func.count(), func.max(WFHRequestLogs.log_datetime), last_event).select_from(WFHRequestLogs).join(
+        WFHRequests,
+        and_(WFHRequests.request_id == WFHRequestLogs.request_id, WFHRequests.specific_date == WFHRequestLogs.specific_date)
+    ).where(WFHRequests.staff_id.in_(staff_ids))
+    if start_date:
+        query = query.where(WFHRequestLogs.specific_date >= start_date)
+    if end_date:
+        query = query.where(WFHRequestLogs.specific_date <= end_date)
+
+    log_count, last_log, last_event = db.session.execute(query).one()
+    # The staff_ids are part of the version, a team that gains or loses a member gets a new version
+    return f"{log_count}:{last_log}:{last_event}:{','.join(str(staff_id) for staff_id in staff_ids)}"
+
+def conditional_response(cache_key, version, build):
+    # build() returns (payload, status) and is only called when the body is not cached yet.
+    # Only 200 responses are given an ETag and cached
+    etag = hashlib.sha1(f"{cache_key}|{version}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    cache = get_cache()
+    body = cache.get(f"response:{etag}")
+    if body is None:
+        payload, status = build()
+        if status != 200:
+            return jsonify(payload), status
+        body = current_app.json.response(payload).get_data()
+        cache.set(f"response:{etag}", body)
+
+    response = current_app.response_class(body, status=200, mimetype=current_app.json.mimetype)
+    response.set_etag(etag)
+    return response
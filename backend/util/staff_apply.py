@@ -3,6 +3,7 @@ from datetime import date, datetime, timedelta
 from models import *
 from util.employee import *
 from util.wfh_requests import *
+from util.unit_of_work import rollback
 import uuid
 
 def handle_adhoc_request(data):
@@ -61,7 +62,7 @@ def handle_adhoc_request(data):
         }), 201
         
     except Exception as e:
-        db.session.rollback()
+        rollback()
         return jsonify({"error": str(e)}), 500
     
 
@@ -152,6 +153,6 @@ def handle_recurring_request(data):
         
     except Exception as e:
         print(f"Error occurred: {e}")
-        db.session.rollback()
+        rollback()
         return jsonify({"error": str(e)}), 500
     
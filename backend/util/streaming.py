@@ -0,0 +1,31 @@
+from flask import current_app, request, stream_with_context
+from models import db
+
+# Optional NDJSON (one JSON document per line) for the large request listings. Rows come from a server side
+# cursor in batches and each batch is written out before the next one is fetched, so memory stays flat
+# whatever the size of the result. Clients opt in with Accept: application/x-ndjson
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# Rows fetched per round trip from the cursor, also the rows written per chunk of the response
+STREAM_BATCH_SIZE = 1000
+
+def wants_ndjson():
+    # Only when NDJSON is preferred over JSON, so browsers sending */* keep getting JSON
+    return request.accept_mimetypes.best_match([current_app.json.mimetype, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def stream_json_batches(model, query):
+    # Lists of json rows of a select(*model.json_columns()) query, STREAM_BATCH_SIZE rows at a time
+    result = db.session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+    for rows in result.partitions():
+        yield model.json_rows(rows)
+
+def ndjson_response(batches):
+    # The request context (and with it the db session) stays open until the last batch is written
+    dumps = current_app.json.dumps
+
+    def generate():
+        for batch in batches:
+            yield "".join(f"{dumps(row)}\n" for row in batch)
+
+    return current_app.response_class(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
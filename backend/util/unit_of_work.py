@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+from functools import wraps
+from models import db
+
+# Helpers call commit() instead of db.session.commit(). Inside a unit of work the helpers only flush
+# and the whole API action is committed once when the unit of work ends. Used on their own
+# (scripts, tasks, tests), the helpers still commit straight away.
+
+class UnitOfWork:
+    def __init__(self, session):
+        self.session = session
+        self.rollback_only = False
+        self.after_commit = []
+
+    def mark_rollback_only(self):
+        # Roll back instead of committing when the unit of work ends, e.g. for error responses
+        self.rollback_only = True
+
+@contextmanager
+def unit_of_work():
+    session = db.session()
+    outer = session.info.get("unit_of_work")
+
+    # Nested units of work join the outermost one
+    if outer:
+        yield outer
+        return
+
+    uow = UnitOfWork(session)
+    session.info["unit_of_work"] = uow
+    committed = False
+    try:
+        yield uow
+        if uow.rollback_only:
+            session.rollback()
+        else:
+            session.commit()
+            committed = True
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.info.pop("unit_of_work", None)
+
+    # Outside of the unit of work, so callbacks that write commit on their own
+    if committed:
+        for callback in uow.after_commit:
+            callback()
+
+def transactional(fn):
+    # Runs a route in a unit of work, rolling back when it returns an error status
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with unit_of_work() as uow:
+            response = fn(*args, **kwargs)
+            if isinstance(response, tuple) and len(response) > 1 and isinstance(response[1], int) and response[1] >= 400:
+                uow.mark_rollback_only()
+            return response
+    return wrapper
+
+def in_unit_of_work():
+    return "unit_of_work" in db.session().info
+
+def commit():
+    if in_unit_of_work():
+        db.session.flush()
+    else:
+        db.session.commit()
+
+def rollback():
+    # For helpers that catch their own errors. Inside a unit of work the writes flushed so far belong to the
+    # whole API action, so it is marked rollback only instead of discarding them here and committing the rest
+    uow = db.session().info.get("unit_of_work")
+    if uow:
+        uow.mark_rollback_only()
+    else:
+        db.session.rollback()
+
+def on_commit(callback):
+    # Runs callback once the current unit of work has committed, it is dropped if it rolls back.
+    # Outside of a unit of work the helpers commit straight away, so callback runs straight away too
+    uow = db.session().info.get("unit_of_work")
+    if uow:
+        uow.after_commit.append(callback)
+    else:
+        callback()
@@ -1,5 +1,6 @@
 from models import *
 from datetime import datetime
+from util.unit_of_work import commit, rollback
 
 def add_approved_date(request, decision):
     try: 
@@ -13,10 +14,10 @@ def add_approved_date(request, decision):
             )
         
         db.session.add(new_date)
-        db.session.commit()
+        commit()
 
         return {"message": "WFH date successfully added!", "wfh_date": new_date.json()}
 
     except Exception as e:
-        db.session.rollback()
+        rollback()
         return {"error": str(e)}
\ No newline at end of file
@@ -1,22 +1,172 @@
+import io
+import csv
+import atexit
+import weakref
+import argparse
+from sqlalchemy import event, select, insert, exists, and_, tuple_
+from sqlalchemy.orm import Session
 from models import *
+from util.unit_of_work import commit
 from datetime import datetime, date
 
+# Log entries are buffered per session and written with one multi-row INSERT just before the transaction
+# commits, instead of an INSERT (and a commit) per entry. They are dropped with the transaction if it rolls back,
+# so a log row exists exactly when its change was committed. Schedule ETags count the log rows, which
+# works because they are written in the transaction of the change (see util/response_cache.py).
+#
+# The buffer is bounded: once it holds LOG_BUFFER_SIZE entries they are written into the open transaction
+# straight away, so a long unit of work slows down a little instead of growing without limit.
+
+LOG_BUFFER_SIZE = 1000
+
+# Flushes at least this big use COPY on PostgreSQL, e.g. backfills and long recurring series
+COPY_MIN_ROWS = 500
+
+LOG_COLUMNS = ["log_datetime", "request_id", "specific_date", "request_status_log", "apply_date_log", "reason_log"]
+
+def log_entry(new_request, log_datetime):
+    # new_request is a WFHRequests json(), raises KeyError or ValueError for anything else
+    return {
+        "log_datetime": log_datetime,
+        "request_id": new_request["request_id"],
+        "specific_date": date.fromisoformat(new_request["specific_date"]),
+        "request_status_log": new_request["request_status"],
+        "apply_date_log": date.fromisoformat(new_request["apply_date"]),
+        "reason_log": new_request["request_reason"]
+    }
+
 def log_wfh_request(new_request):
+    buffer_log_entries([log_entry(new_request, datetime.now())])
+    commit()
+
+def log_wfh_requests(new_requests, log_datetime=None):
+    # Logs several request changes at the same time, the caller commits
+    log_datetime = log_datetime or datetime.now()
+    buffer_log_entries([log_entry(new_request, log_datetime) for new_request in new_requests])
+
+def buffer_log_entries(entries):
+    session = db.session()
+    buffer = session.info.setdefault("wfh_request_logs", [])
+    buffer += entries
+    if len(buffer) >= LOG_BUFFER_SIZE:
+        flush_log_entries(session)
+
+def flush_log_entries(session):
+    entries = session.info.pop("wfh_request_logs", None)
+    if entries:
+        # Requests added in the same transaction go in first, the log rows reference them
+        session.flush()
+        write_log_entries(session.connection(), entries)
+
+def write_log_entries(connection, entries):
+    if connection.dialect.name == "postgresql" and len(entries) >= COPY_MIN_ROWS:
+        _copy_log_entries(connection, entries)
+    else:
+        connection.execute(insert(WFHRequestLogs.__table__), entries)
+
+def _copy_log_entries(connection, entries):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for entry in entries:
+        writer.writerow([r"\N" if entry[column] is None else entry[column] for column in LOG_COLUMNS])
+    buffer.seek(0)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY wfhrequestlogs ({', '.join(LOG_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+    finally:
+        cursor.close()
+
+@event.listens_for(Session, "before_commit")
+def _flush_before_commit(session):
+    flush_log_entries(session)
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_uncommitted(session, transaction):
+    # Entries still buffered when the outermost transaction ends belong to a rollback
+    if transaction.parent is None:
+        session.info.pop("wfh_request_logs", None)
+
+##### BACKFILL #####
+# Writes a log row for every request that has none, e.g. after loading historical requests, so their
+# schedules get an ETag version. Runs outside of any request with its own transaction per batch, and
+# flushes whatever is still buffered if the process exits halfway.
+
+_backfills = weakref.WeakSet()
+
+class LogBackfill:
+    def __init__(self, engine, batch_size=LOG_BUFFER_SIZE):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.entries = []
+        self.written = 0
+        _backfills.add(self)
+
+    def add(self, entries):
+        self.entries += entries
+        if len(self.entries) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        entries, self.entries = self.entries, []
+        if entries:
+            with self.engine.begin() as connection:
+                write_log_entries(connection, entries)
+            self.written += len(entries)
+
+    def close(self):
+        self.flush()
+        _backfills.discard(self)
+
+@atexit.register
+def _flush_backfills():
+    for backfill in list(_backfills):
+        backfill.close()
+
+def backfill_request_logs(batch_size=LOG_BUFFER_SIZE):
+    # Returns the number of log rows written
+    unlogged = select(*WFHRequests.json_columns()).where(~exists().where(and_(
+        WFHRequestLogs.request_id == WFHRequests.request_id,
+        WFHRequestLogs.specific_date == WFHRequests.specific_date
+    ))).order_by(WFHRequests.request_id, WFHRequests.specific_date)
+
+    log_datetime = datetime.now()
+    backfill = LogBackfill(db.engine, batch_size)
     try:
-        new_request_log = WFHRequestLogs(
-            log_datetime=datetime.now(),
-            request_id=new_request["request_id"],
-            specific_date=date.fromisoformat(new_request["specific_date"]),
-            request_status_log=new_request["request_status"],
-            apply_date_log=date.fromisoformat(new_request["apply_date"]),
-            reason_log=new_request["request_reason"]
-        )
-
-        db.session.add(new_request_log)
-        db.session.commit()
-
-        print(f"WFH request log added successfully for request ID: {new_request['request_id']}")
-
-    except Exception as e:
-        db.session.rollback()
-        print(f"An error occurred while logging WFH request: {str(e)}")
\ No newline at end of file
+        after = None
+        while True:
+            # Keyset pages over (request_id, specific_date), each read is short and ends before the write
+            query = unlogged if after is None else unlogged.where(
+                tuple_(WFHRequests.request_id, WFHRequests.specific_date) > tuple_(*after)
+            )
+            with db.engine.connect() as connection:
+                rows = WFHRequests.json_rows(connection.execute(query.limit(batch_size)))
+            if not rows:
+                break
+
+            backfill.add([log_entry_from_row(row, log_datetime) for row in rows])
+            after = (rows[-1]["request_id"], rows[-1]["specific_date"])
+    finally:
+        backfill.close()
+    return backfill.written
+
+def log_entry_from_row(row, log_datetime):
+    # Same as log_entry for a WFHRequests json row, whose dates are still date objects
+    return {
+        "log_datetime": log_datetime,
+        "request_id": row["request_id"],
+        "specific_date": row["specific_date"],
+        "request_status_log": row["request_status"],
+        "apply_date_log": row["apply_date"],
+        "reason_log": row["request_reason"]
+    }
+
+if __name__ == "__main__":
+    from server import app
+
+    parser = argparse.ArgumentParser(description="Write a WFHRequestLogs row for every request without one")
+    parser.add_argument("--batch-size", type=int, default=LOG_BUFFER_SIZE)
+    args = parser.parse_args()
+
+    with app.app_context():
+        print(f"Backfilled {backfill_request_logs(args.batch_size)} request logs")
@@ -1,5 +1,8 @@
 from models import *
-from datetime import date
+from datetime import date, datetime
+from sqlalchemy import and_, or_, tuple_, literal
+from util.occupancy import OCCUPIED_STATUSES, occupancy_change, apply_occupancy_changes
+from util.unit_of_work import commit, rollback
 
 def get_request(request_id, specific_date):
     wfh_request = WFHRequests.query.filter_by(request_id=request_id, specific_date=specific_date).first()
@@ -19,6 +22,167 @@ def check_staff_request(staff_id, specific_date):
         return None
     return wfh_request.json()
 
+def get_requests_by_staff(staff_ids, request_status, start_date=None, end_date=None):
+    # Fetch the requests of a whole team in one query and group their json rows by staff_id
+    requests_by_staff = {}
+    if not staff_ids:
+        return requests_by_staff
+
+    query = select(*WFHRequests.json_columns()).where(
+        WFHRequests.staff_id.in_(staff_ids),
+        WFHRequests.request_status == request_status
+    )
+    if start_date:
+        query = query.where(WFHRequests.specific_date >= start_date)
+    if end_date:
+        query = query.where(WFHRequests.specific_date <= end_date)
+
+    rows = db.session.execute(query.order_by(WFHRequests.specific_date, WFHRequests.request_id))
+    for wfh_request in WFHRequests.json_rows(rows):
+        requests_by_staff.setdefault(wfh_request["staff_id"], []).append(wfh_request)
+
+    return requests_by_staff
+
+def team_inbox_query(team, request_statuses, limit=None, cursor=None):
+    # Requests of the given statuses for the whole team ordered by (specific_date, request_id),
+    # starting after the cursor. Raises ValueError for malformed cursors
+    query = select(*WFHRequests.json_columns()).where(
+        WFHRequests.staff_id.in_([team_member["staff_id"] for team_member in team]),
+        WFHRequests.request_status.in_(request_statuses)
+    )
+
+    if cursor:
+        cursor_date, cursor_request_id = parse_inbox_cursor(cursor)
+        query = query.where(or_(
+            WFHRequests.specific_date > cursor_date,
+            and_(WFHRequests.specific_date == cursor_date, WFHRequests.request_id > cursor_request_id)
+        ))
+
+    query = query.order_by(WFHRequests.specific_date.asc(), WFHRequests.request_id.asc())
+    if limit:
+        query = query.limit(limit)
+    return query
+
+def get_team_inbox(team, request_statuses, limit=None, cursor=None):
+    # The whole team's inbox in one query. With a limit, only one page is returned and next_cursor points after its last row
+    query = team_inbox_query(team, request_statuses, limit, cursor)
+    inbox_requests = db.session.execute(query).all() if team else []
+
+    requests_by_staff = {}
+    for inbox_request in WFHRequests.json_rows(inbox_requests):
+        requests_by_staff.setdefault(inbox_request["staff_id"], []).append(inbox_request)
+
+    team_pending_requests = [
+        {
+            "staff_id": team_member["staff_id"],
+            "pending_requests": requests_by_staff[team_member["staff_id"]]
+        } for team_member in team if team_member["staff_id"] in requests_by_staff
+    ]
+
+    inbox = {
+        "team_size": len(team),
+        "pending_requests_count": len(inbox_requests),
+        "team_pending_requests": team_pending_requests
+    }
+
+    if limit:
+        last_request = inbox_requests[-1] if len(inbox_requests) == limit else None
+        inbox["next_cursor"] = make_inbox_cursor(last_request) if last_request else None
+
+    return inbox
+
+def make_inbox_cursor(wfh_request):
+    return f"{wfh_request.specific_date.isoformat()},{wfh_request.request_id}"
+
+def parse_inbox_cursor(cursor):
+    # Raises ValueError for malformed cursors
+    cursor_date, separator, cursor_request_id = cursor.partition(",")
+    if not separator or not cursor_request_id:
+        raise ValueError(f"Invalid cursor {cursor}")
+    return date.fromisoformat(cursor_date), cursor_request_id
+
+def update_request_status(request_id, request_status):
+    # Sets the status of every date of a request with one UPDATE, the caller commits.
+    # The UPDATE skips the ORM flush, so team_day_occupancy is adjusted here
+    wfh_requests = WFHRequests.query.filter_by(request_id=request_id).order_by(WFHRequests.specific_date).all()
+
+    changes = []
+    for wfh_request in wfh_requests:
+        if wfh_request.request_status in OCCUPIED_STATUSES:
+            changes.append(occupancy_change(wfh_request.staff_id, wfh_request.specific_date, wfh_request.is_am, wfh_request.is_pm, -1))
+        if request_status in OCCUPIED_STATUSES:
+            changes.append(occupancy_change(wfh_request.staff_id, wfh_request.specific_date, wfh_request.is_am, wfh_request.is_pm, 1))
+
+    db.session.execute(
+        update(WFHRequests).where(WFHRequests.request_id == request_id).values(request_status=request_status)
+    )
+    apply_occupancy_changes(db.session.connection(), changes)
+
+    return wfh_requests
+
+def stale_requests_filter(applied_before, after=None, upto=None):
+    # Pending requests applied for before applied_before, optionally within the keyset range
+    # after < (apply_date, request_id) <= upto used to split the nightly run into chunks
+    conditions = [WFHRequests.request_status == "Pending", WFHRequests.apply_date < applied_before]
+    key = tuple_(WFHRequests.apply_date, WFHRequests.request_id)
+    if after is not None:
+        conditions.append(key > tuple_(*after))
+    if upto is not None:
+        conditions.append(key <= tuple_(*upto))
+    return conditions
+
+def stale_request_bounds(applied_before, chunk_size):
+    # (apply_date, request_id) of every chunk_size-th stale request, in one pass over the index.
+    # Consecutive bounds make ranges of about chunk_size rows (all dates of a request stay in one range)
+    stale = select(
+        WFHRequests.apply_date, WFHRequests.request_id,
+        func.row_number().over(order_by=(WFHRequests.apply_date, WFHRequests.request_id)).label("position")
+    ).where(*stale_requests_filter(applied_before)).subquery()
+
+    rows = db.session.execute(
+        select(stale.c.apply_date, stale.c.request_id).where(stale.c.position % chunk_size == 0).order_by(stale.c.position)
+    ).all()
+
+    bounds = []
+    for row in rows:
+        if not bounds or bounds[-1] != tuple(row):
+            bounds.append(tuple(row))
+    return bounds
+
+def cancel_stale_requests(applied_before, reason, limit, after=None, upto=None):
+    # Cancels up to limit Pending requests applied for before applied_before and logs them, the caller commits.
+    # One UPDATE ... RETURNING and one INSERT per call, or a single INSERT ... SELECT from the UPDATE on
+    # PostgreSQL. Pending requests take no team_day_occupancy, so there is nothing to adjust.
+    # Returns the number of requests cancelled
+    stale = select(WFHRequests.request_id, WFHRequests.specific_date).where(
+        *stale_requests_filter(applied_before, after, upto)
+    ).limit(limit).with_for_update(skip_locked=True)
+
+    cancel = update(WFHRequests).where(
+        tuple_(WFHRequests.request_id, WFHRequests.specific_date).in_(stale)
+    ).values(
+        request_status="Cancelled",
+        request_reason=reason
+    ).returning(
+        WFHRequests.request_id, WFHRequests.specific_date, WFHRequests.request_status,
+        WFHRequests.apply_date, WFHRequests.request_reason
+    )
+
+    log_columns = ["log_datetime", "request_id", "specific_date", "request_status_log", "apply_date_log", "reason_log"]
+    log_datetime = datetime.now()
+
+    if db.engine.dialect.name == "postgresql":
+        cancelled = cancel.cte("cancelled")
+        return db.session.execute(insert(WFHRequestLogs).from_select(log_columns, select(
+            literal(log_datetime, DateTime), cancelled.c.request_id, cancelled.c.specific_date,
+            cancelled.c.request_status, cancelled.c.apply_date, cancelled.c.request_reason
+        ))).rowcount
+
+    rows = db.session.execute(cancel.execution_options(synchronize_session=False)).all()
+    if rows:
+        db.session.execute(insert(WFHRequestLogs), [dict(zip(log_columns, (log_datetime, *row))) for row in rows])
+    return len(rows)
+
 def update_request(request_id, specific_date, data):
     try: 
         wfh_request = WFHRequests.query.filter_by(request_id=request_id, specific_date=specific_date).first()
@@ -39,11 +203,11 @@ def update_request(request_id, specific_date, data):
         if 'request_reason' in data:
             wfh_request.request_reason = data['request_reason']
 
-        db.session.commit()
+        commit()
 
         return {"message": "Request updated", "new_request": wfh_request.json()}
 
     except Exception as e:
-        db.session.rollback()
-        return {"error": f"An error occurred: {str(e)}"}, 500
+        rollback()
+        return {"error": f"An error occurred: {str(e)}"}
 
@@ -1,5 +1,6 @@
 from datetime import date
 from models import *
+from util.unit_of_work import commit, rollback
 
 def create_withdraw_decision(data):
     try: 
@@ -13,7 +14,7 @@ def create_withdraw_decision(data):
             )
 
         db.session.add(decision)
-        db.session.commit()
+        commit()
 
         return {
             "message": "Manager's request decision successfully created.",
@@ -21,5 +22,5 @@ def create_withdraw_decision(data):
         }
         
     except Exception as e:
-        db.session.rollback()
+        rollback()
         return {"error": str(e)}
\ No newline at end of file
@@ -1,5 +1,6 @@
 from datetime import datetime
 from models import *
+from util.unit_of_work import commit, rollback
 
 def create_withdraw_decision(data):
     try:
@@ -15,7 +16,7 @@ def create_withdraw_decision(data):
         )
         
         db.session.add(new_decision)
-        db.session.commit()
+        commit()
         
         return {
             "withdraw_decision_id": new_decision.withdraw_decision_id,
@@ -27,5 +28,5 @@ def create_withdraw_decision(data):
             "decision_notes": data["decision_notes"]
         }
     except Exception as e:
-        db.session.rollback()
+        rollback()
         return {"error": f"Failed to store decision: {str(e)}"}